@@ -0,0 +1,1548 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for json_editor_server.py.
+Usage: python3 json_editor_benchmark.py <benchmark> [options]
+
+Tracking:
+  suite   every server file operation, HTTP route and calculation routine at 1k..1M employees,
+          written as JSON (--output results.json)
+  compare two suite results; exits 1 if any case got slower than --threshold
+  roster  write a synthetic employees.json (--employees N --seed S)
+
+Benchmarks:
+  load    requests/sec and latency for GET /api/employees with 1 vs N clients
+  upload  POST /api/employees time and server peak RSS for growing roster sizes
+  import  POST /api/import and GET /api/export.csv/.jsonl rows/sec for CSV and JSONL
+  save    save_json throughput for large rosters at several backup depths
+  edit    cost of one employee edit: PATCH /api/employees/{id} vs re-POSTing the roster
+  calc    pension_calc.calculate_system_costs time for growing roster sizes
+  kernel  NumPy roster disbursement kernel vs a per-member pure-Python loop
+  solver  Options 2-4 actuarial equivalence: bisection vs closed form vs batched closed form
+  sweep   POST /api/sweep scenarios/sec for 1..N worker processes
+  simulate  POST /api/simulate time for 10k..100k Monte Carlo paths
+  mortality  commutation column build/cache times and O(1) vs year-by-year annuity factors
+  columnar  cold load time and peak RSS: employees.json vs the memory-mapped columnar roster
+  compress  GET / and GET /api/employees bytes and requests/sec by Content-Encoding
+  query   paged GET /api/employees?sort=&q= latency, in memory vs --sqlite, vs the full roster
+  events  edit-to-browser latency and bytes: GET /api/events change feed vs re-fetching the roster
+  connections  latency under load with 5k idle keep-alive connections open, and server memory per connection
+  metrics  cost of recording a request for /metrics, scrape time, and counts checked against a load run
+  profile  request throughput with profiling off, enabled but unsampled, and sampled; cost of a profiled save
+  results  POST /api/calculate/system with the result cache: miss vs hit vs GET /api/results/{hash}
+  session  Refreshing the totals after each edit: valuation session vs full POST /api/calculate/system
+  batch   json_editor_server.py calc configs/sec for 1..N --jobs, and peak memory for few vs thousands of configs
+  export  export to a dozen app paths: sequential shutil.copy2 vs concurrent copy, unchanged and hard-linked exports
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'json_editor_server.py')
+
+LAST_NAMES = ["Owens", "Murray", "Davenport", "Sutton", "Dunn", "Razmek", "Strassner", "Kast",
+              "Kowalski", "Davis", "Nadeau", "Hensley", "Newman", "Garcia", "Nguyen", "Walsh"]
+
+
+def generate_roster(count, seed=1, current_year=2025, spouse_ratio=0.6):
+    """Deterministic synthetic roster shaped like Data/employees.json.
+    
+    Hired in the last 30 years at ages 20-45, 85% men, and spouse_ratio
+    of members married (spouse of the other sex, born up to 4 years
+    earlier or 8 years later).
+    """
+    rng = random.Random(seed)
+    employees = []
+    for i in range(1, count + 1):
+        hired_year = current_year - rng.randint(0, 30)
+        hire_age = rng.randint(20, 45)
+        employee = {
+            "id": i,
+            "name": f"{rng.choice(LAST_NAMES)}, {chr(65 + rng.randrange(26))}.",
+            "hiredYear": hired_year,
+            "dateOfBirth": hired_year - hire_age,
+            "sex": "M" if rng.random() < 0.85 else "F",
+            "spouseDateOfBirth": 0,
+        }
+        if rng.random() < spouse_ratio:
+            employee["spouseDateOfBirth"] = employee["dateOfBirth"] + rng.randint(-4, 8)
+            employee["spouseSex"] = "F" if employee["sex"] == "M" else "M"
+        employees.append(employee)
+    return employees
+
+
+def write_roster(path, count, seed=1, spouse_ratio=0.6):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(generate_roster(count, seed, spouse_ratio=spouse_ratio), f, indent=2)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(json_path, extra_args=()):
+    """Start json_editor_server.py in a subprocess and wait until it accepts connections.
+    
+    Valuation results are cached next to json_path, so every run starts cold.
+    """
+    port = free_port()
+    results_dir = os.path.join(os.path.dirname(os.path.abspath(json_path)), 'results-cache')
+    proc = subprocess.Popen([sys.executable, SERVER_SCRIPT, json_path, str(port),
+                             '--results-cache-dir', results_dir, *extra_args],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc, port
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("Server did not start")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _client_loop(port, path, duration, conditional=False, base_headers=None):
+    """One keep-alive client hammering `path`; returns per-request latencies in seconds.
+    
+    With conditional=True the client revalidates with If-None-Match like a browser would.
+    """
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    latencies = []
+    headers = dict(base_headers or {})
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if conditional and response.getheader('ETag'):
+            headers['If-None-Match'] = response.getheader('ETag')
+    conn.close()
+    return latencies
+
+
+def run_load(port, path, clients, duration, conditional=False, headers=None):
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.starmap(_client_loop, [(port, path, duration, conditional, headers)] * clients)
+    latencies = sorted(l for r in results for l in r)
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "rps": len(latencies) / duration,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def peak_rss_kb(pid):
+    """Peak resident set size of a process (Linux /proc only)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def process_status(pid, field):
+    """A numeric field of /proc/<pid>/status, e.g. VmRSS (kB) or Threads (Linux only)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def bench_upload(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        write_roster(json_path, 10)
+        proc, port = start_server(json_path, ['--max-body-size', str(args.max_body_size)])
+        try:
+            print(f"{'employees':>10}{'MB':>8}{'seconds':>10}{'MB/s':>8}{'status':>8}{'server peak RSS MB':>20}")
+            for count in args.sizes:
+                upload_path = os.path.join(tmp, f'upload-{count}.json')
+                write_roster(upload_path, count)
+                size = os.path.getsize(upload_path)
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+                start = time.perf_counter()
+                with open(upload_path, 'rb') as body:
+                    conn.request("POST", "/api/employees", body=body,
+                                 headers={'Content-Length': str(size), 'Content-Type': 'application/json'})
+                    response = conn.getresponse()
+                    response.read()
+                elapsed = time.perf_counter() - start
+                conn.close()
+                os.remove(upload_path)
+                mb = size / 1e6
+                print(f"{count:>10}{mb:>8.1f}{elapsed:>10.2f}{mb / elapsed:>8.1f}{response.status:>8}"
+                      f"{peak_rss_kb(proc.pid) / 1024:>20.1f}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def bench_import(args):
+    import json_editor_server as server
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        write_roster(json_path, 10)
+        proc, port = start_server(json_path, ['--max-body-size', str(1 << 40)])
+        try:
+            print(f"{'rows':>9}{'format':>7}{'import rows/s':>15}{'server rows/s':>15}{'export rows/s':>15}"
+                  f"{'server peak RSS MB':>20}")
+            for count in args.sizes:
+                roster = generate_roster(count)
+                for format in ('csv', 'jsonl'):
+                    body = ''.join(server.export_batches(iter(roster), format)).encode()
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+                    start = time.perf_counter()
+                    conn.request("POST", f"/api/import?format={format}", body=body)
+                    result = json.loads(conn.getresponse().read())
+                    elapsed = time.perf_counter() - start
+                    if not result.get('success') or result['imported'] != count:
+                        raise SystemExit(f"import failed: {result}")
+                    start = time.perf_counter()
+                    conn.request("GET", f"/api/export.{format}")
+                    exported = conn.getresponse().read()
+                    export_elapsed = time.perf_counter() - start
+                    conn.close()
+                    if exported != body:
+                        raise SystemExit(f"{format} export does not round-trip the import")
+                    print(f"{count:>9}{format:>7}{count / elapsed:>15,.0f}{count / (result['elapsedMs'] / 1000):>15,.0f}"
+                          f"{count / export_elapsed:>15,.0f}{peak_rss_kb(proc.pid) / 1024:>20.1f}")
+                    del body, exported
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def legacy_save(json_path, json_string):
+    """save_json as it was before atomic saves: copy to .backup, rewrite in place"""
+    json.loads(json_string)
+    if os.path.exists(json_path):
+        shutil.copy2(json_path, json_path + '.backup')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        f.write(json_string)
+
+
+def bench_save(args):
+    import json_editor_server as server
+    handler = server.JSONEditorHandler.__new__(server.JSONEditorHandler)
+    print(f"{'employees':>10}{'MB':>7}  {'variant':<26}{'ms/save':>9}{'MB/s':>8}")
+    for count in args.sizes:
+        json_string = json.dumps(generate_roster(count), indent=2)
+        mb = len(json_string) / 1e6
+        variants = [('legacy copy2 + rewrite', None, False)]
+        variants += [(f'atomic, {g} generations', g, False) for g in args.generations]
+        variants += [(f'atomic, {g} generations, gz', g, True) for g in args.generations if g > 1]
+        for label, generations, compress in variants:
+            with tempfile.TemporaryDirectory() as tmp:
+                json_path = os.path.join(tmp, 'employees.json')
+                with open(json_path, 'w', encoding='utf-8') as f:
+                    f.write(json_string)
+                handler.json_file_path = json_path
+                if generations is not None:
+                    server.BACKUPS = server.BackupRotator(generations, compress)
+                start = time.perf_counter()
+                for _ in range(args.saves):
+                    if generations is None:
+                        legacy_save(json_path, json_string)
+                    else:
+                        assert handler.save_json(json_string)
+                elapsed = (time.perf_counter() - start) / args.saves
+                if server.BACKUPS.compressor is not None:
+                    server.BACKUPS.compressor.shutdown(wait=True)
+            print(f"{count:>10}{mb:>7.1f}  {label:<26}{elapsed * 1000:>9.1f}{mb / elapsed:>8.1f}")
+
+
+def bench_edit(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        roster = generate_roster(args.employees)
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(roster, f, indent=2)
+        proc, port = start_server(json_path)
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+            print(f"{args.employees} employees, {args.edits} edits each")
+            print(f"{'method':<28}{'ms/edit':>10}{'bytes/edit':>12}")
+            
+            start = time.perf_counter()
+            sent = 0
+            for i in range(args.edits):
+                body = json.dumps({"name": f"Edited {i}"}).encode()
+                sent += len(body)
+                conn.request("PATCH", f"/api/employees/{i % args.employees + 1}", body=body)
+                conn.getresponse().read()
+            elapsed = (time.perf_counter() - start) / args.edits
+            print(f"{'PATCH /api/employees/{id}':<28}{elapsed * 1000:>10.2f}{sent // args.edits:>12}")
+            
+            start = time.perf_counter()
+            sent = 0
+            for i in range(args.edits):
+                roster[i % args.employees]["name"] = f"Edited {i}"
+                body = json.dumps(roster).encode()
+                sent += len(body)
+                conn.request("POST", "/api/employees", body=body)
+                conn.getresponse().read()
+            elapsed = (time.perf_counter() - start) / args.edits
+            print(f"{'POST /api/employees (all)':<28}{elapsed * 1000:>10.2f}{sent // args.edits:>12}")
+            conn.close()
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def bench_calc(args):
+    import pension_calc
+    config = pension_calc.PensionConfig()
+    print(f"{'employees':>10}{'vested':>10}{'cohorts':>9}{'calc ms':>10}{'cached ms':>11}{'to_dict ms':>12}")
+    for count in args.sizes:
+        employees = pension_calc.parse_employees(generate_roster(count))
+        cache = pension_calc.CohortCache()
+        best = cached = float('inf')
+        for i in range(args.repeat):
+            start = time.perf_counter()
+            result = pension_calc.calculate_system_costs(config, employees, 2025)
+            best = min(best, time.perf_counter() - start)
+            # A wage/multiplier change still hits the cohort cache after the first run
+            scenario = pension_calc.PensionConfig(multiplier=2.5 + i * 0.1)
+            start = time.perf_counter()
+            pension_calc.calculate_system_costs(scenario, employees, 2025, cache)
+            if i > 0:
+                cached = min(cached, time.perf_counter() - start)
+        start = time.perf_counter()
+        result.to_dict()
+        serialize = time.perf_counter() - start
+        cohorts = len({id(r.cohort) for r in result.employeeResults})
+        print(f"{count:>10}{len(result.employeeResults):>10}{cohorts:>9}{best * 1000:>10.1f}"
+              f"{cached * 1000:>11.1f}{serialize * 1000:>12.1f}")
+    print(f"cohort cache: {cache.stats()}")
+
+
+def scalar_system_disbursements(config, employees, current_year):
+    """Per-member pure-Python loop computing what batch_system_disbursements returns"""
+    import pension_calc
+    vestment_requirement = max(config.yearsUntilVestment, 1)
+    cola_perc = config.colaPercent / 100.0
+    inflate = config.expectedFutureInflationRate / 100.0
+    earnings = config.systemWideFacWage if config.multiplierBasedOnFAC else config.systemWideBaseWage
+    totals, finals, needed = [], [], []
+    for employee in employees:
+        if current_year - employee.hiredYear < vestment_requirement:
+            continue
+        years_to_retire = pension_calc.calculate_years_to_retire(employee.hired_age, config)
+        retirement_age = employee.hired_age + years_to_retire
+        years_retired = pension_calc.calculate_years_receiving_pension(
+            retirement_age, employee.sex, config.lifeExpectancyMale, config.lifeExpectancyFemale,
+            config.deltaExtraLife)
+        initial = pension_calc.calculate_initial_annual_pension(earnings, config.multiplier, years_to_retire)
+        total, final = pension_calc.retiree_payout(initial, years_retired, cola_perc, inflate,
+                                                   config.isColaCompounding, config.colaNumber, config.colaSpacing)
+        totals.append(total)
+        finals.append(final)
+        needed.append(pension_calc.amount_needed_at_retirement_with_cola(
+            initial, years_retired, 0, 0, cola_perc, config.isColaCompounding, config.colaNumber,
+            config.colaSpacing))
+    return totals, finals, needed
+
+
+def bench_kernel(args):
+    import numpy as np
+    import pension_calc
+    configs = [
+        ('straight COLA', pension_calc.PensionConfig()),
+        ('compounding COLA', pension_calc.PensionConfig(isColaCompounding=True, colaNumber=10, colaSpacing=2)),
+    ]
+    print(f"{'employees':>10}  {'COLA':<18}{'python ms':>10}{'numpy ms':>10}{'speedup':>9}{'max diff $':>12}")
+    mismatches = []
+    for count in args.sizes:
+        employees = pension_calc.parse_employees(generate_roster(count))
+        for label, config in configs:
+            start = time.perf_counter()
+            expected = scalar_system_disbursements(config, employees, 2025)
+            scalar = time.perf_counter() - start
+            start = time.perf_counter()
+            batch = pension_calc.batch_system_disbursements(config, employees, 2025)
+            vectorized = time.perf_counter() - start
+            max_diff = max(float(np.max(np.abs(batch[key] - np.asarray(values)), initial=0.0))
+                           for key, values in zip(('totalDisbursements', 'finalAnnualPension',
+                                                   'amountNeededAtRetirement'), expected))
+            status = '' if max_diff < 0.005 else '  MISMATCH'
+            if status:
+                mismatches.append(f"{count} employees, {label}: {max_diff:.2e}")
+            print(f"{count:>10}  {label:<18}{scalar * 1000:>10.1f}{vectorized * 1000:>10.1f}"
+                  f"{scalar / vectorized:>8.1f}x{max_diff:>12.2e}{status}")
+    if mismatches:
+        raise SystemExit("NumPy kernel differs from the pure-Python loop by a cent or more: " + "; ".join(mismatches))
+
+
+def takes_solver_fallback(per_dollar, target, option1_pension):
+    """Whether solve_actuarial_equivalent_pension hands this member to the bisection"""
+    if not (per_dollar > 0 and per_dollar != float('inf')):
+        return True
+    pension = target / per_dollar
+    low = option1_pension * 0.50
+    high = option1_pension * 0.99
+    margin = 0.01 / per_dollar
+    return not (low <= pension <= high or pension > high + margin or pension < low - margin)
+
+
+def bench_solver(args):
+    import numpy as np
+    import pension_calc
+    configs = [
+        ('straight COLA', pension_calc.PensionConfig(colaNumber=8, colaSpacing=3)),
+        ('compounding COLA', pension_calc.PensionConfig(isColaCompounding=True, colaNumber=10, colaSpacing=2)),
+        # Inflation wipes out every payment, so the per-dollar total is 0 and every solve falls back
+        ('fallback', pension_calc.PensionConfig(expectedFutureInflationRate=100.0, colaNumber=8, colaSpacing=3)),
+    ]
+    employees = pension_calc.parse_employees(generate_roster(args.employees))
+    pension_calc.batch_option_pensions(configs[0][1], employees, 2025)  # warm-up
+    print(f"{args.employees} employees, Options 2-4 for each")
+    print(f"{'COLA':<18}{'method':<22}{'ms':>10}{'speedup':>9}{'max pension diff $':>20}{'max benefit diff $':>20}")
+    mismatches = []
+    for config_label, config in configs:
+        cola_perc = config.colaPercent / 100.0
+        inflate = config.expectedFutureInflationRate / 100.0
+        batch = pension_calc.batch_system_disbursements(config, employees, 2025)
+        spouse_years = {}
+        for i in batch['index']:
+            employee = employees[i]
+            spouse_years[i] = pension_calc.calculate_years_receiving_spouse_pension(
+                pension_calc.OPTION_3, employee.sex, employee.spouseSex, employee.spouse_age_diff(2025),
+                config.lifeExpectancyMale, config.lifeExpectancyFemale, config.deltaExtraLife)
+        inputs = list(zip(batch['index'], batch['initialAnnualPension'], batch['totalDisbursements'],
+                          batch['yearsReceivingPension']))
+        
+        def scalar(solver):
+            pensions = {}
+            for option in (2, 3, 4):
+                survivor_percent, is_fixed_years = pension_calc.SURVIVOR_TERMS[option]
+                pensions[option] = [
+                    solver(float(target), float(option1), int(years), 10 if option == 2 else spouse_years[i],
+                           cola_perc, inflate, config.isColaCompounding, config.colaNumber, config.colaSpacing,
+                           survivor_percent, is_fixed_years)
+                    for i, option1, target, years in inputs]
+            return pensions
+        
+        start = time.perf_counter()
+        expected = scalar(pension_calc.calculate_actuarial_equivalent_pension)
+        baseline = time.perf_counter() - start
+        start = time.perf_counter()
+        closed = scalar(pension_calc.solve_actuarial_equivalent_pension)
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        batched = pension_calc.batch_option_pensions(config, employees, 2025)
+        batch_elapsed = time.perf_counter() - start
+        batched = {option: batched[f'option{option}'] for option in (2, 3, 4)}
+        
+        fallbacks = 0
+        for option in (2, 3, 4):
+            survivor_percent, is_fixed_years = pension_calc.SURVIVOR_TERMS[option]
+            for i, option1, target, years in inputs:
+                per_dollar = pension_calc.calculate_total_benefit_with_survivor(
+                    1.0, int(years), 10 if option == 2 else spouse_years[i], cola_perc, inflate,
+                    config.isColaCompounding, config.colaNumber, config.colaSpacing, survivor_percent,
+                    is_fixed_years)
+                fallbacks += takes_solver_fallback(per_dollar, float(target), float(option1))
+        if config_label == 'fallback' and not fallbacks:
+            mismatches.append(f"{config_label}: no solve took the bisection fallback")
+        
+        print(f"{config_label:<18}{'bisection (app)':<22}{baseline * 1000:>10.1f}{'1.0x':>9}")
+        for label, result, seconds in (('closed form', closed, elapsed), ('batched closed form', batched, batch_elapsed)):
+            pension_diff = benefit_diff = 0.0
+            for option in (2, 3, 4):
+                survivor_percent, is_fixed_years = pension_calc.SURVIVOR_TERMS[option]
+                diffs = np.abs(np.asarray(result[option]) - np.asarray(expected[option]))
+                pension_diff = max(pension_diff, float(diffs.max(initial=0.0)))
+                # How far each solution is from the Option 1 total it is supposed to equal
+                worst = int(diffs.argmax()) if diffs.size else None
+                if worst is not None:
+                    i, _, target, years = inputs[worst]
+                    total = pension_calc.calculate_total_benefit_with_survivor(
+                        float(result[option][worst]), int(years), 10 if option == 2 else spouse_years[i], cola_perc,
+                        inflate, config.isColaCompounding, config.colaNumber, config.colaSpacing, survivor_percent,
+                        is_fixed_years)
+                    benefit_diff = max(benefit_diff, abs(total - float(target)))
+            status = '' if pension_diff < 0.01 else '  MISMATCH'
+            if status:
+                mismatches.append(f"{config_label}, {label}: {pension_diff:.2e}")
+            print(f"{'':<18}{label:<22}{seconds * 1000:>10.1f}{baseline / seconds:>8.1f}x{pension_diff:>20.2e}"
+                  f"{benefit_diff:>20.2e}{status}")
+        print(f"{'':<18}{len(inputs)} vested, {fallbacks} of {3 * len(inputs)} closed-form solves fell back to the bisection")
+    if mismatches:
+        raise SystemExit("Closed-form Options 2-4 differ from the bisection by a cent or more: " + "; ".join(mismatches))
+
+
+def bench_sweep(args):
+    parameters = {
+        "multiplier": {"start": 2.0, "stop": 3.0, "step": 0.1},
+        "colaPercent": {"start": 0, "stop": 6, "step": 1},
+        "expectedSystemFutureRateReturn": {"start": 5.0, "stop": 8.0, "step": 1.0},
+    }
+    body = json.dumps({"currentYear": 2025, "parameters": parameters}).encode()
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        write_roster(json_path, args.employees)
+        print(f"{args.employees} employees, 11 x 7 x 4 = 308 scenarios ({os.cpu_count()} CPUs)")
+        print(f"{'workers':>8}{'seconds':>10}{'scenarios/s':>13}{'first result ms':>17}{'speedup':>9}")
+        baseline = None
+        for workers in args.workers:
+            proc, port = start_server(json_path, ['--sweep-workers', str(workers)])
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+                # Warm up: spawn the worker processes before timing
+                conn.request("POST", "/api/sweep", body=json.dumps({
+                    "currentYear": 2025, "parameters": {"multiplier": [2.5] * workers}, "chunkSize": 1}).encode())
+                conn.getresponse().read()
+                start = time.perf_counter()
+                conn.request("POST", "/api/sweep", body=body)
+                response = conn.getresponse()
+                first = None
+                completed = 0
+                for line in response:
+                    record = json.loads(line)
+                    if 'scenario' in record:
+                        completed += 1
+                        if first is None:
+                            first = time.perf_counter() - start
+                elapsed = time.perf_counter() - start
+                conn.close()
+            finally:
+                proc.terminate()
+                proc.wait()
+            baseline = baseline or elapsed
+            print(f"{workers:>8}{elapsed:>10.2f}{completed / elapsed:>13.1f}{first * 1000:>17.0f}"
+                  f"{baseline / elapsed:>8.1f}x")
+
+
+def bench_simulate(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        write_roster(json_path, args.employees)
+        proc, port = start_server(json_path, ['--sweep-workers', str(args.workers)])
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+            print(f"{args.employees} employees, {args.workers} worker processes")
+            print(f"{'paths':>9}{'seconds':>10}{'paths/s':>11}{'P(underfunded)':>16}")
+            for paths in [args.paths[0]] + args.paths:  # the first run also starts the pool
+                body = json.dumps({"currentYear": 2025, "paths": paths, "seed": 1}).encode()
+                start = time.perf_counter()
+                conn.request("POST", "/api/simulate", body=body)
+                result = json.loads(conn.getresponse().read())
+                elapsed = time.perf_counter() - start
+                print(f"{paths:>9}{elapsed:>10.2f}{paths / elapsed:>11.0f}{result['probabilityUnderfunded']:>16.4f}")
+            conn.close()
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def bench_load(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        write_roster(json_path, args.employees)
+        kind = "conditional GET" if args.conditional else "GET"
+        print(f"{kind} /api/employees, {args.employees} employees, {args.duration}s per run")
+        print(f"{'mode':<10}{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for mode in args.modes:
+            proc, port = start_server(json_path, ['--mode', mode, '--workers', str(args.workers)])
+            try:
+                for clients in (1, args.clients):
+                    r = run_load(port, '/api/employees', clients, args.duration, args.conditional)
+                    print(f"{mode:<10}{clients:>8}{r['rps']:>10.0f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+def gompertz_table_csv(min_age=20, max_age=120):
+    """Synthetic qx table: mortality doubling roughly every 8 years, women a few years behind men"""
+    rows = ["age,male,female"]
+    for age in range(min_age, max_age + 1):
+        male = min(1.0, 0.00005 * 2.718281828 ** (0.09 * age))
+        female = min(1.0, 0.00003 * 2.718281828 ** (0.09 * age))
+        rows.append(f"{age},{male:.6f},{female:.6f}")
+    return "\n".join(rows) + "\n"
+
+
+def bench_mortality(args):
+    import mortality
+    table = mortality.MortalityTable.from_csv(gompertz_table_csv())
+    rate = 7.25
+    tmpdir = tempfile.mkdtemp(prefix='mortality_bench_')
+    try:
+        cache = mortality.ColumnsCache(tmpdir)
+        print(f"{'commutation columns':<26}{'ms':>10}")
+        for label, lookup in (('build', lambda: cache.lookup(table, rate)),
+                              ('disk cache', lambda: mortality.ColumnsCache(tmpdir).lookup(table, rate)),
+                              ('memory cache', lambda: cache.lookup(table, rate))):
+            start = time.perf_counter()
+            columns, source = lookup()
+            print(f"{label + ' (' + source + ')':<26}{(time.perf_counter() - start) * 1000:>10.3f}")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    
+    rng = random.Random(1)
+    members = [(rng.choice('MF'), rng.randint(45, 70), rng.randint(-10, 10)) for _ in range(args.members)]
+    v = 1.0 / (1.0 + rate / 100.0)
+    
+    def year_by_year(sex, age, spouse_age):
+        # Option 3 the long way: sum v^t tpx, tpy and tpxy over every future year
+        spouse_sex = 'F' if sex == 'M' else 'M'
+        tpx = tpy = 1.0
+        single = spouse = joint = 0.0
+        for t in range(1, 121):
+            i, j = age - table.min_age + t - 1, spouse_age - table.min_age + t - 1
+            tpx *= 1.0 - table.qx[sex][i] if i < len(table.qx[sex]) else 0.0
+            tpy *= 1.0 - table.qx[spouse_sex][j] if j < len(table.qx[spouse_sex]) else 0.0
+            single += v ** t * tpx
+            spouse += v ** t * tpy
+            joint += v ** t * tpx * tpy
+        return single + spouse - joint
+    
+    def commutation(sex, age, spouse_age):
+        return columns.option_factors(sex, age, 'F' if sex == 'M' else 'M', spouse_age)[3]
+    
+    print(f"\nOption 3 annuity factor for {args.members} retirees")
+    print(f"{'method':<26}{'ms':>10}{'speedup':>9}{'max diff':>12}")
+    results = {}
+    for label, factor in (('year by year', year_by_year), ('commutation columns', commutation)):
+        start = time.perf_counter()
+        results[label] = [factor(sex, age, age + gap) for sex, age, gap in members]
+        results[label + ' time'] = time.perf_counter() - start
+    baseline = results['year by year time']
+    for label in ('year by year', 'commutation columns'):
+        elapsed = results[label + ' time']
+        diff = max(abs(a - b) for a, b in zip(results[label], results['year by year']))
+        print(f"{label:<26}{elapsed * 1000:>10.1f}{baseline / elapsed:>8.1f}x{diff:>12.2e}")
+
+
+# Run in a fresh interpreter per measurement so RSS and load time start cold
+COLUMNAR_CHILD = """
+import json, os, sys, time
+sys.path.insert(0, sys.argv[3])
+import pension_calc, roster_store
+mode, path = sys.argv[1], sys.argv[2]
+
+def status_kb(field):
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field + ':'))
+
+with open(path, 'rb') as f:
+    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)  # drop the file from the page cache
+base = status_kb('VmRSS')
+start = time.perf_counter()
+if mode == 'json':
+    with open(path, 'r', encoding='utf-8') as f:
+        employees = pension_calc.parse_employees(json.load(f))
+else:
+    employees = roster_store.ColumnarRoster(path)
+loaded = time.perf_counter()
+loaded_rss = status_kb('VmRSS')
+pension_calc.calculate_system_costs(pension_calc.PensionConfig(), employees, 2025)
+done = time.perf_counter()
+print(json.dumps({"load": loaded - start, "calc": done - loaded, "loaded": loaded_rss - base,
+                  "peak": status_kb('VmHWM')}))
+"""
+
+
+def bench_columnar(args):
+    import roster_store
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        path = roster_store.columns_path(json_path)
+        print(f"{'employees':>10}{'format':>10}{'file MB':>9}{'convert s':>11}{'load ms':>10}{'calc ms':>10}"
+              f"{'loaded RSS MB':>15}{'peak RSS MB':>13}")
+        for count in args.sizes:
+            write_roster(json_path, count)
+            start = time.perf_counter()
+            roster_store.write_columns(path, generate_roster(count))
+            convert = time.perf_counter() - start
+            for format, file_path, converted in (('json', json_path, ''), ('columnar', path, f'{convert:.2f}')):
+                out = subprocess.run([sys.executable, '-c', COLUMNAR_CHILD, format, file_path, package_dir],
+                                     check=True, capture_output=True, text=True).stdout
+                result = json.loads(out)
+                print(f"{count:>10}{format:>10}{os.path.getsize(file_path) / 1e6:>9.1f}"
+                      f"{converted:>11}{result['load'] * 1000:>10.1f}"
+                      f"{result['calc'] * 1000:>10.1f}{result['loaded'] / 1024:>15.1f}{result['peak'] / 1024:>13.1f}")
+
+
+def bench_compress(args):
+    import json_editor_server as server
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        write_roster(json_path, args.employees)
+        
+        # What every GET / used to cost before the page was rendered once
+        server.JSONEditorHandler.json_file_path = json_path
+        start = time.perf_counter()
+        for _ in range(1000):
+            server.JSONEditorHandler.get_html_page().replace('{FILE_PATH}', json_path).encode()
+        render = (time.perf_counter() - start) / 1000
+        start = time.perf_counter()
+        for _ in range(1000):
+            server.JSONEditorHandler.editor_page().body.encoded('gzip')
+        cached = (time.perf_counter() - start) / 1000
+        print(f"page render per request: {render * 1e6:.1f}us before, {cached * 1e6:.2f}us precomputed\n")
+        
+        proc, port = start_server(json_path)
+        try:
+            print(f"{'request':<30}{'Accept-Encoding':<18}{'status':>7}{'bytes':>10}{'req/s':>9}{'p50 ms':>8}")
+            for label, path in (('GET /', '/'), (f'GET /api/employees ({args.employees})', '/api/employees')):
+                for accept in ('', 'gzip', 'deflate', 'br'):
+                    for conditional in (False, True):
+                        headers = {'Accept-Encoding': accept} if accept else {}
+                        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                        conn.request("GET", path, headers=headers)
+                        response = conn.getresponse()
+                        size = len(response.read())
+                        encoding = response.getheader('Content-Encoding', 'identity')
+                        if conditional:
+                            conn.request("GET", path, headers=dict(headers, **{'If-None-Match': response.getheader('ETag')}))
+                            response = conn.getresponse()
+                            size = len(response.read())
+                        conn.close()
+                        if accept and encoding != accept:
+                            continue  # e.g. br without the brotli module
+                        result = run_load(port, path, 1, args.duration, conditional, headers)
+                        print(f"{label:<30}{accept or '(none)':<18}{response.status:>7}{size:>10}"
+                              f"{result['rps']:>9.0f}{result['p50_ms']:>8.2f}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def bench_query(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        write_roster(json_path, args.employees)
+        print(f"{args.employees} employees, {args.pages} pages of 100")
+        print(f"{'backend':<10}{'request':<42}{'ms':>9}{'KB':>9}")
+        for backend, extra_args in (('memory', []), ('sqlite', ['--sqlite'])):
+            proc, port = start_server(json_path, extra_args)
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+                
+                def get(path):
+                    start = time.perf_counter()
+                    conn.request("GET", path)
+                    response = conn.getresponse()
+                    body = response.read()
+                    if response.status != 200:
+                        raise SystemExit(f"GET {path}: {response.status} {body[:200]}")
+                    return time.perf_counter() - start, body
+                
+                # The first query loads (and for sqlite, indexes) the roster
+                elapsed, body = get('/api/employees?limit=100')
+                print(f"{backend:<10}{'first query':<42}{elapsed * 1000:>9.1f}{len(body) / 1024:>9.1f}")
+                elapsed, body = get('/api/employees')
+                print(f"{backend:<10}{'full roster':<42}{elapsed * 1000:>9.1f}{len(body) / 1024:>9.1f}")
+                for label, query in (('page by name', 'sort=name'), ('page by hire year, newest', 'sort=-hiredYear'),
+                                     ('search q=walsh', 'sort=name&q=walsh'),
+                                     ('hiredYearMin=2020', 'sort=dateOfBirth&hiredYearMin=2020')):
+                    after = None
+                    times = []
+                    for _ in range(args.pages):
+                        elapsed, body = get(f'/api/employees?limit=100&{query}' + (f'&after={after}' if after else ''))
+                        times.append(elapsed)
+                        after = json.loads(body)['next']
+                        if after is None:
+                            break
+                    times.sort()
+                    print(f"{backend:<10}{label + ' (median page)':<42}{times[len(times) // 2] * 1000:>9.1f}"
+                          f"{len(body) / 1024:>9.1f}")
+                conn.close()
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+def bench_events(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        write_roster(json_path, args.employees)
+        proc, port = start_server(json_path, ['--watch-interval', str(args.watch_interval)])
+        try:
+            feed = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            feed.request("GET", "/api/events")
+            stream = feed.getresponse()
+            
+            def next_change():
+                """(arrival time, bytes) of the next 'change' event"""
+                event, size = None, 0
+                while True:
+                    line = stream.readline()
+                    if not line:
+                        raise SystemExit("change feed closed")
+                    size += len(line)
+                    if line.startswith(b'event:'):
+                        event = line[6:].strip()
+                    elif line == b'\n':
+                        if event == b'change':
+                            return time.perf_counter(), size
+                        event, size = None, 0
+            
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+            conn.request("GET", "/api/employees")
+            roster = conn.getresponse().read()
+            ids = [employee['id'] for employee in json.loads(roster)]
+            print(f"{args.employees} employees, full roster {len(roster) / 1024:.1f} KB")
+            
+            latencies, sizes = [], []
+            for n in range(args.edits):
+                start = time.perf_counter()
+                conn.request("PATCH", f"/api/employees/{random.choice(ids)}", body=json.dumps({"name": f"Edit {n}"}))
+                conn.getresponse().read()
+                arrived, size = next_change()
+                latencies.append(arrived - start)
+                sizes.append(size)
+            start = time.perf_counter()
+            conn.request("GET", "/api/employees")
+            refetch = len(conn.getresponse().read())
+            refetch_time = time.perf_counter() - start
+            latencies.sort()
+            print(f"PATCH -> change event: p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+                  f"{sum(sizes) / len(sizes):.0f} bytes per event")
+            print(f"PATCH -> full re-fetch: {refetch_time * 1000:.1f} ms, {refetch} bytes")
+            
+            # An edit made by another program is noticed by the file watcher
+            with open(json_path, 'r', encoding='utf-8') as f:
+                employees = json.load(f)
+            employees[0]['name'] = 'Edited Outside'
+            start = time.perf_counter()
+            with open(json_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(employees, f)
+            os.replace(json_path + '.tmp', json_path)
+            arrived, size = next_change()
+            print(f"external file edit -> change event: {(arrived - start) * 1000:.0f} ms "
+                  f"(--watch-interval {args.watch_interval}), {size} bytes")
+            conn.close()
+            feed.close()
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+IDLE_REQUEST = b'GET /api/employees/1 HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'
+
+
+def read_response(sock):
+    """Read one Content-Length HTTP response from a raw socket; returns (status line, body)"""
+    data = b''
+    while b'\r\n\r\n' not in data:
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    head, _, body = data.partition(b'\r\n\r\n')
+    length = next((int(line.split(b':', 1)[1]) for line in head.split(b'\r\n')
+                   if line.lower().startswith(b'content-length:')), 0)
+    while len(body) < length:
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("connection closed")
+        body += chunk
+    return head.split(b'\r\n', 1)[0], body
+
+
+def open_idle_connections(port, count):
+    """count keep-alive connections that have each made one request and then gone quiet"""
+    sockets = []
+    for _ in range(count):
+        sock = socket.create_connection(("127.0.0.1", port), timeout=30)
+        sock.sendall(IDLE_REQUEST)
+        sockets.append(sock)
+    for sock in sockets:
+        read_response(sock)
+    return sockets
+
+
+def bench_connections(args):
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        write_roster(json_path, args.employees)
+        print(f"{args.idle} idle connections, {args.clients} clients on GET {args.path} for {args.duration}s")
+        print(f"{'mode':<10}{'idle':>6}{'open s':>8}{'threads':>9}{'RSS MB':>8}{'KB/conn':>9}"
+              f"{'req/s':>8}{'p50 ms':>8}{'p99 ms':>8}{'still open':>11}")
+        for mode in args.modes:
+            proc, port = start_server(json_path, ['--mode', mode, '--keepalive-timeout', '600',
+                                                  '--backlog', str(min(args.idle, 4096))])
+            try:
+                run_load(port, args.path, 1, 1)  # load the roster before measuring
+                base = process_status(proc.pid, 'VmRSS')
+                for idle in (0, args.idle):
+                    start = time.perf_counter()
+                    sockets = open_idle_connections(port, idle)
+                    opened = time.perf_counter() - start
+                    rss = process_status(proc.pid, 'VmRSS')
+                    threads = process_status(proc.pid, 'Threads')
+                    result = run_load(port, args.path, args.clients, args.duration)
+                    # Each idle connection should still answer
+                    alive = 0
+                    for sock in sockets[::max(1, idle // 100)]:
+                        try:
+                            sock.sendall(IDLE_REQUEST)
+                            alive += read_response(sock)[0].startswith(b'HTTP/1.1 200')
+                        except OSError:
+                            pass
+                    sampled = len(sockets[::max(1, idle // 100)])
+                    per_connection = (rss - base) / idle if idle else 0
+                    print(f"{mode:<10}{idle:>6}{opened:>8.2f}{threads:>9}{rss / 1024:>8.1f}{per_connection:>9.1f}"
+                          f"{result['rps']:>8.0f}{result['p50_ms']:>8.2f}{result['p99_ms']:>8.2f}"
+                          f"{f'{alive}/{sampled}' if idle else '-':>11}")
+                    for sock in sockets:
+                        sock.close()
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+def bench_metrics(args):
+    import timeit
+    import json_editor_server as server
+    metrics = server.ServerMetrics()
+    
+    def record():
+        metrics.request_started()
+        metrics.request_finished('GET', metrics.route('/api/employees/12'), 200, 512, 0.0013)
+    
+    for label, func in (('record one request (route lookup included)', record),
+                        ('record one operation (fsync, json_parse, ...)', lambda: metrics.observe('fsync', 0.002))):
+        per_call = timeit.timeit(func, number=args.iterations) / args.iterations
+        print(f"{label:<48}{per_call * 1e6:>8.2f} us")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        write_roster(json_path, args.employees)
+        for mode in args.modes:
+            proc, port = start_server(json_path, ['--mode', mode])
+            try:
+                result = run_load(port, '/api/employees/1', args.clients, args.duration)
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                start = time.perf_counter()
+                conn.request("GET", "/metrics")
+                text = conn.getresponse().read().decode()
+                scrape = time.perf_counter() - start
+                conn.close()
+                counted = sum(int(line.rsplit(' ', 1)[1]) for line in text.splitlines()
+                              if line.startswith('json_editor_http_requests_total{route="/api/employees/{id}"'))
+                print(f"{mode:<10}{result['requests']} requests at {result['rps']:.0f} req/s "
+                      f"(p50 {result['p50_ms']:.2f} ms), /metrics counted {counted}, "
+                      f"scrape {scrape * 1000:.1f} ms for {len(text)} bytes")
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+def bench_profile(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        write_roster(json_path, args.employees)
+        with open(json_path, 'rb') as f:
+            roster = f.read()
+        profile_dir = os.path.join(tmp, 'profiles')
+        print(f"{'configuration':<40}{'req/s':>8}{'p50 ms':>8}{'p99 ms':>8}{'POST s':>8}{'profiles':>9}")
+        for label, extra_args, headers in (
+                ('profiling off', [], {}),
+                ('--profile-dir, no request sampled', ['--profile-dir', profile_dir], {}),
+                ('--profile-rate 0.01', ['--profile-dir', profile_dir, '--profile-rate', '0.01'], {}),
+                ('X-Profile: cpu on every request', ['--profile-dir', profile_dir], {'X-Profile': 'cpu'}),
+                ('X-Profile: all on every request', ['--profile-dir', profile_dir], {'X-Profile': 'all'})):
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            proc, port = start_server(json_path, extra_args + ['--profile-keep', '100000'])
+            try:
+                result = run_load(port, '/api/employees/1', args.clients, args.duration, headers=headers)
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+                start = time.perf_counter()
+                conn.request("POST", "/api/employees", body=roster, headers=headers)
+                conn.getresponse().read()
+                post = time.perf_counter() - start
+                conn.close()
+                kept = len([name for name in os.listdir(profile_dir) if name.endswith('.json')]) \
+                    if os.path.isdir(profile_dir) else 0
+                print(f"{label:<40}{result['rps']:>8.0f}{result['p50_ms']:>8.2f}{result['p99_ms']:>8.2f}"
+                      f"{post:>8.2f}{kept:>9}")
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+def bench_export(args):
+    import json_editor_server as server
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        write_roster(json_path, args.employees)
+        targets = [os.path.join(tmp, f'simulator-{index}', 'Documents') for index in range(args.targets)]
+        for target in targets:
+            os.makedirs(target)
+        print(f"{args.employees} employees ({os.path.getsize(json_path) / 1e6:.1f} MB) to {args.targets} app paths")
+        print(f"{'export':<42}{'ms':>9}{'exported':>10}  method")
+        
+        def clear():
+            for target in targets:
+                try:
+                    os.remove(os.path.join(target, 'employees.json'))
+                except FileNotFoundError:
+                    pass
+        
+        start = time.perf_counter()
+        for target in targets:
+            shutil.copy2(json_path, os.path.join(target, 'employees.json'))
+        print(f"{'shutil.copy2 one at a time (before)':<42}{(time.perf_counter() - start) * 1000:>9.1f}"
+              f"{args.targets:>10}  copy")
+        for label, hardlink, fresh in (('concurrent, new targets', False, True),
+                                       ('concurrent, targets already current', False, False),
+                                       ('concurrent, one target changed', False, None),
+                                       ('--export-hardlink, new targets', True, True)):
+            if fresh:
+                clear()
+                server.EXPORTS.digests.clear()
+            elif fresh is None:
+                with open(os.path.join(targets[0], 'employees.json'), 'w') as f:
+                    f.write('[]')
+            server.EXPORTS.configure(hardlink, False)
+            result = server.EXPORTS.export(json_path, targets)
+            methods = sorted({target['method'] for target in result['targets'] if target['method']}) or ['-']
+            exported = sum(target['status'] == 'exported' for target in result['targets'])
+            print(f"{label:<42}{result['seconds'] * 1000:>9.1f}{exported:>10}  {', '.join(methods)}")
+
+
+def bench_results(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        print(f"{'employees':>10}{'request':<44}{'no cache ms':>13}{'miss ms':>9}{'hit ms':>8}{'GET hash ms':>13}")
+        for count in args.sizes:
+            write_roster(json_path, count)
+            timings = {}
+            for label, extra_args in (('off', ['--results-cache-size', '0']), ('on', [])):
+                shutil.rmtree(os.path.join(tmp, 'results-cache'), ignore_errors=True)
+                proc, port = start_server(json_path, extra_args)
+                try:
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=3600)
+                    for name, body in (('summary', {"includeEmployees": False}), ('employee results', {}),
+                                       ('summary, exact', {"includeEmployees": False, "exact": True})):
+                        body = json.dumps(dict(body, currentYear=2025))
+                        runs = []
+                        for _ in range(2):
+                            start = time.perf_counter()
+                            conn.request("POST", "/api/calculate/system", body=body)
+                            data = conn.getresponse().read()
+                            runs.append(time.perf_counter() - start)
+                        key = json.loads(data).get('resultHash')
+                        if key:
+                            start = time.perf_counter()
+                            conn.request("GET", f"/api/results/{key}")
+                            conn.getresponse().read()
+                            runs.append(time.perf_counter() - start)
+                        timings[label, name] = runs
+                    conn.close()
+                finally:
+                    proc.terminate()
+                    proc.wait()
+            for name in ('summary', 'employee results', 'summary, exact'):
+                off, on = timings['off', name], timings['on', name]
+                print(f"{count:>10}{'  ' + name:<44}{off[1] * 1000:>13.1f}{on[0] * 1000:>9.1f}{on[1] * 1000:>8.1f}"
+                      f"{on[2] * 1000:>13.1f}")
+
+
+def bench_session(args):
+    rnd = random.Random(args.seed)
+    print(f"{'employees':>10}{'build ms':>10}{'session ms/edit':>17}{'apply ms':>10}{'full ms/edit':>14}"
+          f"{'max rel diff':>14}{'consistent':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'employees.json')
+        for count in args.sizes:
+            write_roster(json_path, count, seed=args.seed)
+            proc, port = start_server(json_path, ['--results-cache-size', '0'])
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=3600)
+                
+                def request(method, path, body=None):
+                    conn.request(method, path, body=json.dumps(body) if body is not None else None)
+                    return json.loads(conn.getresponse().read())
+                
+                def edit():
+                    request("PATCH", f"/api/employees/{rnd.randint(1, count)}",
+                            {"hiredYear": rnd.randint(1995, 2024), "sex": rnd.choice("MF")})
+                
+                session = request("POST", "/api/valuation/session", {"currentYear": 2025, "includeEmployees": False})
+                build = session['session']['buildMs']
+                
+                applied = 0.0
+                start = time.perf_counter()
+                for _ in range(args.edits):
+                    edit()
+                    totals = request("GET", "/api/valuation/session?employees=false")
+                    applied += totals['session']['lastEditMs']
+                session_seconds = (time.perf_counter() - start) / args.edits
+                
+                full_edits = max(1, min(args.edits, args.full_edits))
+                start = time.perf_counter()
+                for _ in range(full_edits):
+                    edit()
+                    request("POST", "/api/calculate/system", {"currentYear": 2025, "includeEmployees": False})
+                full_seconds = (time.perf_counter() - start) / full_edits
+                
+                check = request("GET", "/api/valuation/session/verify")
+                conn.close()
+            finally:
+                proc.terminate()
+                proc.wait()
+            print(f"{count:>10}{build:>10.1f}{session_seconds * 1000:>17.2f}{applied / args.edits:>10.4f}"
+                  f"{full_seconds * 1000:>14.2f}{check['maxRelativeDifference']:>14.1e}{str(check['consistent']):>12}")
+
+
+BATCH_CHILD = """
+import resource, subprocess, sys
+proc = subprocess.run(sys.argv[1:], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+print(proc.stderr.strip().splitlines()[-1])
+print(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+"""
+
+
+def bench_batch(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        roster_path = os.path.join(tmp, 'employees.json')
+        write_roster(roster_path, args.employees)
+        rng = random.Random(1)
+        config_dir = os.path.join(tmp, 'configs')
+        os.makedirs(config_dir)
+        for index in range(max(args.configs)):
+            with open(os.path.join(config_dir, f'config-{index:06d}.json'), 'w') as f:
+                json.dump({"multiplier": round(rng.uniform(2.0, 3.0), 2), "colaPercent": rng.choice([0, 2, 3]),
+                           "yearsUntilVestment": rng.randint(5, 12)}, f)
+        names = sorted(os.listdir(config_dir))
+        print(f"{args.employees} employees")
+        print(f"{'configs':>8}{'jobs':>6}{'seconds':>9}{'configs/s':>11}{'peak RSS MB':>13}")
+        for count in args.configs:
+            subset = os.path.join(tmp, f'configs-{count}')
+            os.makedirs(subset)
+            for name in names[:count]:
+                os.link(os.path.join(config_dir, name), os.path.join(subset, name))
+            for jobs in args.jobs:
+                command = [sys.executable, SERVER_SCRIPT, 'calc', '--configs', subset, '--roster', roster_path,
+                           '--current-year', '2025', '--jobs', str(jobs)]
+                start = time.perf_counter()
+                out = subprocess.run([sys.executable, '-c', BATCH_CHILD] + command,
+                                     check=True, capture_output=True, text=True).stdout.splitlines()
+                elapsed = time.perf_counter() - start
+                # Largest single process: the calc process itself, or one of its workers
+                print(f"{count:>8}{jobs:>6}{elapsed:>9.2f}{count / elapsed:>11.1f}{int(out[-1]) / 1024:>13.1f}")
+
+
+SUITE_YEAR = 2025
+
+
+def summarize_runs(runs):
+    runs = sorted(runs)
+    mean = sum(runs) / len(runs)
+    return {"median": runs[len(runs) // 2], "min": runs[0], "mean": mean,
+            "stdev": (sum((run - mean) ** 2 for run in runs) / len(runs)) ** 0.5, "runs": runs}
+
+
+def time_case(func, repeat, warmup=1):
+    """Seconds for each of repeat calls of func, after warmup untimed calls"""
+    for _ in range(warmup):
+        func()
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def suite_meta(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(SERVER_SCRIPT),
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    import platform
+    return {"created": time.strftime('%Y-%m-%dT%H:%M:%S%z'), "commit": commit, "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(), "numpy": numpy_version,
+            "sizes": args.sizes, "repeat": args.repeat, "seed": args.seed}
+
+
+def suite_file_cases(tmp, json_path, roster, repeat):
+    """load_json, save_json, save_json_stream and export_to_app, called on a handler in this process"""
+    import json_editor_server as server
+    server.JSONEditorHandler.json_file_path = json_path
+    handler = server.JSONEditorHandler.__new__(server.JSONEditorHandler)
+    text = json.dumps(roster, indent=2)
+    data = text.encode()
+    app_dir = os.path.join(tmp, 'app')
+    os.makedirs(app_dir, exist_ok=True)
+    
+    def save_stream():
+        handler.save_json_stream(data[i:i + server.BODY_CHUNK_SIZE] for i in range(0, len(data), server.BODY_CHUNK_SIZE))
+    
+    return [('file load_json', time_case(handler.load_json, repeat)),
+            ('file save_json', time_case(lambda: handler.save_json(text), repeat)),
+            ('file save_json_stream', time_case(save_stream, repeat)),
+            ('file export_to_app', time_case(lambda: handler.export_to_app(app_dir), repeat))]
+
+
+def suite_calc_cases(roster, repeat):
+    """pension_calc routines the server runs, on a parsed roster"""
+    import pension_calc
+    config = pension_calc.PensionConfig()
+    cases = [('calc parse_employees', time_case(lambda: pension_calc.parse_employees(roster), repeat))]
+    employees = pension_calc.parse_employees(roster)
+    cases.append(('calc calculate_system_costs exact',
+                  time_case(lambda: pension_calc.calculate_system_costs(config, employees, SUITE_YEAR), repeat)))
+    cache = pension_calc.CohortCache()
+    multipliers = itertools.count()
+    cases.append(('calc calculate_system_costs cached', time_case(
+        lambda: pension_calc.calculate_system_costs(pension_calc.PensionConfig(multiplier=2.0 + next(multipliers) % 10 / 10),
+                                                    employees, SUITE_YEAR, cache), repeat)))
+    result = pension_calc.calculate_system_costs(config, employees, SUITE_YEAR)
+    cases.append(('calc SystemResult.to_dict', time_case(result.to_dict, repeat)))
+    if pension_calc.np is not None:
+        cases.append(('calc batch_system_disbursements',
+                      time_case(lambda: pension_calc.batch_system_disbursements(config, employees, SUITE_YEAR), repeat)))
+        cases.append(('calc batch_option_pensions',
+                      time_case(lambda: pension_calc.batch_option_pensions(config, employees, SUITE_YEAR), repeat)))
+    return cases
+
+
+def suite_http_cases(tmp, json_path, roster, repeat):
+    """Every route, end to end against a server subprocess"""
+    import pension_calc
+    csv_body = "name,hiredYear,dateOfBirth,sex,spouseDateOfBirth,spouseSex\n" + "".join(
+        f'"{e["name"]}",{e["hiredYear"]},{e["dateOfBirth"]},{e["sex"]},{e["spouseDateOfBirth"]},{e.get("spouseSex", "")}\n'
+        for e in roster)
+    roster_body = json.dumps(roster, indent=2).encode()
+    app_dir = os.path.join(tmp, 'http-app')
+    os.makedirs(app_dir, exist_ok=True)
+    new_employee = {"name": "Suite, B.", "hiredYear": 2010, "dateOfBirth": 1985, "sex": "F", "spouseDateOfBirth": 0}
+    mortality_body = json.dumps({"table": gompertz_table_csv(), "rate": 7.0})
+    proc, port = start_server(json_path, ['--sweep-workers', '1'])
+    cases = []
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=3600)
+        
+        def request(method, path, body=None, headers=None, expect=(200,)):
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            data = response.read()
+            if response.status not in expect:
+                raise SystemExit(f"{method} {path}: {response.status} {data[:200]}")
+            return response, data
+        
+        etag = request("GET", "/api/employees")[0].getheader('ETag')
+        added = []
+        multipliers = itertools.count()
+        
+        def add():
+            added.append(json.loads(request("POST", "/api/employees", json.dumps(new_employee),
+                                                       expect=(201,))[1])['employee']['id'])
+        
+        routes = [
+            ("GET /", lambda: request("GET", "/")),
+            ("GET /api/employees", lambda: request("GET", "/api/employees")),
+            ("GET /api/employees If-None-Match", lambda: request("GET", "/api/employees", headers={'If-None-Match': etag},
+                                                                 expect=(304,))),
+            ("GET /api/employees?limit=100&sort=name", lambda: request("GET", "/api/employees?limit=100&sort=name")),
+            ("GET /api/employees/{id}", lambda: request("GET", "/api/employees/1")),
+            ("GET /api/export.csv", lambda: request("GET", "/api/export.csv")),
+            ("GET /api/export.jsonl", lambda: request("GET", "/api/export.jsonl")),
+            ("GET /api/apppath", lambda: request("GET", "/api/apppath")),
+            ("GET /api/calculate/cache", lambda: request("GET", "/api/calculate/cache")),
+            ("GET /api/mortality/cache", lambda: request("GET", "/api/mortality/cache")),
+            ("GET /metrics", lambda: request("GET", "/metrics")),
+            ("PATCH /api/employees/{id}", lambda: request("PATCH", "/api/employees/1", json.dumps({"name": "Suite, A."}))),
+            ("POST /api/employees (one)", add),
+            ("DELETE /api/employees/{id}", lambda: request("DELETE", f"/api/employees/{added.pop()}")),
+            # A new multiplier each time, so the result cache never has the answer
+            ("POST /api/calculate/system", lambda: request("POST", "/api/calculate/system", json.dumps(
+                {"currentYear": SUITE_YEAR, "config": {"multiplier": 2.0 + next(multipliers) / 10000}}))),
+            ("POST /api/calculate/system (cached)", lambda: request("POST", "/api/calculate/system",
+                                                                    json.dumps({"currentYear": SUITE_YEAR}))),
+            ("POST /api/sweep (9 scenarios)", lambda: request("POST", "/api/sweep", json.dumps(
+                {"currentYear": SUITE_YEAR, "parameters": {"multiplier": {"start": 2.0, "stop": 2.8, "step": 0.1}}}))),
+            ("POST /api/mortality", lambda: request("POST", "/api/mortality", mortality_body)),
+            ("POST /api/export", lambda: request("POST", "/api/export", json.dumps({"appPath": app_dir}))),
+            ("POST /api/import (csv)", lambda: request("POST", "/api/import", csv_body,
+                                                       headers={'Content-Type': 'text/csv'})),
+            ("POST /api/employees (roster)", lambda: request("POST", "/api/employees", roster_body)),
+        ]
+        if pension_calc.np is not None:
+            # The server runs on this interpreter, so it has NumPy too
+            routes.insert(-4, ("POST /api/simulate (2000 paths)", lambda: request("POST", "/api/simulate", json.dumps(
+                {"currentYear": SUITE_YEAR, "paths": 2000, "seed": 1}))))
+        for name, func in routes:
+            # DELETE needs one added employee per run (and one for the warm-up)
+            if name.startswith('DELETE'):
+                for _ in range(repeat + 1 - len(added)):
+                    add()
+            cases.append(('http ' + name, time_case(func, repeat)))
+        conn.close()
+    finally:
+        proc.terminate()
+        proc.wait()
+    return cases
+
+
+def bench_suite(args):
+    results = []
+    print(f"{'case':<52}{'employees':>10}{'median ms':>11}{'min ms':>10}{'stdev %':>9}")
+    for size in args.sizes:
+        roster = generate_roster(size, args.seed)
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, 'employees.json')
+            groups = []
+            if 'file' in args.groups:
+                groups.append(lambda: suite_file_cases(tmp, json_path, roster, args.repeat))
+            if 'calc' in args.groups:
+                groups.append(lambda: suite_calc_cases(roster, args.repeat))
+            if 'http' in args.groups:
+                groups.append(lambda: suite_http_cases(tmp, json_path, roster, args.repeat))
+            for group in groups:
+                with open(json_path, 'w', encoding='utf-8') as f:
+                    json.dump(roster, f, indent=2)
+                for case, runs in group():
+                    summary = summarize_runs(runs)
+                    results.append({"case": case, "size": size, **summary})
+                    print(f"{case:<52}{size:>10}{summary['median'] * 1000:>11.2f}{summary['min'] * 1000:>10.2f}"
+                          f"{summary['stdev'] / summary['mean'] * 100 if summary['mean'] else 0:>9.1f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"meta": suite_meta(args), "results": results}, f, indent=2)
+        print(f"Wrote {len(results)} results to {args.output}")
+
+
+def bench_compare(args):
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+    before = {(r['case'], r['size']): r[args.stat] for r in baseline['results']}
+    after = {(r['case'], r['size']): r[args.stat] for r in current['results']}
+    for label, run in (('baseline', baseline), ('current', current)):
+        meta = run.get('meta', {})
+        print(f"{label:<9} {meta.get('created')}  commit {str(meta.get('commit'))[:12]}  python {meta.get('python')}")
+    print(f"{'case':<52}{'employees':>10}{'before ms':>11}{'after ms':>10}{'change':>9}")
+    regressions = 0
+    for key in sorted(before.keys() | after.keys(), key=lambda key: (key[1], key[0])):
+        case, size = key
+        if key not in after or key not in before:
+            status = 'missing' if key not in after else 'new'
+            print(f"{case:<52}{size:>10}{before.get(key, 0) * 1000:>11.2f}{after.get(key, 0) * 1000:>10.2f}{status:>9}")
+            continue
+        old, new = before[key], after[key]
+        change = new / old - 1 if old else 0.0
+        # Below the noise floor a large relative change is still a few microseconds
+        if change > args.threshold and new - old > args.floor:
+            status = '  REGRESSION'
+            regressions += 1
+        elif change < -args.threshold and old - new > args.floor:
+            status = '  faster'
+        else:
+            status = ''
+        print(f"{case:<52}{size:>10}{old * 1000:>11.2f}{new * 1000:>10.2f}{change * 100:>+8.1f}%{status}")
+    print(f"{regressions} regression(s) above {args.threshold * 100:.0f}% ({args.stat})")
+    sys.exit(1 if regressions else 0)
+
+
+def bench_roster(args):
+    write_roster(args.output, args.employees, args.seed, args.spouse_ratio)
+    print(f"Wrote {args.employees} employees to {args.output} ({os.path.getsize(args.output)} bytes)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="json_editor_server.py benchmarks")
+    sub = parser.add_subparsers(dest='benchmark', required=True)
+
+    load = sub.add_parser('load', help="GET /api/employees throughput, 1 vs N clients")
+    load.add_argument('--employees', type=int, default=1000)
+    load.add_argument('--clients', type=int, default=8)
+    load.add_argument('--duration', type=float, default=3.0)
+    load.add_argument('--workers', type=int, default=16)
+    load.add_argument('--modes', nargs='+', default=['single', 'threaded', 'pool'])
+    load.add_argument('--conditional', action='store_true',
+                      help="revalidate with If-None-Match (304 responses)")
+    load.set_defaults(func=bench_load)
+
+    upload = sub.add_parser('upload', help="POST /api/employees time and server peak RSS")
+    upload.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 500000])
+    upload.add_argument('--max-body-size', type=int, default=1024 * 1024 * 1024)
+    upload.set_defaults(func=bench_upload)
+
+    import_ = sub.add_parser('import', help="POST /api/import and GET /api/export.* rows/sec")
+    import_.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    import_.set_defaults(func=bench_import)
+    
+    save = sub.add_parser('save', help="save_json throughput at several backup depths")
+    save.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    save.add_argument('--generations', type=int, nargs='+', default=[1, 10, 50])
+    save.add_argument('--saves', type=int, default=20)
+    save.set_defaults(func=bench_save)
+
+    edit = sub.add_parser('edit', help="single-employee edit cost, PATCH vs full POST")
+    edit.add_argument('--employees', type=int, default=50000)
+    edit.add_argument('--edits', type=int, default=50)
+    edit.set_defaults(func=bench_edit)
+
+    calc = sub.add_parser('calc', help="system-wide valuation time with pension_calc.py")
+    calc.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    calc.add_argument('--repeat', type=int, default=3, help="at least 2 to time cached runs")
+    calc.set_defaults(func=bench_calc)
+    
+    kernel = sub.add_parser('kernel', help="NumPy disbursement kernel vs pure-Python loop")
+    kernel.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    kernel.set_defaults(func=bench_kernel)
+    
+    solver = sub.add_parser('solver', help="actuarial equivalence: bisection vs closed form")
+    solver.add_argument('--employees', type=int, default=10000)
+    solver.set_defaults(func=bench_solver)
+    
+    sweep = sub.add_parser('sweep', help="POST /api/sweep throughput by worker count")
+    sweep.add_argument('--employees', type=int, default=10000)
+    sweep.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, os.cpu_count() or 1}))
+    sweep.set_defaults(func=bench_sweep)
+    
+    simulate = sub.add_parser('simulate', help="POST /api/simulate time by path count")
+    simulate.add_argument('--employees', type=int, default=10000)
+    simulate.add_argument('--paths', type=int, nargs='+', default=[10000, 100000])
+    simulate.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    simulate.set_defaults(func=bench_simulate)
+    
+    mortality = sub.add_parser('mortality', help="qx table annuity factors: year by year vs commutation columns")
+    mortality.add_argument('--members', type=int, default=100000)
+    mortality.set_defaults(func=bench_mortality)
+    
+    columnar = sub.add_parser('columnar', help="cold load time and RSS: employees.json vs columnar roster")
+    columnar.add_argument('--sizes', type=int, nargs='+', default=[100000, 500000])
+    columnar.set_defaults(func=bench_columnar)
+    
+    compress = sub.add_parser('compress', help="bytes and req/s of GET / and GET /api/employees by encoding")
+    compress.add_argument('--employees', type=int, default=10000)
+    compress.add_argument('--duration', type=float, default=2.0)
+    compress.set_defaults(func=bench_compress)
+    
+    query = sub.add_parser('query', help="paged GET /api/employees latency, in memory vs --sqlite")
+    query.add_argument('--employees', type=int, default=100000)
+    query.add_argument('--pages', type=int, default=20)
+    query.set_defaults(func=bench_query)
+    
+    events = sub.add_parser('events', help="edit-to-client latency: change feed vs re-fetching the roster")
+    events.add_argument('--employees', type=int, default=10000)
+    events.add_argument('--edits', type=int, default=200)
+    events.add_argument('--watch-interval', type=float, default=0.2)
+    events.set_defaults(func=bench_events)
+    
+    connections = sub.add_parser('connections', help="latency and memory per connection with 5k idle connections")
+    connections.add_argument('--idle', type=int, default=5000)
+    connections.add_argument('--clients', type=int, default=4)
+    connections.add_argument('--duration', type=float, default=5.0)
+    connections.add_argument('--employees', type=int, default=1000)
+    connections.add_argument('--path', default='/api/employees/1')
+    connections.add_argument('--modes', nargs='+', default=['asyncio', 'threaded'])
+    connections.set_defaults(func=bench_connections)
+    
+    metrics = sub.add_parser('metrics', help="per-request cost of /metrics instrumentation")
+    metrics.add_argument('--iterations', type=int, default=200000)
+    metrics.add_argument('--employees', type=int, default=1000)
+    metrics.add_argument('--clients', type=int, default=8)
+    metrics.add_argument('--duration', type=float, default=3.0)
+    metrics.add_argument('--modes', nargs='+', default=['threaded', 'pool', 'asyncio'])
+    metrics.set_defaults(func=bench_metrics)
+    
+    profile = sub.add_parser('profile', help="overhead of request profiling, unsampled and sampled")
+    profile.add_argument('--employees', type=int, default=20000)
+    profile.add_argument('--clients', type=int, default=4)
+    profile.add_argument('--duration', type=float, default=3.0)
+    profile.set_defaults(func=bench_profile)
+    
+    results = sub.add_parser('results', help="POST /api/calculate/system with and without the result cache")
+    results.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    results.set_defaults(func=bench_results)
+    
+    session = sub.add_parser('session', help="Totals after each edit: valuation session vs full valuation")
+    session.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    session.add_argument('--edits', type=int, default=500, help="edits timed against the session")
+    session.add_argument('--full-edits', type=int, default=20, help="edits timed against full valuations")
+    session.add_argument('--seed', type=int, default=1)
+    session.set_defaults(func=bench_session)
+    
+    batch = sub.add_parser('batch', help="calc subcommand throughput by --jobs and memory by config count")
+    batch.add_argument('--employees', type=int, default=10000)
+    batch.add_argument('--configs', type=int, nargs='+', default=[100, 2000])
+    batch.add_argument('--jobs', type=int, nargs='+', default=sorted({1, 2, os.cpu_count() or 1}))
+    batch.set_defaults(func=bench_batch)
+    
+    export = sub.add_parser('export', help="export to many app paths: copy2 loop vs concurrent, skipped and linked")
+    export.add_argument('--employees', type=int, default=100000)
+    export.add_argument('--targets', type=int, default=12)
+    export.set_defaults(func=bench_export)
+    
+    suite = sub.add_parser('suite', help="time file operations, HTTP routes and calculations; JSON results")
+    suite.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    suite.add_argument('--repeat', type=int, default=5)
+    suite.add_argument('--seed', type=int, default=1)
+    suite.add_argument('--groups', nargs='+', choices=['file', 'calc', 'http'], default=['file', 'calc', 'http'])
+    suite.add_argument('--output', help="write the results here as JSON")
+    suite.set_defaults(func=bench_suite)
+    
+    compare = sub.add_parser('compare', help="compare two suite results and flag regressions")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.10, help="relative slowdown that counts (default 0.10)")
+    compare.add_argument('--floor', type=float, default=0.0005,
+                         help="ignore changes smaller than this many seconds (default 0.0005)")
+    compare.add_argument('--stat', choices=['median', 'min', 'mean'], default='median')
+    compare.set_defaults(func=bench_compare)
+    
+    roster = sub.add_parser('roster', help="write a synthetic employees.json")
+    roster.add_argument('output')
+    roster.add_argument('--employees', type=int, default=1000)
+    roster.add_argument('--seed', type=int, default=1)
+    roster.add_argument('--spouse-ratio', type=float, default=0.6)
+    roster.set_defaults(func=bench_roster)
+    
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
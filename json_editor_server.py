@@ -2,119 +2,3555 @@
 """
 Simple HTTP server for editing employees.json file.
 Usage: python3 json_editor_server.py [json_file_path] [port]
+       python3 json_editor_server.py calc --configs DIR --roster employees.json [--jobs N]
+       python3 json_editor_server.py warm --configs DIR --roster employees.json [--jobs N]
 """
 
+import argparse
+import asyncio
+import bisect
+import codecs
+import collections
+import cProfile
+import csv
+import gzip
+import hashlib
+import http.client
 import http.server
+import io
+import itertools
+import multiprocessing
 import socketserver
 import json
 import os
+import random
+import re
+import shutil
+import sqlite3
 import sys
-from urllib.parse import urlparse, parse_qs
+import tempfile
+import threading
+import time
+import traceback
+import tracemalloc
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from email.utils import formatdate, parsedate_to_datetime
+from json.encoder import encode_basestring_ascii
+from urllib.parse import urlencode, urlparse, parse_qs
+
+try:
+    import brotli
+except ImportError:  # optional: without it the page is also kept deflated
+    brotli = None
+
+try:
+    import resource
+except ImportError:  # not on Windows; --mode asyncio then keeps the default open-file limit
+    resource = None
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; exports then copy instead of cloning
+    fcntl = None
+
+import mortality
+import pension_calc
+import roster_db
+import roster_store
 
 # Default configuration
 DEFAULT_PORT = 8080
 DEFAULT_JSON_PATH = os.path.expanduser("~/Documents/employees.json")
+DEFAULT_SERVER_MODE = 'threaded'
+DEFAULT_WORKERS = 16
+DEFAULT_BACKLOG = 128
+DEFAULT_KEEPALIVE_TIMEOUT = 15  # seconds an idle keep-alive connection is held open
+DEFAULT_MAX_BODY_SIZE = 256 * 1024 * 1024  # largest accepted POST /api/employees body
+MAX_SMALL_BODY_SIZE = 64 * 1024  # settings-style endpoints (/api/export, /api/apppath)
+BODY_CHUNK_SIZE = 64 * 1024
+DEFAULT_BACKUP_GENERATIONS = 3  # employees.json.backup plus 2 older generations
+DEFAULT_JOURNAL_COMPACT_EVERY = 200  # journaled edits before they are folded into employees.json
+DEFAULT_JOURNAL_COMPACT_INTERVAL = 30  # seconds between background compactions
+EMPLOYEE_PATH = re.compile(r'^/api/employees/(\d+)$')
+DEFAULT_WATCH_INTERVAL = 1.0  # seconds between checks of employees.json for edits by other programs
+EVENT_HISTORY = 1024  # change events kept for clients resuming GET /api/events
+MAX_EVENT_CHANGES = 1000  # an external edit touching more rows is announced as a reset
+EVENT_PING_INTERVAL = 15  # seconds between keep-alive comments on an idle event stream
+DEFAULT_MAX_EVENT_STREAMS = 64  # each open GET /api/events holds a server thread
+DEFAULT_ASYNC_MAX_EVENT_STREAMS = 10000  # --mode asyncio streams from the event loop instead
+MAX_REQUEST_HEAD = 64 * 1024  # request line plus headers, --mode asyncio
+WRITE_DRAIN_SIZE = 1024 * 1024  # response bytes a --mode asyncio handler queues before waiting on the socket
+DEFAULT_SWEEP_WORKERS = os.cpu_count() or 1
+MAX_SWEEP_SCENARIOS = 10000
+MAX_SWEEP_CHUNK = 16  # scenarios per worker task; bounds how long a cancel waits on running chunks
+MAX_SIMULATION_PATHS = 1000000
+SWEEP_PATH = re.compile(r'^/api/sweep/([0-9a-f]+)$')
+RESULT_PATH = re.compile(r'^/api/results/([0-9a-f]{64})$')
+BASELINE_PATH = re.compile(r'^/api/baselines/([0-9A-Za-z][\w.-]{0,63})$')
+DEFAULT_RESULTS_CACHE_DIR = os.path.expanduser("~/.cache/pension_calc/results")
+DEFAULT_RESULTS_CACHE_SIZE = 256  # MB of valuation results kept on disk
+PROFILE_PATH = re.compile(r'^/api/profiles/([0-9A-Za-z][\w.-]*)$')
+DEFAULT_PROFILE_KEEP = 100  # profiled requests kept in --profile-dir
+PROFILE_SAMPLE_INTERVAL = 0.001  # seconds between stack samples of a profiled request
+BATCH_WINDOW_PER_JOB = 4  # configs queued or finished but unwritten per calc --jobs process
+APP_CONFIG_NAME = '.json_editor_config'  # saved export targets, one per line, next to employees.json
+MAX_EXPORT_WORKERS = 16  # targets copied at once by POST /api/export
+DEFAULT_AUTO_EXPORT_DELAY = 1.0  # seconds after the last change in a burst before --auto-export runs
+FICLONE = 0x40049409  # Linux ioctl: share a file's data blocks with another file (reflink)
+PROFILE_MODES = {'1': 'cpu', 'true': 'cpu', 'cpu': 'cpu', 'memory': 'memory', 'all': 'all'}
+EMPLOYEE_FIELDS = ('id', 'name', 'hiredYear', 'dateOfBirth', 'spouseDateOfBirth', 'sex', 'spouseSex')
+ROSTER_BATCH_ROWS = 4096  # rows per batch of GET /api/export.*
+IMPORT_READ_SIZE = 32 * 1024  # characters of a POST /api/import body converted per batch
+MAX_IMPORT_ERRORS = 1000  # row errors listed in a POST /api/import response
+COMPRESS_MIN_SIZE = 1024  # smaller responses are sent as they are
+# Content-Encodings offered, most preferred first; brotli only when the module is installed
+CONTENT_ENCODINGS = (('br',) if brotli is not None else ()) + ('gzip', 'deflate')
+# Upper bounds (seconds) of the /metrics latency histogram buckets
+METRIC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_ROUTES = ('/', '/api/employees', '/api/employees/{id}', '/api/events', '/api/export.csv', '/api/export.jsonl',
+                 '/api/export', '/api/import', '/api/calculate/system', '/api/calculate/cache', '/api/sweep',
+                 '/api/sweep/{id}', '/api/simulate', '/api/mortality', '/api/mortality/cache', '/api/apppath',
+                 '/api/results', '/api/results/{hash}', '/api/baselines', '/api/baselines/{name}',
+                 '/api/valuation/session', '/api/valuation/session/verify',
+                 '/api/profiles', '/api/profiles/{file}', '/metrics', 'other')
+METRIC_METHODS = ('GET', 'HEAD', 'POST', 'PATCH', 'DELETE', 'OPTIONS', 'other')
+METRIC_OPERATIONS = ('json_parse', 'json_serialize', 'file_read', 'file_write', 'fsync', 'backup')
+IMPORT_FORMATS = {'text/csv': 'csv', 'application/x-ndjson': 'jsonl', 'application/jsonl': 'jsonl',
+                  'application/x-jsonlines': 'jsonl'}
+
+def compress(body, encoding, static=False):
+    """body in a Content-Encoding; static bodies are compressed once, so at the highest level"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if static else 4)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=9 if static else 5, mtime=0)
+    if encoding == 'deflate':
+        return zlib.compress(body, 9 if static else 5)
+    return body
+
+
+def negotiate_encoding(accept_encoding):
+    """The Content-Encoding to send for an Accept-Encoding header.
+    
+    Picks the coding with the highest q-value, preferring them in
+    CONTENT_ENCODINGS order on ties; 'identity' if none is acceptable.
+    """
+    if not accept_encoding:
+        return 'identity'
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        weight = 1.0
+        name, _, value = params.partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    default = weights.get('*', 0.0)
+    best, best_weight = 'identity', 0.0
+    for coding in CONTENT_ENCODINGS:
+        weight = weights.get(coding, default)
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def variant_etag(etag, encoding):
+    """Each encoding of a body is a different representation, so it gets its own strong ETag"""
+    return etag if encoding == 'identity' else f'{etag[:-1]}-{encoding}"'
+
+
+class EncodedBody:
+    """A response body and its compressed variants, made on first use and then reused"""
+    
+    def __init__(self, body, static=False):
+        self.variants = {'identity': body}
+        self.static = static
+        self.compressible = len(body) >= COMPRESS_MIN_SIZE
+    
+    def encoded(self, encoding):
+        if not self.compressible:
+            encoding = 'identity'
+        body = self.variants.get(encoding)
+        if body is None:
+            # A race compresses twice at worst; both results are the same
+            body = self.variants[encoding] = compress(self.variants['identity'], encoding, self.static)
+        return encoding, body
+
+
+class StaticPage:
+    """The editor page, rendered and compressed once per roster path"""
+    
+    def __init__(self, html):
+        body = html.encode()
+        self.body = EncodedBody(body, static=True)
+        for encoding in CONTENT_ENCODINGS:
+            self.body.encoded(encoding)
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+
+
+class CachedRoster:
+    """Serialized roster bytes plus the validators sent with them"""
+    __slots__ = ('key', 'body', 'etag', 'last_modified', 'mtime', 'encoded')
+    
+    def __init__(self, key, body, mtime, etag=None):
+        self.key = key
+        self.body = body
+        self.mtime = mtime
+        if etag is None:
+            _, inode, size, mtime_ns = key
+            etag = f'"{inode:x}-{size:x}-{mtime_ns:x}"'
+        self.etag = etag
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.encoded = EncodedBody(body).encoded
+
+
+class RosterCache:
+    """Process-wide cache of the serialized GET /api/employees body.
+    
+    Entries are keyed on (path, inode, size, mtime_ns), so a hit costs one
+    stat() call. External edits change the key and are picked up on the
+    next request; save_json() also invalidates explicitly.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()  # only one thread re-parses on a miss
+        self.entry = None
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def stat_key(path):
+        st = os.stat(path)
+        return (path, st.st_ino, st.st_size, st.st_mtime_ns), st.st_mtime
+    
+    def get(self, path):
+        """Return the CachedRoster for path, or None if the file does not exist.
+        
+        Raises json.JSONDecodeError if the file is not valid JSON.
+        """
+        try:
+            key, _ = self.stat_key(path)
+        except FileNotFoundError:
+            return None
+        entry = self.entry
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+        
+        with self.load_lock:
+            entry = self.entry
+            if entry is not None and entry.key == key:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            start = time.perf_counter()
+            with open(path, 'r', encoding='utf-8') as f:
+                st = os.fstat(f.fileno())
+                text = f.read()
+            read = time.perf_counter()
+            data = json.loads(text)
+            del text
+            parsed = time.perf_counter()
+            key = (path, st.st_ino, st.st_size, st.st_mtime_ns)
+            entry = CachedRoster(key, json.dumps(data, indent=2).encode(), st.st_mtime)
+            METRICS.observe('file_read', read - start)
+            METRICS.observe('json_parse', parsed - read)
+            METRICS.observe('json_serialize', time.perf_counter() - parsed)
+            with self.lock:
+                self.entry = entry
+            return entry
+    
+    def invalidate(self):
+        with self.lock:
+            self.entry = None
+
+
+ROSTER_CACHE = RosterCache()
+
+
+class MetricsLease:
+    """A thread's hold on one ServerMetrics list; the list goes back to the
+    free pool when the thread's locals are dropped as it exits"""
+    
+    __slots__ = ('counts', 'free')
+    
+    def __init__(self, counts, free):
+        self.counts = counts
+        self.free = free
+    
+    def __del__(self):
+        self.free.append(self.counts)
+
+
+class ServerMetrics:
+    """Counters and latency histograms for GET /metrics (Prometheus text format).
+    
+    Every thread counts into its own flat list of numbers, so recording a
+    request or an operation takes no lock and allocates nothing beyond the
+    numbers themselves; a scrape adds the lists up. The list of a thread
+    that has exited goes back to a free pool and the next new thread
+    carries on counting into it, so there are only ever as many lists as
+    threads that were alive at once.
+    
+    Layout of a list: requests started, requests finished, then per
+    (route, method) series: responses by status class (1xx-5xx), response
+    bytes, seconds, and one count per bucket (plus +Inf); then per
+    operation: count, seconds and bucket counts.
+    """
+    
+    SERIES_SIZE = 5 + 2 + len(METRIC_BUCKETS) + 1
+    OPERATION_SIZE = 2 + len(METRIC_BUCKETS) + 1
+    ROUTES = {route: index for index, route in enumerate(METRIC_ROUTES)}
+    METHODS = {method: index for index, method in enumerate(METRIC_METHODS)}
+    OPERATIONS = {operation: index for index, operation in enumerate(METRIC_OPERATIONS)}
+    OPERATIONS_BASE = 2 + len(METRIC_ROUTES) * len(METRIC_METHODS) * SERIES_SIZE
+    SIZE = OPERATIONS_BASE + len(METRIC_OPERATIONS) * OPERATION_SIZE
+    
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.lists = []
+        self.free = collections.deque()
+    
+    def counts(self):
+        """This thread's list"""
+        try:
+            return self.local.lease.counts
+        except AttributeError:
+            try:
+                counts = self.free.pop()
+            except IndexError:
+                counts = [0] * self.SIZE
+                with self.lock:
+                    self.lists.append(counts)
+            self.local.lease = MetricsLease(counts, self.free)
+            return counts
+    
+    @classmethod
+    def route(cls, path):
+        """The METRIC_ROUTES label for a request path"""
+        route = cls.ROUTES.get(path)
+        if route is not None:
+            return route
+        path = path.partition('?')[0]
+        if path in cls.ROUTES:
+            return cls.ROUTES[path]
+        if EMPLOYEE_PATH.match(path):
+            return cls.ROUTES['/api/employees/{id}']
+        if SWEEP_PATH.match(path):
+            return cls.ROUTES['/api/sweep/{id}']
+        if PROFILE_PATH.match(path):
+            return cls.ROUTES['/api/profiles/{file}']
+        if RESULT_PATH.match(path):
+            return cls.ROUTES['/api/results/{hash}']
+        if BASELINE_PATH.match(path):
+            return cls.ROUTES['/api/baselines/{name}']
+        return cls.ROUTES['other']
+    
+    def request_started(self):
+        self.counts()[0] += 1
+    
+    def request_finished(self, method, route, status, size, seconds):
+        counts = self.counts()
+        counts[1] += 1
+        base = 2 + (route * len(METRIC_METHODS) + self.METHODS.get(method, len(METRIC_METHODS) - 1)) * self.SERIES_SIZE
+        counts[base + min(max(status // 100, 1), 5) - 1] += 1
+        counts[base + 5] += size
+        counts[base + 6] += seconds
+        counts[base + 7 + bisect.bisect_left(METRIC_BUCKETS, seconds)] += 1
+    
+    def observe(self, operation, seconds):
+        """Record one operation (a METRIC_OPERATIONS name) that took seconds"""
+        counts = self.counts()
+        base = self.OPERATIONS_BASE + self.OPERATIONS[operation] * self.OPERATION_SIZE
+        counts[base] += 1
+        counts[base + 1] += seconds
+        counts[base + 2 + bisect.bisect_left(METRIC_BUCKETS, seconds)] += 1
+    
+    def totals(self):
+        with self.lock:
+            lists = list(self.lists)
+        totals = [0] * self.SIZE
+        for counts in lists:
+            totals = [a + b for a, b in zip(totals, counts)]
+        return totals
+    
+    def render(self, caches=(), gauges=()):
+        """The Prometheus text exposition.
+        
+        caches are (name, hits, misses) and gauges (name, help, value).
+        """
+        totals = self.totals()
+        lines = []
+        
+        def header(name, kind, help):
+            lines.append(f'# HELP json_editor_{name} {help}')
+            lines.append(f'# TYPE json_editor_{name} {kind}')
+        
+        def histogram(name, labels, counts):
+            cumulative = 0
+            for bound, count in zip(METRIC_BUCKETS + ('+Inf',), counts[2:]):
+                cumulative += count
+                lines.append(f'json_editor_{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'json_editor_{name}_sum{{{labels}}} {counts[1]:.6f}')
+            lines.append(f'json_editor_{name}_count{{{labels}}} {counts[0]}')
+        
+        series = []
+        for route in METRIC_ROUTES:
+            for method in METRIC_METHODS:
+                base = 2 + (self.ROUTES[route] * len(METRIC_METHODS) + self.METHODS[method]) * self.SERIES_SIZE
+                counts = totals[base:base + self.SERIES_SIZE]
+                if any(counts[:5]):
+                    series.append((f'route="{route}",method="{method}"', counts))
+        
+        header('http_requests_total', 'counter', "HTTP requests answered, by route, method and status class.")
+        for labels, counts in series:
+            for status, count in enumerate(counts[:5], 1):
+                if count:
+                    lines.append(f'json_editor_http_requests_total{{{labels},code="{status}xx"}} {count}')
+        header('http_request_duration_seconds', 'histogram', "Time from request line to the end of the response.")
+        for labels, counts in series:
+            histogram('http_request_duration_seconds', labels, [sum(counts[:5])] + counts[6:])
+        header('http_response_bytes_total', 'counter', "Response bytes written, headers included.")
+        for labels, counts in series:
+            lines.append(f'json_editor_http_response_bytes_total{{{labels}}} {counts[5]}')
+        header('http_requests_in_flight', 'gauge', "Requests being handled.")
+        lines.append(f'json_editor_http_requests_in_flight {totals[0] - totals[1]}')
+        header('operation_duration_seconds', 'histogram',
+               "JSON parse/serialize, roster file read/write, fsync and backup rotation times.")
+        for operation in METRIC_OPERATIONS:
+            base = self.OPERATIONS_BASE + self.OPERATIONS[operation] * self.OPERATION_SIZE
+            histogram('operation_duration_seconds', f'operation="{operation}"',
+                      totals[base:base + self.OPERATION_SIZE])
+        header('cache_hits_total', 'counter', "Cache lookups answered from the cache.")
+        lines.extend(f'json_editor_cache_hits_total{{cache="{name}"}} {hits}' for name, hits, _ in caches)
+        header('cache_misses_total', 'counter', "Cache lookups that had to build or load the entry.")
+        lines.extend(f'json_editor_cache_misses_total{{cache="{name}"}} {misses}' for name, _, misses in caches)
+        header('cache_hit_ratio', 'gauge', "Hits over lookups since startup.")
+        lines.extend(f'json_editor_cache_hit_ratio{{cache="{name}"}} {hits / (hits + misses) if hits + misses else 0:.6f}'
+                     for name, hits, misses in caches)
+        for name, help, value in gauges:
+            header(name, 'gauge', help)
+            lines.append(f'json_editor_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = ServerMetrics()
+
+
+class ProfileSession:
+    """One profiled request: cProfile and a stack sampler on the request's
+    thread for "cpu", tracemalloc for "memory", both for "all"."""
+    
+    def __init__(self, mode, memory_lock):
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.profile = None
+        self.samples = collections.Counter()  # collapsed stack -> samples
+        self.sampler = None
+        self.stopped = threading.Event()
+        self.memory_lock = memory_lock
+        self.memory = None
+        self.peak_memory = None
+        if mode in ('cpu', 'all'):
+            self.thread_id = threading.get_ident()
+            self.sampler = threading.Thread(target=self.sample, name='json-editor-profiler', daemon=True)
+            self.sampler.start()
+            self.profile = cProfile.Profile()
+            try:
+                self.profile.enable()
+            except ValueError:  # another profiler is active on this thread
+                self.profile = None
+        # tracemalloc is process-wide, so only one request traces memory at a time
+        if mode in ('memory', 'all') and memory_lock.acquire(blocking=False):
+            tracemalloc.start(32)
+            tracemalloc.reset_peak()
+            self.memory = True
+    
+    def sample(self):
+        current_frames = sys._current_frames
+        while not self.stopped.wait(PROFILE_SAMPLE_INTERVAL):
+            frame = current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+    
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+        self.elapsed = time.perf_counter() - self.started
+        if self.sampler is not None:
+            self.stopped.set()
+            self.sampler.join()
+        if self.memory:
+            _, self.peak_memory = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self.memory_lock.release()
+            self.memory = collections.Counter()
+            for stat in snapshot.statistics('traceback'):
+                stack = ';'.join(f'{os.path.basename(frame.filename)}:{frame.lineno}'
+                                 for frame in stat.traceback)
+                self.memory[stack] += stat.size
+
+
+class RequestProfiler:
+    """Opt-in request profiling (--profile-dir).
+    
+    A request is profiled when it sends an X-Profile header or a profile
+    query parameter (cpu, memory or all), or is picked at random at
+    --profile-rate. Each profile is a set of files sharing one name:
+    
+      NAME.json               what was profiled and how long it took
+      NAME.prof               cProfile stats (pstats, snakeviz, ...)
+      NAME.collapsed          sampled stacks, "frame;frame;frame count" per
+                              line, ready for flamegraph.pl or speedscope
+      NAME.memory.collapsed   bytes still allocated at the end of the
+                              request, by allocating stack
+    
+    Only the newest `keep` profiles are kept. When profiling is off a
+    request pays one attribute check.
+    """
+    
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.rate = 0.0
+        self.keep = DEFAULT_PROFILE_KEEP
+        self.lock = threading.Lock()
+        self.memory_lock = threading.Lock()
+        self.sequence = itertools.count(1)
+    
+    def configure(self, directory, rate=0.0, keep=DEFAULT_PROFILE_KEEP):
+        self.directory = directory
+        self.rate = rate
+        self.keep = max(1, keep)
+        self.enabled = directory is not None
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+    
+    def start(self, handler):
+        """A ProfileSession if handler's request should be profiled, else None.
+        
+        Removes the profile query parameter from handler.path so routing
+        is unaffected.
+        """
+        requested = handler.headers.get('X-Profile')
+        if '?' in handler.path and 'profile=' in handler.path:
+            path, _, query = handler.path.partition('?')
+            params = parse_qs(query, keep_blank_values=True)
+            requested = params.pop('profile', [requested])[0]
+            query = urlencode(params, doseq=True)
+            handler.path = path + ('?' + query if query else '')
+        if requested is not None:
+            mode = PROFILE_MODES.get(requested.strip().lower())
+        elif self.rate and random.random() < self.rate:
+            mode = 'cpu'
+        else:
+            return None
+        if mode is None or handler.path.startswith(('/api/profiles', '/api/events', '/metrics')):
+            return None
+        return ProfileSession(mode, self.memory_lock)
+    
+    def finish(self, session, handler, status):
+        """Stop session and write its files"""
+        session.stop()
+        name = (f"{time.strftime('%Y%m%dT%H%M%S')}-{next(self.sequence):06d}-{handler.command}-"
+                + (METRIC_ROUTES[METRICS.route(handler.path)].strip('/').replace('/', '_')
+                   .replace('{', '').replace('}', '') or 'root'))
+        files = {}
+        try:
+            if session.profile is not None:
+                files['cpu'] = name + '.prof'
+                session.profile.dump_stats(os.path.join(self.directory, files['cpu']))
+            if session.samples:
+                files['stacks'] = name + '.collapsed'
+                self.write_collapsed(files['stacks'], session.samples)
+            if session.memory:
+                files['memory'] = name + '.memory.collapsed'
+                self.write_collapsed(files['memory'], session.memory)
+            info = {"name": name, "method": handler.command, "path": handler.path, "status": status,
+                    "mode": session.mode, "elapsedMs": round(session.elapsed * 1000, 3),
+                    "samples": sum(session.samples.values()), "peakMemory": session.peak_memory,
+                    "created": time.time(), "files": files}
+            with open(os.path.join(self.directory, name + '.json'), 'w', encoding='utf-8') as f:
+                json.dump(info, f)
+            self.prune()
+        except OSError as e:
+            print(f"Error writing profile {name}: {e}")
+    
+    def write_collapsed(self, file_name, counts):
+        with open(os.path.join(self.directory, file_name), 'w', encoding='utf-8') as f:
+            for stack, count in counts.most_common():
+                f.write(f'{stack} {count}\n')
+    
+    def profiles(self):
+        """Metadata of the kept profiles, newest first"""
+        profiles = []
+        for file_name in sorted(os.listdir(self.directory), reverse=True):
+            if file_name.endswith('.json'):
+                try:
+                    with open(os.path.join(self.directory, file_name), 'r', encoding='utf-8') as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    pass
+        return profiles
+    
+    def prune(self):
+        with self.lock:
+            names = sorted(file_name[:-5] for file_name in os.listdir(self.directory) if file_name.endswith('.json'))
+            for name in names[:-self.keep]:
+                for suffix in ('.json', '.prof', '.collapsed', '.memory.collapsed'):
+                    try:
+                        os.remove(os.path.join(self.directory, name + suffix))
+                    except FileNotFoundError:
+                        pass
+    
+    def path_of(self, file_name):
+        """Path of a profile file in the directory, or None"""
+        path = os.path.join(self.directory, file_name)
+        if not file_name.endswith(('.json', '.prof', '.collapsed')) or not os.path.isfile(path):
+            return None
+        return path
+
+
+PROFILER = RequestProfiler()
+
+
+def sync_file(fd):
+    """os.fsync, timed for /metrics"""
+    start = time.perf_counter()
+    try:
+        os.fsync(fd)
+    finally:
+        METRICS.observe('fsync', time.perf_counter() - start)
+
+
+def fsync_directory(directory):
+    """Make a rename inside directory durable (no-op where directories can't be opened)"""
+    try:
+        fd = os.open(directory or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        sync_file(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class BackupRotator:
+    """Keeps N backup generations of the roster without copying file data.
+    
+    Generation 1 is always the uncompressed `<file>.backup`, created as a hard
+    link to the outgoing roster just before the new one is renamed over it.
+    Older generations are `<file>.backup-<seq>` (optionally gzipped in the
+    background). Each save is one rename, one link and at most one unlink,
+    so its cost does not depend on the number of generations kept.
+    """
+    ARCHIVE_PATTERN = re.compile(r'\.backup-(\d+)(\.gz)?$')
+    
+    def __init__(self, generations=DEFAULT_BACKUP_GENERATIONS, compress=False):
+        self.generations = generations
+        self.compress = compress
+        self.lock = threading.Lock()
+        self.archives = {}  # json path -> ascending list of archive sequence numbers
+        self.compressor = None
+    
+    def configure(self, generations, compress):
+        self.generations = max(0, generations)
+        self.compress = compress
+    
+    def archive_path(self, json_path, seq):
+        return f"{json_path}.backup-{seq:06d}"
+    
+    def load_archives(self, json_path):
+        if json_path not in self.archives:
+            directory = os.path.dirname(json_path) or '.'
+            prefix = os.path.basename(json_path)
+            seqs = set()
+            try:
+                for name in os.listdir(directory):
+                    if name.startswith(prefix):
+                        match = self.ARCHIVE_PATTERN.match(name[len(prefix):])
+                        if match:
+                            seqs.add(int(match.group(1)))
+            except OSError:
+                pass
+            self.archives[json_path] = sorted(seqs)
+        return self.archives[json_path]
+    
+    def remove_archive(self, json_path, seq):
+        path = self.archive_path(json_path, seq)
+        for candidate in (path, path + '.gz'):
+            try:
+                os.remove(candidate)
+            except FileNotFoundError:
+                pass
+    
+    def rotate(self, json_path):
+        """Turn the current roster into the newest backup generation.
+        
+        Must be called with the save lock held, right before the new roster
+        is moved into place.
+        """
+        if self.generations == 0 or not os.path.exists(json_path):
+            return
+        backup_path = json_path + '.backup'
+        with self.lock:
+            archives = self.load_archives(json_path)
+            if os.path.exists(backup_path):
+                if self.generations > 1:
+                    seq = archives[-1] + 1 if archives else 1
+                    os.rename(backup_path, self.archive_path(json_path, seq))
+                    archives.append(seq)
+                    if self.compress:
+                        self.compress_later(json_path, seq)
+                else:
+                    os.remove(backup_path)
+            while len(archives) > self.generations - 1:
+                self.remove_archive(json_path, archives.pop(0))
+        try:
+            os.link(json_path, backup_path)
+        except OSError:
+            # Filesystem without hard links
+            shutil.copy2(json_path, backup_path)
+    
+    def compress_later(self, json_path, seq):
+        if self.compressor is None:
+            self.compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='json-editor-backup')
+        self.compressor.submit(self.compress_archive, json_path, seq)
+    
+    def compress_archive(self, json_path, seq):
+        path = self.archive_path(json_path, seq)
+        temp_path = path + '.gz.tmp'
+        try:
+            with open(path, 'rb') as src, gzip.open(temp_path, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, BODY_CHUNK_SIZE)
+            with self.lock:
+                # The generation may have been pruned while it was being compressed
+                if seq in self.archives.get(json_path, ()):
+                    os.replace(temp_path, path + '.gz')
+                    os.remove(path)
+        except OSError as e:
+            print(f"Error compressing backup {path}: {e}")
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+BACKUPS = BackupRotator()
+SAVE_LOCK = threading.Lock()
+
+
+def install_roster_file(json_path, temp_path):
+    """Back up the current roster and atomically move the fsync'd temp file into place.
+    
+    A crash at any point leaves either the old or the new roster at
+    json_path, never a partially written one.
+    """
+    with SAVE_LOCK:
+        start = time.perf_counter()
+        try:
+            BACKUPS.rotate(json_path)
+        except OSError as e:
+            print(f"Error creating backup: {e}")
+        METRICS.observe('backup', time.perf_counter() - start)
+        
+        os.replace(temp_path, json_path)
+        fsync_directory(os.path.dirname(json_path))
+    ROSTER_CACHE.invalidate()
+
+
+def new_temp_path(json_path):
+    """Temp file next to the roster, so replacing the roster is a rename"""
+    directory = os.path.dirname(json_path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(json_path) + '.', suffix='.tmp', dir=directory)
+    os.close(fd)
+    return temp_path
+
+
+class RequestBodyError(Exception):
+    """A request body that is rejected before it is saved"""
+    status = 400
+
+
+class RequestBodyTooLarge(RequestBodyError):
+    status = 413
+
+
+class StreamingRosterValidator:
+    """Validates a JSON array of employee objects fed in arbitrary text chunks.
+    
+    Only the unconsumed tail of the stream (at most one partial employee) is
+    buffered. Each complete element is checked with the C JSON decoder, so a
+    malformed payload is rejected at the chunk where it goes wrong rather than
+    after the whole upload has arrived. With keep=True the decoded employees
+    are collected in self.elements for the caller to drain after each feed().
+    """
+    WHITESPACE = re.compile(r'[ \t\n\r]*')
+    # A decode error this close to the end of the buffer may just be a token
+    # cut in half by the chunk boundary ("tru", "1.", "\\u00")
+    TRUNCATION_SLACK = 8
+    MAX_ELEMENT_SIZE = 1024 * 1024
+    
+    def __init__(self, keep=False):
+        self.decoder = json.JSONDecoder()
+        self.keep = keep
+        self.elements = []
+        self.buffer = ''
+        self.offset = 0  # characters consumed before self.buffer
+        self.state = 'start'
+        self.count = 0
+    
+    def error(self, message, pos):
+        return RequestBodyError(f"Invalid JSON: {message} (char {self.offset + pos})")
+    
+    def feed(self, text):
+        buf = self.buffer + text if self.buffer else text
+        pos = 0
+        end = len(buf)
+        batch_tried = False
+        while True:
+            pos = self.WHITESPACE.match(buf, pos).end()
+            if pos == end:
+                break
+            ch = buf[pos]
+            if self.state == 'start':
+                if ch != '[':
+                    raise self.error("expected a JSON array of employees", pos)
+                pos += 1
+                self.state = 'first'
+            elif self.state == 'first' and ch == ']':
+                pos += 1
+                self.state = 'done'
+            elif self.state in ('first', 'value'):
+                if not batch_tried:
+                    # Decode every complete element in the buffer with one C call;
+                    # element by element below if that guess does not parse
+                    batch_tried = True
+                    last = buf.rfind('}', pos)
+                    try:
+                        elements = json.loads('[' + buf[pos:last + 1] + ']') if last > pos else None
+                    except json.JSONDecodeError:
+                        elements = None
+                    if elements and set(map(type, elements)) == {dict}:
+                        self.count += len(elements)
+                        if self.keep:
+                            self.elements.extend(elements)
+                        pos = last + 1
+                        self.state = 'separator'
+                        continue
+                try:
+                    element, element_end = self.decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError as e:
+                    if e.pos >= end - self.TRUNCATION_SLACK or e.msg.startswith('Unterminated string'):
+                        break  # wait for more data
+                    raise self.error(e.msg, e.pos)
+                if not isinstance(element, dict):
+                    raise self.error("each employee must be a JSON object", pos)
+                self.count += 1
+                if self.keep:
+                    self.elements.append(element)
+                pos = element_end
+                self.state = 'separator'
+            elif self.state == 'separator':
+                if ch == ',':
+                    self.state = 'value'
+                elif ch == ']':
+                    self.state = 'done'
+                else:
+                    raise self.error("expected ',' or ']'", pos)
+                pos += 1
+            else:
+                raise self.error("extra data after the employee array", pos)
+        
+        self.buffer = buf[pos:]
+        self.offset += pos
+        if len(self.buffer) > self.MAX_ELEMENT_SIZE:
+            raise self.error("employee record too large", 0)
+    
+    def close(self):
+        if self.state in ('first', 'value') and self.buffer.strip():
+            # Report the decoder's own message for a bad final element
+            try:
+                self.decoder.raw_decode(self.buffer, self.WHITESPACE.match(self.buffer).end())
+            except json.JSONDecodeError as e:
+                raise self.error(e.msg, e.pos)
+        if self.state != 'done' or self.buffer.strip():
+            raise self.error("unexpected end of data", len(self.buffer))
+
+
+def normalize_employee(record):
+    """Validate one employee object and apply Employee.swift's decoding defaults"""
+    if not isinstance(record, dict):
+        raise RequestBodyError("Employee must be a JSON object")
+    employee = dict(record)
+    if not isinstance(employee.get('name'), str):
+        raise RequestBodyError("Employee 'name' must be a string")
+    employee.setdefault('spouseDateOfBirth', 0)
+    for field in ('id', 'hiredYear', 'dateOfBirth', 'spouseDateOfBirth'):
+        value = employee.get(field)
+        if field == 'id' and value is None:
+            continue
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise RequestBodyError(f"Employee '{field}' must be an integer")
+    employee.setdefault('sex', 'M')
+    if employee['sex'] not in ('M', 'F'):
+        raise RequestBodyError("Employee 'sex' must be 'M' or 'F'")
+    if employee['spouseDateOfBirth'] > 0:
+        employee.setdefault('spouseSex', 'F')
+        if employee['spouseSex'] not in ('M', 'F'):
+            raise RequestBodyError("Employee 'spouseSex' must be 'M' or 'F'")
+    else:
+        employee.pop('spouseSex', None)
+    return employee
+
+
+class ChunkReader(io.RawIOBase):
+    """Raw stream over an iterator of byte chunks, so io.TextIOWrapper can decode and split lines in C"""
+    
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pending = b''
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        while not self.pending:
+            self.pending = next(self.chunks, None)
+            if self.pending is None:
+                self.pending = b''
+                return 0
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def text_stream(chunks):
+    """Text stream over UTF-8 byte chunks; a leading BOM is dropped and line endings are kept"""
+    return io.TextIOWrapper(io.BufferedReader(ChunkReader(chunks), BODY_CHUNK_SIZE),
+                            encoding='utf-8-sig', newline='')
+
+
+class RosterImporter:
+    """Converts CSV or JSONL employee rows into roster JSON, one batch at a time.
+    
+    Rows in the layout GET /api/export.* produces (CSV columns in
+    Data/employees.csv's order, compact JSONL with Employee.swift's key order) are
+    matched a batch at a time by a single re.split() and assembled by slice
+    assignment into a prebuilt list of JSON fragments, so no per-row Python
+    code runs. A batch the pattern does not cover (other layouts, blank
+    lines, escaped quotes, bad values, duplicate ids) is redone row by row
+    through normalize_employee(), which also reports each bad row. Row
+    numbers count the CSV header as row 1 and match line numbers for JSONL.
+    Rows without an id get the next id after the largest seen so far; fields
+    other than Employee.swift's are ignored.
+    """
+    INT = r'(0|[1-9][0-9]{0,17})'  # canonical JSON integers that fit in Swift's Int
+    CSV_ROW = re.compile(r'%s,("[^"\\\x00-\x1f]*"|[^",\\\x00-\x1f]*),%s,%s,%s,([MF]?),([MF]?)\r?\n'
+                         % (INT, INT, INT, INT))
+    JSON_STRING = r'"[^"\\\x00-\x1f]*(?:\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})[^"\\\x00-\x1f]*)*"'
+    JSONL_ROW = re.compile(r'\{"id":%s,"name":(%s),"hiredYear":%s,"dateOfBirth":%s,'
+                           r'"spouseDateOfBirth":%s(?:,"sex":"([MF])")?(?:,"spouseSex":"([MF])")?\}\r?\n'
+                           % (INT, JSON_STRING, INT, INT, INT))
+    GROUPS = 8  # re.split() pieces per row: the (empty) text between matches plus 7 fields
+    ROW_TEMPLATE = ['{"id":', None, ',"name":', None, ',"hiredYear":', None, ',"dateOfBirth":', None,
+                    ',"spouseDateOfBirth":', None, ',"sex":', None, None, '},\n']
+    # A missing sex (empty CSV cell or absent JSON key) takes the decoder's defaults
+    SEX = {'M': '"M"', 'F': '"F"', '': '"M"', None: '"M"'}
+    SPOUSE_SEX = {'M': ',"spouseSex":"M"', 'F': ',"spouseSex":"F"', '': ',"spouseSex":"F"', None: ',"spouseSex":"F"'}
+    REQUIRED_COLUMNS = ('name', 'hiredYear', 'dateOfBirth')
+    
+    def __init__(self, format):
+        self.format = format
+        self.pattern = self.CSV_ROW if format == 'csv' else self.JSONL_ROW
+        self.columns = None
+        self.ids = set()  # as canonical decimal strings
+        self.max_id = 0
+        self.max_id_stale = False
+        self.template = []
+        self.row = 0
+        self.imported = 0
+        self.errors = []
+        self.error_count = 0
+    
+    def batches(self, stream):
+        """Yield the roster JSON text (objects separated by ',\\n') of each batch of a text stream"""
+        if self.format == 'csv':
+            self.read_header(stream.readline())
+        tail = ''
+        while True:
+            text = stream.read(IMPORT_READ_SIZE)
+            if not text:
+                text, tail = tail, ''
+                if not text.strip():
+                    return
+                if not text.endswith('\n'):
+                    text += '\n'
+            else:
+                text = tail + text
+                cut = text.rfind('\n') + 1
+                if self.format == 'csv' and text.count('"', 0, cut) % 2:
+                    tail = text  # cut inside a quoted field that spans lines: read on
+                    continue
+                text, tail = text[:cut], text[cut:]
+            converted = self.convert(text) if text else ''
+            if converted:
+                yield converted
+    
+    def read_header(self, line):
+        header = [name.strip() for name in next(csv.reader([line]), [])]
+        if not header:
+            raise RequestBodyError("CSV file is empty")
+        missing = [name for name in self.REQUIRED_COLUMNS if name not in header]
+        if missing:
+            raise RequestBodyError(f"CSV header is missing {', '.join(missing)}")
+        self.columns = {name: header.index(name) for name in EMPLOYEE_FIELDS if name in header}
+        self.width = len(header)
+        if tuple(header) != EMPLOYEE_FIELDS:
+            self.pattern = None
+        self.row = 1
+    
+    def convert(self, text):
+        parts = self.pattern.split(text) if self.pattern is not None else None
+        if parts is None or any(parts[0::self.GROUPS]):
+            return self.convert_rows(text)
+        ids = parts[1::self.GROUPS]
+        count = len(ids)
+        unique = set(ids)
+        if len(unique) != count or not unique.isdisjoint(self.ids):
+            return self.convert_rows(text)
+        self.ids |= unique
+        self.max_id_stale = True
+        self.row += count
+        self.imported += count
+        
+        size = len(self.ROW_TEMPLATE) * count
+        if len(self.template) < size:
+            self.template = self.ROW_TEMPLATE * count
+        out = self.template[:size]
+        out[1::14] = ids
+        names = parts[2::self.GROUPS]
+        out[3::14] = names if self.format == 'jsonl' else [n if n[:1] == '"' else '"' + n + '"' for n in names]
+        out[5::14] = parts[3::self.GROUPS]
+        out[7::14] = parts[4::self.GROUPS]
+        spouse_born = parts[5::self.GROUPS]
+        out[9::14] = spouse_born
+        out[11::14] = map(self.SEX.__getitem__, parts[6::self.GROUPS])
+        out[12::14] = [self.SPOUSE_SEX[sex] if born != '0' else '' for born, sex in zip(spouse_born, parts[7::self.GROUPS])]
+        out[-1] = '}'
+        return ''.join(out)
+    
+    def convert_rows(self, text):
+        """Convert a batch row by row, recording each bad row's error"""
+        if self.format == 'csv':
+            records = map(self.csv_record, csv.reader(io.StringIO(text, newline='')))
+        else:
+            records = map(self.jsonl_record, text.split('\n')[:-1])
+        objects = []
+        for record in records:
+            self.row += 1
+            try:
+                if record is None:
+                    continue  # blank line
+                if isinstance(record, RequestBodyError):
+                    raise record
+                employee = normalize_employee(record)
+                if employee.get('id') is None:
+                    employee['id'] = self.next_id()
+                elif str(employee['id']) in self.ids:
+                    raise RequestBodyError(f"Duplicate employee id {employee['id']}")
+            except RequestBodyError as e:
+                self.error_count += 1
+                if len(self.errors) < MAX_IMPORT_ERRORS:
+                    self.errors.append({"row": self.row, "error": str(e)})
+                continue
+            self.ids.add(str(employee['id']))
+            self.max_id = max(self.max_id, employee['id'])
+            objects.append(json.dumps({field: employee[field] for field in EMPLOYEE_FIELDS if field in employee},
+                                      separators=(',', ':')))
+        self.imported += len(objects)
+        return ',\n'.join(objects)
+    
+    def next_id(self):
+        if self.max_id_stale:
+            self.max_id = max(self.max_id, max(map(int, self.ids), default=0))
+            self.max_id_stale = False
+        return self.max_id + 1
+    
+    def csv_record(self, row):
+        """Employee dict for one CSV row, None for a blank line, or the RequestBodyError to report"""
+        if not row:
+            return None
+        if len(row) != self.width:
+            return RequestBodyError(f"Expected {self.width} columns, found {len(row)}")
+        record = {}
+        for field, index in self.columns.items():
+            value = row[index]
+            if field == 'name':
+                record[field] = value
+            elif not value.strip():
+                if field == 'id':
+                    record[field] = None
+                # other empty cells take normalize_employee's defaults
+            elif field in ('sex', 'spouseSex'):
+                record[field] = value.strip()
+            else:
+                try:
+                    record[field] = int(value)
+                except ValueError:
+                    return RequestBodyError(f"Employee '{field}' must be an integer")
+        return record
+    
+    def jsonl_record(self, line):
+        if not line.strip():
+            return None
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError as e:
+            return RequestBodyError(f"Invalid JSON: {e}")
+    
+    def summary(self):
+        return {"format": self.format, "imported": self.imported, "invalidRows": self.error_count,
+                "errors": self.errors}
+
+
+def export_batches(records, format):
+    """Roster records as CSV (Data/employees.csv's columns) or JSONL text, a batch at a time.
+    
+    JSONL objects carry Employee.swift's fields in declaration order, the
+    layout RosterImporter's fast path reads back.
+    """
+    if format == 'csv':
+        yield ','.join(EMPLOYEE_FIELDS) + '\n'
+    while True:
+        batch = list(itertools.islice(records, ROSTER_BATCH_ROWS))
+        if not batch:
+            return
+        if format == 'csv':
+            out = io.StringIO()
+            csv.writer(out, lineterminator='\n').writerows(
+                [(e.get('id'), e.get('name'), e.get('hiredYear'), e.get('dateOfBirth'),
+                  e.get('spouseDateOfBirth', 0), e.get('sex', 'M'), e.get('spouseSex') or '') for e in batch])
+            yield out.getvalue()
+        else:
+            yield jsonl_batch(batch)
+
+
+JSONL_SPOUSE_SEX = {'M': ',"spouseSex":"M"', 'F': ',"spouseSex":"F"', None: ''}
+
+
+def jsonl_batch(batch):
+    """One JSON line per record; well-typed batches are assembled like RosterImporter.convert()"""
+    fields = [[e.get(field) for e in batch] for field in EMPLOYEE_FIELDS]
+    ids, names, hired, born, spouse_born, sexes, spouse_sexes = fields
+    try:
+        fast = (set(map(type, itertools.chain(ids, hired, born, spouse_born))) == {int} and
+                set(map(type, names)) == {str} and set(sexes) <= {'M', 'F'} and
+                set(spouse_sexes) <= JSONL_SPOUSE_SEX.keys())
+    except TypeError:
+        fast = False  # unhashable values
+    if not fast:
+        encode = json.JSONEncoder(separators=(',', ':')).encode
+        return ''.join(encode({field: e[field] for field in EMPLOYEE_FIELDS if field in e}) + '\n' for e in batch)
+    out = RosterImporter.ROW_TEMPLATE * len(batch)
+    out[1::14] = map(str, ids)
+    out[3::14] = map(encode_basestring_ascii, names)
+    out[5::14] = map(str, hired)
+    out[7::14] = map(str, born)
+    out[9::14] = map(str, spouse_born)
+    out[11::14] = map(RosterImporter.SEX.__getitem__, sexes)
+    out[12::14] = map(JSONL_SPOUSE_SEX.__getitem__, spouse_sexes)
+    out[13::14] = itertools.repeat('}\n', len(batch))
+    return ''.join(out)
+
+
+def iter_roster_file(json_path):
+    """Yield the employee objects of a roster file, holding at most one read chunk in memory"""
+    try:
+        f = open(json_path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return
+    with f:
+        parser = StreamingRosterValidator(keep=True)
+        for text in iter(lambda: f.read(BODY_CHUNK_SIZE), ''):
+            parser.feed(text)
+            yield from parser.elements
+            parser.elements.clear()
+        parser.close()
+        yield from parser.elements
+
+
+class EmployeeNotFound(RequestBodyError):
+    status = 404
+
+
+class EmployeeConflict(RequestBodyError):
+    status = 409
+
+
+class ChangeFeed:
+    """Numbered roster change events for GET /api/events.
+    
+    Each event is {"version": n} plus "added"/"updated" (employee records)
+    and "deleted" (ids), or "reset": true when the roster was replaced and
+    clients should reload. The last EVENT_HISTORY events are kept so a
+    client that reconnects can be sent the ones it missed.
+    """
+    
+    def __init__(self, history=EVENT_HISTORY):
+        self.condition = threading.Condition()
+        self.version = 0
+        self.events = collections.deque(maxlen=history)  # (version, JSON text)
+        self.listeners = []  # called after each publish, e.g. to wake an event loop
+    
+    def publish(self, **changes):
+        with self.condition:
+            self.version += 1
+            self.events.append((self.version, json.dumps({"version": self.version, **changes})))
+            self.condition.notify_all()
+        for listener in self.listeners:
+            listener()
+    
+    def publish_diff(self, old, new):
+        """Publish the difference between two {id: record} rosters, if there is one.
+        
+        Rows kept without an id (EmployeeStore.read_file) cannot be sent as
+        deltas, so a change among them is announced as a reset.
+        """
+        if ([record for key, record in old.items() if not isinstance(key, int)]
+                != [record for key, record in new.items() if not isinstance(key, int)]):
+            self.publish(reset=True)
+            return
+        added = [record for employee_id, record in new.items()
+                 if employee_id not in old and isinstance(employee_id, int)]
+        deleted = [employee_id for employee_id in old if employee_id not in new and isinstance(employee_id, int)]
+        updated = [record for employee_id, record in new.items()
+                   if employee_id in old and old[employee_id] != record]
+        if len(added) + len(deleted) + len(updated) > MAX_EVENT_CHANGES:
+            self.publish(reset=True)
+            return
+        changes = {name: value for name, value in (('added', added), ('updated', updated), ('deleted', deleted))
+                   if value}
+        if changes:
+            self.publish(**changes)
+    
+    def since(self, version, timeout=None):
+        """Events after version, waiting up to timeout seconds for one; None if they are no longer kept"""
+        with self.condition:
+            if version > self.version or (version < self.version and (not self.events
+                                                                     or self.events[0][0] > version + 1)):
+                return None
+            if version == self.version and timeout:
+                self.condition.wait_for(lambda: self.version > version, timeout)
+            # Newest first, so catching up on one event does not walk the whole history
+            events = list(itertools.takewhile(lambda event: event[0] > version, reversed(self.events)))
+            events.reverse()
+            return events
+    
+    def hello(self):
+        """The event a stream opens with, and the version it names"""
+        version = self.version
+        return f'retry: 2000\nevent: hello\ndata: {{"version": {version}}}\n\n', version
+    
+    def next_payload(self, version, timeout=None):
+        """Event stream text for a client at version, and the version it brings the client to.
+        
+        Waits up to timeout seconds for a change; if none comes the text is
+        a keep-alive comment.
+        """
+        events = self.since(version, timeout)
+        if events is None:
+            version = self.version
+            return f'id: {version}\nevent: change\ndata: {{"version": {version}, "reset": true}}\n\n', version
+        if events:
+            return ''.join(f'id: {number}\nevent: change\ndata: {text}\n\n' for number, text in events), events[-1][0]
+        return ': ping\n\n', version
+
+
+def requested_event_version(path, headers):
+    """The version a GET /api/events client asks to resume from (?since= or Last-Event-ID), or None.
+    
+    Raises ValueError if it is not an integer.
+    """
+    since = parse_qs(urlparse(path).query).get('since', [headers.get('Last-Event-ID')])[0]
+    try:
+        return int(since) if since else None
+    except ValueError:
+        raise ValueError("since must be an integer")
+
+
+def requested_current_year(request):
+    """A calculation request's "currentYear", or None; raises ValueError if it is not an integer"""
+    current_year = request.get('currentYear')
+    if current_year is not None and (not isinstance(current_year, int) or isinstance(current_year, bool)):
+        raise ValueError("currentYear must be an integer")
+    return current_year
+
+
+class EmployeeStore:
+    """Id-indexed in-memory roster for single-employee edits.
+    
+    Each add/update/delete is applied in memory and appended (fsync'd) to
+    `<file>.journal` as one JSON line, so an edit costs O(1) disk IO instead
+    of rewriting the whole roster. The journal is folded into employees.json
+    by compact() every `compact_every` edits and on a background timer.
+    
+    The journal starts with a header naming the employees.json it applies to
+    (inode, size, mtime); a journal left behind for a different file is
+    discarded. If employees.json is changed by someone else while edits are
+    pending, the pending edits are replayed onto the new file by id.
+    
+    With `columnar` set (--columnar), reads that need no pending edits are
+    served from a memory-mapped roster_store copy of employees.json, kept
+    next to it as `<file>.columns` and rebuilt when the file changes.
+    
+    Rows that cannot be addressed by id (not an object, no integer id, or
+    an id a later row also has) stay in `employees` under a
+    ('row', index) key: they cannot be edited by id, but every rewrite of
+    employees.json keeps them where they were.
+    
+    Every change is published on the store's ChangeFeed: single-employee
+    edits as deltas, whole-roster replacements as a reset, and edits made to
+    employees.json by other programs (noticed by check_file()) as the
+    difference from the roster in memory.
+    
+    Paged queries (query()) filter and sort the in-memory roster, or with
+    `sqlite` set (--sqlite) run against a roster_db.RosterDatabase kept at
+    `<file>.sqlite`, which edits update row by row.
+    """
+    stores = {}
+    stores_lock = threading.Lock()
+    compact_every = DEFAULT_JOURNAL_COMPACT_EVERY
+    columnar = False
+    sqlite = False
+    
+    @classmethod
+    def for_path(cls, json_path):
+        with cls.stores_lock:
+            store = cls.stores.get(json_path)
+            if store is None:
+                store = cls.stores[json_path] = cls(json_path)
+            return store
+    
+    def __init__(self, json_path):
+        self.json_path = json_path
+        self.journal_path = json_path + '.journal'
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.employees = {}
+        self.max_id = 0
+        self.base_key = None
+        self.pending_ops = []
+        self.journal = None
+        self.version = 0
+        self.token = os.urandom(4).hex()  # distinguishes this process's in-memory ETags
+        self.cached = None
+        self.cached_version = -1
+        self.modified_at = time.time()
+        self.columns = None
+        self.database = None
+        self.database_version = None  # self.version the database last matched
+        self.feed = ChangeFeed()
+        self.watched_key = self.file_key()  # employees.json as this process last wrote or read it
+        self.digest = (None, None)  # (roster version, roster_digest) of the last valued roster
+    
+    def file_key(self):
+        try:
+            st = os.stat(self.json_path)
+        except FileNotFoundError:
+            return None
+        return [st.st_ino, st.st_size, st.st_mtime_ns]
+    
+    def read_file(self):
+        self.employees = {}
+        self.max_id = 0
+        if os.path.exists(self.json_path):
+            start = time.perf_counter()
+            with open(self.json_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            read = time.perf_counter()
+            data = json.loads(text)
+            del text
+            METRICS.observe('file_read', read - start)
+            METRICS.observe('json_parse', time.perf_counter() - read)
+            if not isinstance(data, list):
+                raise ValueError(f"{self.json_path} does not contain a JSON array")
+            ids = [record.get('id') if isinstance(record, dict) else None for record in data]
+            rows = {}  # id -> the last row with it, which wins as in roster_db
+            for index, employee_id in enumerate(ids):
+                if isinstance(employee_id, int) and not isinstance(employee_id, bool):
+                    rows[employee_id] = index
+            passthrough = 0
+            for index, (employee_id, record) in enumerate(zip(ids, data)):
+                if rows.get(employee_id, -1) == index:
+                    self.employees[employee_id] = record
+                    self.max_id = max(self.max_id, employee_id)
+                else:
+                    # No integer id, or a later row has the same one: kept in place under a key no id
+                    # can equal, so compact() writes it back unchanged
+                    self.employees[('row', index)] = record
+                    passthrough += 1
+            if passthrough:
+                print(f"{self.json_path}: {passthrough} row(s) without a unique integer id are kept as they are "
+                      f"but cannot be edited through /api/employees/{{id}}")
+        self.base_key = self.watched_key = self.file_key()
+    
+    def read_journal(self):
+        """Pending ops from a journal that belongs to the current employees.json"""
+        ops = []
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline() or 'null')
+                if not isinstance(header, dict) or header.get('base') != self.base_key:
+                    if header is not None:
+                        print(f"Discarding {self.journal_path}: employees.json changed since it was written")
+                    return []
+                for line in f:
+                    try:
+                        ops.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break  # torn final line from a crash mid-append
+        except FileNotFoundError:
+            pass
+        return ops
+    
+    def load(self):
+        with self.lock:
+            if self.loaded:
+                return
+            self.read_file()
+            ops = self.read_journal()
+            for op in ops:
+                self.apply(op)
+            self.pending_ops = ops
+            self.loaded = True
+            if ops:
+                self.version += 1
+                self.compact()
+    
+    def sync_with_file(self):
+        """Reload if employees.json was replaced behind our back, keeping pending edits"""
+        if not self.loaded:
+            self.load()
+        elif self.file_key() != self.base_key:
+            old = self.employees
+            ops = self.pending_ops
+            self.read_file()
+            for op in ops:
+                self.apply(op)
+            self.version += 1
+            self.feed.publish_diff(old, self.employees)
+            if ops:
+                self.compact()
+    
+    def apply(self, op):
+        if op['op'] == 'delete':
+            self.employees.pop(op['id'], None)
+        else:
+            employee = op['employee']
+            self.employees[employee['id']] = employee
+            self.max_id = max(self.max_id, employee['id'])
+    
+    def append_journal(self, op):
+        if self.journal is None:
+            fresh = not os.path.exists(self.journal_path) or not self.pending_ops
+            self.journal = open(self.journal_path, 'w' if fresh else 'a', encoding='utf-8')
+            if fresh:
+                self.journal.write(json.dumps({"base": self.base_key}) + '\n')
+        start = time.perf_counter()
+        self.journal.write(json.dumps(op, separators=(',', ':')) + '\n')
+        self.journal.flush()
+        METRICS.observe('file_write', time.perf_counter() - start)
+        sync_file(self.journal.fileno())
+    
+    def commit(self, op):
+        self.append_journal(op)
+        self.apply(op)
+        self.pending_ops.append(op)
+        if op['op'] == 'delete':
+            self.feed.publish(deleted=[op['id']])
+        else:
+            self.feed.publish(**{'added' if op['op'] == 'add' else 'updated': [op['employee']]})
+        self.version += 1
+        self.modified_at = time.time()
+        if self.database is not None and self.database_version == self.version - 1:
+            try:
+                self.database.apply(op)
+                self.database_version = self.version
+            except sqlite3.Error as e:
+                print(f"Rebuilding {self.database.path} on the next query: {e}")
+        if len(self.pending_ops) >= self.compact_every:
+            self.compact()
+    
+    def get(self, employee_id):
+        with self.lock:
+            if not self.loaded:
+                roster = self.columnar_roster()
+                if roster is not None:
+                    index = roster.find(employee_id)
+                    if index is None:
+                        raise EmployeeNotFound(f"Employee {employee_id} not found")
+                    return roster.record(index)
+            self.sync_with_file()
+            employee = self.employees.get(employee_id)
+            if employee is None:
+                raise EmployeeNotFound(f"Employee {employee_id} not found")
+            return employee
+    
+    def add(self, record):
+        with self.lock:
+            self.sync_with_file()
+            employee = normalize_employee(record)
+            if employee.get('id') is None:
+                employee['id'] = self.max_id + 1
+            elif employee['id'] in self.employees:
+                raise EmployeeConflict(f"Employee {employee['id']} already exists")
+            self.commit({"op": "add", "employee": employee})
+            return employee
+    
+    def update(self, employee_id, fields):
+        with self.lock:
+            self.sync_with_file()
+            if employee_id not in self.employees:
+                raise EmployeeNotFound(f"Employee {employee_id} not found")
+            if not isinstance(fields, dict):
+                raise RequestBodyError("Employee must be a JSON object")
+            employee = dict(self.employees[employee_id])
+            employee.update(fields)
+            employee['id'] = employee_id
+            employee = normalize_employee(employee)
+            self.commit({"op": "update", "employee": employee})
+            return employee
+    
+    def delete(self, employee_id):
+        with self.lock:
+            self.sync_with_file()
+            if employee_id not in self.employees:
+                raise EmployeeNotFound(f"Employee {employee_id} not found")
+            self.commit({"op": "delete", "id": employee_id})
+    
+    def roster(self):
+        """Current employee records in file order, including journaled edits"""
+        with self.lock:
+            self.sync_with_file()
+            return list(self.employees.values())
+    
+    def records(self):
+        """Iterator over the current records, for streaming exports.
+        
+        A loaded store hands out a snapshot of its record references; otherwise
+        employees.json is decoded element by element instead of all at once.
+        """
+        with self.lock:
+            if self.loaded or os.path.exists(self.journal_path):
+                self.sync_with_file()
+                return iter(list(self.employees.values()))
+        return iter_roster_file(self.json_path)
+    
+    def versioned_roster(self):
+        """(current employee records, self.version they are)"""
+        with self.lock:
+            return self.roster(), self.version
+    
+    def roster_digest(self, employees, version):
+        """roster_digest of employees from this store, computed once per roster version"""
+        with self.lock:
+            if self.digest[0] == version:
+                return self.digest[1]
+        digest = roster_digest(employees)
+        with self.lock:
+            self.digest = (version, digest)
+        return digest
+    
+    def columnar_roster(self):
+        """ColumnarRoster of employees.json, or None if it is off, edits are pending or conversion fails.
+        
+        A columns file converted from a different employees.json (by inode,
+        size and mtime) is rebuilt first. Old maps are not closed; rosters
+        handed out earlier stay valid until they are dropped.
+        """
+        if not self.columnar:
+            return None
+        with self.lock:
+            if self.pending_ops or (not self.loaded and os.path.exists(self.journal_path)):
+                return None
+            key = self.file_key()
+            if key is None:
+                return None
+            if self.columns is None or self.columns.source_key != key:
+                self.columns = self.open_columns(key)
+            return self.columns
+    
+    def open_columns(self, key):
+        path = roster_store.columns_path(self.json_path)
+        try:
+            roster = roster_store.ColumnarRoster(path)
+            if roster.source_key == key:
+                return roster
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Rebuilding {path}: {e}")
+        try:
+            roster_store.write_columns(path, iter_roster_file(self.json_path), key)
+            return roster_store.ColumnarRoster(path)
+        except (OSError, ValueError, RequestBodyError) as e:
+            print(f"Not using {path}: {e}")
+            return None
+    
+    def query(self, query):
+        """Body of one page of the roster for a roster_db.EmployeeQuery, including journaled edits"""
+        with self.lock:
+            if self.loaded:
+                self.sync_with_file()
+            elif os.path.exists(self.journal_path):
+                self.load()
+            key = self.base_key if self.loaded else self.file_key()
+            if key is None and not self.loaded:
+                return roster_db.page_body([], 0, None)
+            if not self.sqlite or key is None:
+                self.sync_with_file()
+                # Pages list the employees addressable by id, as the database does
+                records = [record for employee_id, record in self.employees.items() if isinstance(employee_id, int)]
+            else:
+                records = None
+                database = self.query_database(key)
+        if records is not None:
+            return roster_db.query_records(records, query)
+        return database.query(query)
+    
+    def query_database(self, key):
+        """The RosterDatabase, rebuilt first unless it matches employees.json (key) plus pending edits"""
+        if self.database is None:
+            self.database = roster_db.RosterDatabase(roster_db.database_path(self.json_path))
+        database = self.database
+        if database.source_key != key or (self.pending_ops and self.database_version != self.version):
+            start = time.perf_counter()
+            database.rebuild(iter([record for employee_id, record in self.employees.items()
+                                   if isinstance(employee_id, int)]) if self.loaded
+                             else iter_roster_file(self.json_path),
+                             key)
+            print(f"Indexed {self.json_path} in {database.path} ({time.perf_counter() - start:.2f}s)")
+        self.database_version = self.version
+        return database
+    
+    def pending_entry(self):
+        """CachedRoster for GET /api/employees while edits are only in the journal, else None"""
+        if not self.loaded:
+            if not os.path.exists(self.journal_path):
+                return None
+            self.load()
+        if not self.pending_ops:
+            return None
+        with self.lock:
+            self.sync_with_file()
+            if not self.pending_ops:
+                return None
+            if self.cached is None or self.cached_version != self.version:
+                start = time.perf_counter()
+                body = json.dumps(list(self.employees.values()), indent=2).encode()
+                METRICS.observe('json_serialize', time.perf_counter() - start)
+                self.cached = CachedRoster(None, body, self.modified_at, etag=f'"j{self.token}-{self.version:x}"')
+                self.cached_version = self.version
+            return self.cached
+    
+    def close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+    
+    def compact(self):
+        """Fold pending journal entries into employees.json and start a fresh journal"""
+        with self.lock:
+            if not self.pending_ops:
+                return
+            temp_path = new_temp_path(self.json_path)
+            try:
+                start = time.perf_counter()
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    # Serializes straight into the file; the time includes the writes
+                    json.dump(list(self.employees.values()), f, indent=2)
+                    f.flush()
+                    METRICS.observe('json_serialize', time.perf_counter() - start)
+                    sync_file(f.fileno())
+                install_roster_file(self.json_path, temp_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            # employees.json now matches memory, so the store stays loaded
+            self.reset_journal()
+            if self.database is not None and self.database_version == self.version:
+                self.database.set_source(self.base_key)
+    
+    def reset_journal(self):
+        self.close_journal()
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            pass
+        self.pending_ops = []
+        self.base_key = self.watched_key = self.file_key()
+    
+    def discard_journal(self):
+        """Drop pending edits after employees.json was replaced wholesale"""
+        with self.lock:
+            self.reset_journal()
+            # Reloaded lazily by sync_with_file() on the next edit
+            self.loaded = False
+            self.version += 1
+            self.feed.publish(reset=True)
+    
+    def check_file(self):
+        """Publish the changes if another program has replaced or edited employees.json"""
+        with self.lock:
+            key = self.file_key()
+            if key == self.watched_key:
+                return
+            self.watched_key = key
+            if not self.loaded:
+                # Nothing in memory to compare with
+                self.feed.publish(reset=True)
+                return
+            try:
+                self.sync_with_file()
+            except Exception as e:
+                print(f"Error reloading {self.json_path}: {e}")
+                self.feed.publish(reset=True)
+
+
+class SweepPool:
+    """Process pool shared by POST /api/sweep and /api/simulate, started on first use.
+    
+    Each running sweep registers a cancel event under its id so
+    DELETE /api/sweep/{id} can stop it from another connection.
+    """
+    
+    def __init__(self, workers=DEFAULT_SWEEP_WORKERS):
+        self.workers = workers
+        self.pool = None
+        self.lock = threading.Lock()
+        self.active = {}
+    
+    def configure(self, workers):
+        self.workers = max(1, workers)
+    
+    def executor(self):
+        with self.lock:
+            if self.pool is None:
+                # spawn, not fork: forking a process with live server threads can copy held locks
+                self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+            return self.pool
+    
+    def start(self, sweep_id):
+        event = threading.Event()
+        with self.lock:
+            self.active[sweep_id] = event
+        return event
+    
+    def finish(self, sweep_id):
+        with self.lock:
+            self.active.pop(sweep_id, None)
+    
+    def cancel(self, sweep_id):
+        with self.lock:
+            event = self.active.get(sweep_id)
+        if event is None:
+            return False
+        event.set()
+        return True
+    
+    def shutdown(self):
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+SWEEPS = SweepPool()
+
+
+def roster_digest(employees):
+    """SHA-256 of everything about a roster a valuation result depends on: every field, in roster order"""
+    sha = hashlib.sha256()
+    rows = ((e.id, e.name, e.hiredYear, e.dateOfBirth, e.spouseDateOfBirth, e.sex, e.spouseSex) for e in employees)
+    while True:
+        batch = list(itertools.islice(rows, ROSTER_BATCH_ROWS))
+        if not batch:
+            return sha.hexdigest()
+        sha.update(json.dumps(batch, separators=(',', ':')).encode())
+
+
+def json_with_fields(body, **fields):
+    """A serialized (non-empty) JSON object with members added, without parsing it"""
+    return body[:body.rindex(b'}')] + b', ' + json.dumps(fields)[1:].encode()
+
+
+class ResultCache:
+    """Finished system valuations by content hash, on disk across restarts.
+    
+    The key is the SHA-256 of pension_calc.py's source, the canonical
+    config, the roster's contents, the valuation year and whether the exact
+    arithmetic was asked for; any change to one of them is a different key,
+    so an entry never goes stale. An entry is `<hash>.json`, the full
+    SystemCalculationResult as sent, and `<hash>.meta.json`, what was valued
+    plus the result without employee results. Results valued with
+    "includeEmployees": false are kept as the meta file alone (a later request
+    for employee results is a miss, and stores them). The meta file's mtime is the
+    entry's last use: once the files pass `max_bytes` the least recently used
+    entries are deleted, except those a named baseline refers to. Baselines
+    are kept in `baselines.json` in the same directory.
+    
+    `json_editor_server.py warm` fills the directory from another process;
+    keys that aren't in the index are looked for on disk.
+    """
+    BASELINES_FILE = 'baselines.json'
+    META_SUFFIX = '.meta.json'
+    
+    def __init__(self, directory=DEFAULT_RESULTS_CACHE_DIR, max_bytes=DEFAULT_RESULTS_CACHE_SIZE * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = None  # hash -> bytes on disk, least recently used first; scanned on first use
+        self.size = 0
+        self.baselines = None  # name -> {"hash", "created"}; read on first use
+        self.engine = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+    
+    def configure(self, directory, max_bytes):
+        with self.lock:
+            self.directory = directory
+            self.max_bytes = max(0, max_bytes)
+            self.entries = None
+            self.baselines = None
+    
+    def paths(self, key):
+        return os.path.join(self.directory, key + '.json'), os.path.join(self.directory, key + self.META_SUFFIX)
+    
+    def key(self, config, roster, current_year, exact):
+        """Cache key of valuing config against a roster (its roster_digest) in current_year"""
+        if self.engine is None:
+            with open(pension_calc.__file__, 'rb') as f:
+                self.engine = hashlib.sha256(f.read()).hexdigest()
+        canonical = json.dumps({"engine": self.engine, "config": config.to_dict(), "roster": roster,
+                                "currentYear": current_year, "exact": bool(exact)},
+                               sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+    
+    def index(self):
+        """The entries on disk, oldest use first (call with the lock held)"""
+        if self.entries is None:
+            found = []
+            try:
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith(self.META_SUFFIX):
+                        key = entry.name[:-len(self.META_SUFFIX)]
+                        size = self.entry_size(key)
+                        if size is not None:
+                            found.append((entry.stat().st_mtime_ns, key, size))
+            except OSError:
+                pass
+            self.entries = collections.OrderedDict((key, size) for _, key, size in sorted(found))
+            self.size = sum(self.entries.values())
+        return self.entries
+    
+    def entry_size(self, key):
+        path, meta_path = self.paths(key)
+        try:
+            size = os.path.getsize(meta_path)
+        except OSError:
+            return None
+        try:
+            return size + os.path.getsize(path)
+        except OSError:
+            return size
+    
+    def find(self, key):
+        """Whether key is cached; marks it most recently used"""
+        with self.lock:
+            entries = self.index()
+            if key not in entries:
+                # Perhaps added by another process
+                size = self.entry_size(key)
+                if size is None:
+                    return False
+                entries[key] = size
+                self.size += size
+            entries.move_to_end(key)
+        try:
+            os.utime(self.paths(key)[1])
+        except OSError:
+            pass
+        return True
+    
+    def get(self, key, include_employees=True):
+        """Result JSON of a valuation, counted as a hit, or None counted as a miss"""
+        body = self.read(key, include_employees)
+        with self.lock:
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return body
+    
+    def read(self, key, include_employees=True):
+        """Result JSON of an entry (without employee results unless include_employees), or None.
+        
+        None too when employee results are asked for and the entry has none.
+        """
+        if not self.find(key):
+            return None
+        path, meta_path = self.paths(key)
+        try:
+            if include_employees:
+                with open(path, 'rb') as f:
+                    return f.read()
+            return json.dumps(self.meta(key)['result']).encode()
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+    
+    def meta(self, key):
+        with open(self.paths(key)[1], 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def put(self, key, result, valued):
+        """Store a result dict and what was valued; returns the result JSON.
+        
+        A cache that cannot be written is only a missed optimization.
+        """
+        body = json.dumps(result).encode()
+        include_employees = 'employeeResults' in result
+        summary = {name: value for name, value in result.items() if name != 'employeeResults'}
+        meta = json.dumps(dict(valued, hash=key, created=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                               employeeResults=include_employees, result=summary)).encode()
+        path, meta_path = self.paths(key)
+        files = ((path, body), (meta_path, meta)) if include_employees else ((meta_path, meta),)
+        temp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if not include_employees and os.path.exists(path):
+                os.remove(path)
+            # The meta file goes last: it is what marks a complete entry
+            for path, data in files:
+                fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.', suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+                temp_path = None
+        except OSError as e:
+            print(f"Could not cache valuation result: {e}")
+            return body
+        finally:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+        size = sum(len(data) for _, data in files)
+        with self.lock:
+            entries = self.index()
+            self.size += size - entries.pop(key, 0)
+            entries[key] = size
+            self.evict()
+        return body
+    
+    def evict(self):
+        """Delete least recently used entries down to max_bytes (call with the lock held)"""
+        if self.size <= self.max_bytes:
+            return
+        pinned = {baseline['hash'] for baseline in self.load_baselines().values()}
+        for key in list(self.entries):
+            if self.size <= self.max_bytes:
+                break
+            if key in pinned:
+                continue
+            self.size -= self.entries.pop(key)
+            self.evictions += 1
+            for path in reversed(self.paths(key)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+    
+    def load_baselines(self):
+        """name -> {"hash", "created"} (call with the lock held)"""
+        if self.baselines is None:
+            try:
+                with open(os.path.join(self.directory, self.BASELINES_FILE), 'r', encoding='utf-8') as f:
+                    baselines = json.load(f)
+                self.baselines = baselines if isinstance(baselines, dict) else {}
+            except (OSError, ValueError):
+                self.baselines = {}
+        return self.baselines
+    
+    def save_baselines(self):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.baselines, f, indent=2)
+            os.replace(temp_path, os.path.join(self.directory, self.BASELINES_FILE))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def set_baseline(self, name, key):
+        """Point a named baseline at a cached result; False if there is no such result"""
+        if not self.find(key):
+            return False
+        with self.lock:
+            self.load_baselines()[name] = {"hash": key, "created": time.strftime('%Y-%m-%dT%H:%M:%S%z')}
+            self.save_baselines()
+        return True
+    
+    def delete_baseline(self, name):
+        with self.lock:
+            if self.load_baselines().pop(name, None) is None:
+                return False
+            self.save_baselines()
+        return True
+    
+    def baseline(self, name):
+        with self.lock:
+            return self.load_baselines().get(name)
+    
+    def list_baselines(self):
+        """Every baseline with the summary of the result it names (None if that is gone)"""
+        with self.lock:
+            baselines = dict(self.load_baselines())
+        listed = []
+        for name, baseline in sorted(baselines.items()):
+            try:
+                result = self.meta(baseline['hash'])['result']
+            except (OSError, ValueError, KeyError, TypeError):
+                result = None
+            listed.append(dict(baseline, name=name, result=result))
+        return listed
+    
+    def stats(self):
+        with self.lock:
+            entries = self.index()
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(entries),
+                'bytes': self.size,
+                'maxBytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'baselines': len(self.load_baselines()),
+                'directory': self.directory,
+            }
+
+
+RESULTS = ResultCache()
+
+
+class ValuationSession:
+    """A pension_calc.IncrementalValuation of one store's roster, kept current from its ChangeFeed.
+
+    The session is built from the whole roster, then each add, update or
+    delete event re-values just that employee, as the store publishes it.
+    A reset event, a gap in the feed (more than EVENT_HISTORY events
+    missed) or a record that cannot be valued leaves it stale, and the
+    next read rebuilds it. All state changes happen under the store's lock,
+    which the store already holds when it publishes an edit.
+    """
+
+    def __init__(self, store, config, current_year, exact):
+        self.store = store
+        self.config = config
+        self.current_year = current_year
+        self.exact = exact
+        self.valuation = None  # None: stale, rebuilt on the next read
+        self.version = 0  # feed version the valuation includes
+        self.edits = 0
+        self.rebuilds = 0
+        self.mismatches = 0
+        self.build_seconds = 0.0
+        self.last_edit_seconds = 0.0
+
+    def settings(self):
+        return self.config.to_dict(), self.current_year, self.exact
+
+    def rebuild(self):
+        """Value the whole roster; raises ValueError if it cannot be"""
+        with self.store.lock:
+            start = time.perf_counter()
+            records = self.store.roster()
+            version = self.store.feed.version
+            self.valuation = None
+            cohort_cache = None if self.exact else pension_calc.COHORT_CACHE
+            self.valuation = pension_calc.IncrementalValuation(
+                self.config, pension_calc.parse_employees(records), self.current_year, cohort_cache)
+            self.version = version
+            self.rebuilds += 1
+            self.build_seconds = time.perf_counter() - start
+
+    def catch_up(self):
+        """Apply the feed events since the valuation's version (a ChangeFeed listener)"""
+        with self.store.lock:
+            if self.valuation is None:
+                return
+            events = self.store.feed.since(self.version)
+            if events is None:
+                self.valuation = None
+                return
+            for number, text in events:
+                start = time.perf_counter()
+                change = json.loads(text)
+                if change.get('reset'):
+                    self.valuation = None
+                    return
+                try:
+                    for record in change.get('added', []) + change.get('updated', []):
+                        self.valuation.set(pension_calc.Employee.from_dict(record))
+                except ValueError:
+                    self.valuation = None
+                    return
+                for employee_id in change.get('deleted', []):
+                    self.valuation.remove(employee_id)
+                self.version = number
+                self.edits += 1
+                self.last_edit_seconds = time.perf_counter() - start
+
+    def snapshot(self, include_employees):
+        """(SystemResult, vested employee count, session info) as of now, rebuilding first if stale"""
+        with self.store.lock:
+            self.store.sync_with_file()  # picks up edits other programs made to employees.json
+            if self.valuation is None:
+                self.rebuild()
+            self.catch_up()
+            if self.valuation is None:
+                self.rebuild()
+            return self.valuation.result(include_employees), self.valuation.vested, self.info()
+
+    def info(self):
+        return {
+            'version': self.version,
+            'employees': len(self.valuation.members) if self.valuation is not None else None,
+            'currentYear': self.current_year,
+            'exact': self.exact,
+            'edits': self.edits,
+            'rebuilds': self.rebuilds,
+            'mismatches': self.mismatches,
+            'buildMs': round(self.build_seconds * 1000, 3),
+            'lastEditMs': round(self.last_edit_seconds * 1000, 4),
+        }
+
+    def verify(self):
+        """Compare the session with a full calculate_system_costs of the same roster version.
+
+        The roster is copied under the store's lock and valued outside it.
+        If they disagree the session is marked stale so the next read
+        rebuilds it.
+        """
+        with self.store.lock:
+            records = self.store.roster()
+            result, vested, info = self.snapshot(False)
+        session = result.to_dict(include_employees=False)
+        session['vestedEmployeeCount'] = vested
+        start = time.perf_counter()
+        cohort_cache = None if self.exact else pension_calc.COHORT_CACHE
+        full = pension_calc.calculate_system_costs(self.config, pension_calc.parse_employees(records),
+                                                   self.current_year, cohort_cache).to_dict(include_employees=False)
+        full_seconds = time.perf_counter() - start
+        largest, mismatches = pension_calc.compare_results(session, full)
+        if mismatches:
+            with self.store.lock:
+                self.mismatches += 1
+                if self.version == info['version']:
+                    self.valuation = None
+        return {
+            'consistent': not mismatches,
+            'maxRelativeDifference': largest,
+            'mismatches': mismatches,
+            'version': info['version'],
+            'fullMs': round(full_seconds * 1000, 3),
+        }
+
+
+class ValuationSessions:
+    """The live valuation session of each roster (POST/GET/DELETE /api/valuation/session).
+
+    Starting a session with the settings (config, year, exact) of the one
+    already running keeps it; different settings replace it with a fresh
+    build. Each store gets one ChangeFeed listener, which forwards its
+    events to whichever session is current.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}  # json path -> ValuationSession
+        self.followed = set()  # json paths whose feed has our listener
+
+    def start(self, store, config, current_year, exact):
+        session = ValuationSession(store, config, current_year, exact)
+        with self.lock:
+            current = self.sessions.get(store.json_path)
+            if current is not None and current.settings() == session.settings():
+                return current
+            self.sessions[store.json_path] = session
+            if store.json_path not in self.followed:
+                self.followed.add(store.json_path)
+                store.feed.listeners.append(lambda: self.follow(store))
+        return session
+
+    def get(self, store):
+        with self.lock:
+            return self.sessions.get(store.json_path)
+
+    def stop(self, store):
+        with self.lock:
+            return self.sessions.pop(store.json_path, None) is not None
+
+    def follow(self, store):
+        session = self.get(store)
+        if session is not None:
+            session.catch_up()
+
+
+VALUATIONS = ValuationSessions()
+
+
+def watch_files_forever(interval):
+    """Background thread: notice edits other programs make to the roster files.
+    
+    One stat() per roster per interval; polling works on every platform and
+    filesystem, where inotify would tie the server to Linux.
+    """
+    while True:
+        time.sleep(interval)
+        for store in list(EmployeeStore.stores.values()):
+            try:
+                store.check_file()
+            except Exception as e:
+                print(f"Error checking {store.json_path}: {e}")
+
+
+def compact_journals_forever(interval):
+    """Background thread: periodically fold journaled edits into the roster file"""
+    while True:
+        time.sleep(interval)
+        for store in list(EmployeeStore.stores.values()):
+            try:
+                store.compact()
+            except Exception as e:
+                print(f"Error compacting {store.journal_path}: {e}")
+
+
+def batch_config_paths(paths):
+    """The config files a calc run values: each file given, and each directory's *.json in name order"""
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(entry.path for entry in os.scandir(path)
+                              if entry.name.endswith('.json') and entry.is_file())
+        else:
+            yield path
+
+
+def limit_memory(max_bytes):
+    """Cap this process's address space so a valuation that needs more raises MemoryError.
+    
+    Returns False where the limit can't be set (no `resource` module).
+    """
+    if resource is None or not hasattr(resource, 'RLIMIT_AS'):
+        return False
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        max_bytes = min(max_bytes, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, hard))
+    return True
+
+
+_batch_roster = None  # employees valued by this calc worker process
+
+
+def start_batch_worker(rows, cohort_cache_size, max_memory):
+    """Process pool initializer for calc --jobs: decode the roster once per worker"""
+    global _batch_roster
+    _batch_roster = [pension_calc.Employee(*row) for row in rows]
+    pension_calc.COHORT_CACHE.max_entries = cohort_cache_size
+    if max_memory:
+        limit_memory(max_memory)
+
+
+def value_config_file(path, current_year, exact=False, employees=None, include_employees=False):
+    """One calc output record: the valuation of the PensionConfiguration JSON at path.
+    
+    Errors (unreadable file, bad config, out of memory) are reported in the
+    record, so one bad config doesn't stop the run.
+    """
+    start = time.perf_counter()
+    record = {"config": path}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = pension_calc.PensionConfig.from_dict(json.load(f))
+        result = pension_calc.calculate_system_costs(config, _batch_roster if employees is None else employees,
+                                                     current_year, None if exact else pension_calc.COHORT_CACHE)
+        record["result"] = result.to_dict(include_employees=include_employees)
+    except MemoryError:
+        record["error"] = "out of memory (--max-memory)"
+    except (OSError, ValueError) as e:
+        record["error"] = str(e)
+    record["elapsedMs"] = round((time.perf_counter() - start) * 1000, 3)
+    return record
+
+
+def run_batch_valuation(paths, employees, current_year, jobs=1, exact=False, max_memory=None,
+                        cohort_cache_size=pension_calc.DEFAULT_COHORT_CACHE_SIZE, include_employees=False):
+    """Value every config file against the roster, yielding output records in input order.
+    
+    With jobs > 1 configs are valued in a process pool, each worker holding
+    its own copy of the roster. At most jobs * BATCH_WINDOW_PER_JOB configs
+    are in flight, so memory stays flat however many configs there are.
+    """
+    paths = iter(paths)
+    if jobs <= 1:
+        pension_calc.COHORT_CACHE.max_entries = cohort_cache_size
+        if max_memory:
+            limit_memory(max_memory)
+        for path in paths:
+            yield value_config_file(path, current_year, exact, employees, include_employees)
+        return
+    rows = [(e.id, e.name, e.hiredYear, e.dateOfBirth, e.spouseDateOfBirth, e.sex, e.spouseSex) for e in employees]
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=start_batch_worker,
+                             initargs=(rows, cohort_cache_size, max_memory)) as pool:
+        pending = collections.deque(pool.submit(value_config_file, path, current_year, exact, None, include_employees)
+                                    for path in itertools.islice(paths, jobs * BATCH_WINDOW_PER_JOB))
+        while pending:
+            record = pending.popleft().result()
+            for path in itertools.islice(paths, 1):
+                pending.append(pool.submit(value_config_file, path, current_year, exact, None, include_employees))
+            yield record
+
+
+def app_config_path(json_path):
+    return os.path.join(os.path.dirname(json_path), APP_CONFIG_NAME)
+
+
+def split_app_paths(value):
+    """Export targets from an appPath string (one per line) or an appPaths list, blanks and repeats dropped"""
+    if isinstance(value, str):
+        value = value.splitlines()
+    if not isinstance(value, list) or not all(isinstance(path, str) for path in value):
+        raise ValueError("appPaths must be a list of strings")
+    return list(dict.fromkeys(path.strip() for path in value if path.strip()))
+
+
+def load_app_paths(json_path):
+    """Saved export targets for a roster ([] if none were saved)"""
+    try:
+        with open(app_config_path(json_path), 'r') as f:
+            return split_app_paths(f.read())
+    except (OSError, ValueError):
+        return []
+
+
+def save_app_paths(json_path, app_paths):
+    config_path = app_config_path(json_path)
+    config_dir = os.path.dirname(config_path)
+    if config_dir and not os.path.exists(config_dir):
+        os.makedirs(config_dir, exist_ok=True)
+    with open(config_path, 'w') as f:
+        f.write('\n'.join(app_paths))
+    return config_path
+
+
+class AppExporter:
+    """Copies the roster into app Documents directories (POST /api/export).
+    
+    Targets are exported concurrently, each through a temp file in the
+    target's directory renamed over employees.json, so the app never reads
+    a partial roster. A target that already holds the roster's SHA-256 is
+    skipped; digests are remembered by (inode, size, mtime), so files that
+    haven't changed are hashed once. The data is cloned (reflink) or copied
+    in the kernel (copy_file_range) where the filesystem allows; with
+    `hardlink` set (--export-hardlink) a target on the roster's filesystem
+    becomes a hard link to it instead. That is safe as long as neither side
+    writes into the file in place: the server only replaces the roster by
+    rename, and the app saves with .atomic (EmployeeDataLoader).
+    
+    With `auto` set (--auto-export), every change to a roster is exported to
+    its saved targets in the background, `delay` seconds after the last
+    change in a burst.
+    """
+    
+    def __init__(self):
+        self.hardlink = False
+        self.auto = False
+        self.delay = DEFAULT_AUTO_EXPORT_DELAY
+        self.lock = threading.Lock()
+        self.digests = {}  # path -> ((ino, size, mtime_ns), sha256 hex)
+        self.timers = {}  # json path -> pending auto-export
+        self.last = {}  # json path -> result of the last export
+    
+    def configure(self, hardlink, auto, delay=DEFAULT_AUTO_EXPORT_DELAY):
+        self.hardlink = hardlink
+        self.auto = auto
+        self.delay = max(0.0, delay)
+    
+    @staticmethod
+    def target_path(app_path):
+        app_path = os.path.expanduser(app_path)
+        # A Documents directory gets employees.json; anything else names the file itself
+        return os.path.join(app_path, 'employees.json') if os.path.isdir(app_path) else app_path
+    
+    def digest(self, path, st, fd=None):
+        """SHA-256 of the file at path (or open as fd) with stat st, hashed only if it changed since last time"""
+        key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        with self.lock:
+            known = self.digests.get(path)
+        if known is not None and known[0] == key:
+            return known[1]
+        sha = hashlib.sha256()
+        with open(path if fd is None else fd, 'rb', closefd=fd is None) as f:
+            for chunk in iter(lambda: f.read(BODY_CHUNK_SIZE * 16), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        self.remember(path, st, digest)
+        return digest
+    
+    def remember(self, path, st, digest):
+        with self.lock:
+            self.digests[path] = ((st.st_ino, st.st_size, st.st_mtime_ns), digest)
+    
+    def export(self, json_path, app_paths):
+        """Export the roster at json_path to every target; the per-target results as a response dict"""
+        app_paths = split_app_paths(app_paths)
+        if not app_paths:
+            return {"success": False, "error": "App path not specified"}
+        start = time.perf_counter()
+        # Fold journaled edits into the file so the apps get the current roster
+        EmployeeStore.for_path(json_path).compact()
+        if not os.path.exists(json_path):
+            return {"success": False, "error": "Source file does not exist"}
+        with open(json_path, 'rb') as source:
+            # Every target gets this file, even if a save replaces json_path meanwhile
+            st = os.fstat(source.fileno())
+            digest = self.digest(json_path, st, source.fileno())
+            targets = list(dict.fromkeys(map(self.target_path, app_paths)))
+            if len(targets) == 1:
+                results = [self.export_one(json_path, source, st, digest, targets[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=min(len(targets), MAX_EXPORT_WORKERS),
+                                        thread_name_prefix='json-editor-export') as pool:
+                    results = list(pool.map(lambda target: self.export_one(json_path, source, st, digest, target),
+                                            targets))
+        failed = [result for result in results if result['status'] == 'failed']
+        exported = sum(result['status'] == 'exported' for result in results)
+        result = {"success": not failed, "sha256": digest, "bytes": st.st_size,
+                  "seconds": round(time.perf_counter() - start, 6), "targets": results}
+        if failed:
+            result["error"] = "; ".join(f"{item['path']}: {item['error']}" for item in failed)
+        elif len(results) == 1:
+            verb = "Exported to" if exported else "Already up to date:"
+            result["message"] = f"{verb} {results[0]['path']}"
+        else:
+            result["message"] = f"Exported to {exported} of {len(results)} targets ({len(results) - exported} up to date)"
+        self.last[json_path] = result
+        return result
+    
+    def export_one(self, json_path, source, st, digest, target):
+        start = time.perf_counter()
+        result = {"path": target}
+        try:
+            try:
+                target_st = os.stat(target)
+            except FileNotFoundError:
+                target_st = None
+            if target_st is not None and target_st.st_size == st.st_size and self.digest(target, target_st) == digest:
+                result.update(status='unchanged', method=None, bytes=0)
+            else:
+                result.update(status='exported', method=self.install_copy(json_path, source, st, target),
+                              bytes=st.st_size)
+                self.remember(target, os.stat(target), digest)
+        except Exception as e:
+            result.update(status='failed', error=str(e))
+        result['seconds'] = round(time.perf_counter() - start, 6)
+        return result
+    
+    def install_copy(self, json_path, source, st, target):
+        """Put the roster open as source at target by rename; how the data got there"""
+        directory = os.path.dirname(target) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(target) + '.', suffix='.tmp', dir=directory)
+        try:
+            method = None
+            if self.hardlink:
+                os.close(fd)
+                fd = None
+                method = self.link(json_path, st, temp_path)
+                if method is None:
+                    fd = os.open(temp_path, os.O_WRONLY)
+            if method is None:
+                method = self.copy_data(source.fileno(), fd, st.st_size)
+                # Like shutil.copy2: the app sees the roster's permissions and modification time
+                os.chmod(temp_path, st.st_mode & 0o7777)
+                os.utime(temp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+                sync_file(fd)
+                os.close(fd)
+                fd = None
+            os.replace(temp_path, target)
+            fsync_directory(directory)
+            return method
+        finally:
+            if fd is not None:
+                os.close(fd)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    @staticmethod
+    def link(json_path, st, temp_path):
+        """Hard-link temp_path to the roster if it is still the file being exported; 'hardlink' or None"""
+        os.remove(temp_path)
+        try:
+            os.link(json_path, temp_path)
+        except OSError:
+            # Another filesystem, or one without hard links
+            return None
+        linked = os.stat(temp_path)
+        if (linked.st_dev, linked.st_ino) == (st.st_dev, st.st_ino):
+            return 'hardlink'
+        # A save replaced the roster after it was opened; copy the opened one
+        os.remove(temp_path)
+        os.close(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+        return None
+    
+    @staticmethod
+    def copy_data(source_fd, target_fd, size):
+        """Copy size bytes between file descriptors by the fastest means available; the means used"""
+        if fcntl is not None and sys.platform.startswith('linux'):
+            try:
+                fcntl.ioctl(target_fd, FICLONE, source_fd)
+                return 'reflink'
+            except OSError:
+                pass
+        if hasattr(os, 'copy_file_range'):
+            offset = 0
+            try:
+                while offset < size:
+                    copied = os.copy_file_range(source_fd, target_fd, size - offset, offset, offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+                if offset == size:
+                    return 'copy_file_range'
+            except OSError:
+                pass
+            os.ftruncate(target_fd, 0)
+        # pread/pwrite, not read/write: the targets' threads share the source's file offset
+        offset = 0
+        while offset < size:
+            chunk = os.pread(source_fd, min(BODY_CHUNK_SIZE * 16, size - offset), offset)
+            if not chunk:
+                break
+            written = 0
+            while written < len(chunk):
+                written += os.pwrite(target_fd, chunk[written:], offset + written)
+            offset += written
+        return 'copy'
+    
+    def schedule(self, json_path):
+        """Export json_path to its saved targets once changes to it stop for `delay` seconds"""
+        with self.lock:
+            timer = self.timers.get(json_path)
+            if timer is not None:
+                timer.cancel()
+            timer = self.timers[json_path] = threading.Timer(self.delay, self.auto_export, (json_path,))
+            timer.daemon = True
+            timer.start()
+    
+    def auto_export(self, json_path):
+        with self.lock:
+            self.timers.pop(json_path, None)
+        app_paths = load_app_paths(json_path)
+        if not app_paths:
+            return
+        try:
+            result = self.export(json_path, app_paths)
+        except Exception as e:
+            print(f"Error auto-exporting {json_path}: {e}")
+            return
+        print(f"Auto-export: {result.get('message') or result.get('error')} ({result['seconds'] * 1000:.1f} ms)")
+
+
+EXPORTS = AppExporter()
+
+
+class CountingWriter:
+    """A connection's wfile, counting the bytes written for /metrics"""
+    
+    def __init__(self, raw):
+        self.raw = raw
+        self.written = 0
+    
+    def write(self, data):
+        self.written += len(data)
+        return self.raw.write(data)
+    
+    def flush(self):
+        self.raw.flush()
+
+    # StreamRequestHandler.finish() checks and closes wfile when the connection ends
+    @property
+    def closed(self):
+        return self.raw.closed
+
+    def close(self):
+        self.raw.close()
+
 
 class JSONEditorHandler(http.server.SimpleHTTPRequestHandler):
     json_file_path = DEFAULT_JSON_PATH
+    # HTTP/1.1 keeps connections alive between requests, so every response
+    # must carry a Content-Length (see send_body)
+    protocol_version = 'HTTP/1.1'
+    timeout = DEFAULT_KEEPALIVE_TIMEOUT
+    # Headers and body go out in separate writes; without TCP_NODELAY a
+    # small body waits on the client's delayed ACK (~40ms per request)
+    disable_nagle_algorithm = True
+    max_body_size = DEFAULT_MAX_BODY_SIZE
+    pages = {}  # json_file_path -> StaticPage
+    max_event_streams = DEFAULT_MAX_EVENT_STREAMS
+    event_streams = 0
+    event_streams_lock = threading.Lock()
+    
+    @classmethod
+    def editor_page(cls):
+        """The StaticPage for json_file_path, rendered on first use (main() renders it at startup)"""
+        page = cls.pages.get(cls.json_file_path)
+        if page is None:
+            page = cls.pages[cls.json_file_path] = StaticPage(cls.get_html_page())
+        return page
+    
+    def content_encoding(self):
+        return negotiate_encoding(self.headers.get('Accept-Encoding'))
+    
+    # MARK: - Request metrics
+    
+    def setup(self):
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+    
+    def handle_one_request(self):
+        self.request_started = None
+        try:
+            super().handle_one_request()
+        finally:
+            self.end_request()
+    
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        self.begin_request()
+        return True
+    
+    def begin_request(self):
+        self.request_started = time.perf_counter()
+        self.response_status = 0
+        self.written_before = self.wfile.written
+        METRICS.request_started()
+        self.profile = PROFILER.enabled and PROFILER.start(self)
+    
+    def end_request(self):
+        if self.request_started is not None:
+            METRICS.request_finished(self.command, METRICS.route(self.path), self.response_status,
+                                     self.wfile.written - self.written_before,
+                                     time.perf_counter() - self.request_started)
+            self.request_started = None
+            if self.profile:
+                PROFILER.finish(self.profile, self, self.response_status)
+    
+    def send_response(self, code, message=None):
+        self.response_status = code
+        super().send_response(code, message)
+    
+    def send_profiles(self):
+        """GET /api/profiles lists the kept profiles; GET /api/profiles/{file} downloads one of their files"""
+        if not PROFILER.enabled:
+            self.send_body(404, json.dumps({"success": False, "error": "Profiling is off (start with --profile-dir)"}))
+            return
+        match = PROFILE_PATH.match(self.path)
+        if match is None:
+            self.send_body(200, json.dumps({"directory": PROFILER.directory, "rate": PROFILER.rate,
+                                            "keep": PROFILER.keep, "profiles": PROFILER.profiles()}))
+            return
+        path = PROFILER.path_of(match.group(1))
+        if path is None:
+            self.send_body(404, json.dumps({"success": False, "error": f"No profile file {match.group(1)}"}))
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        content_type = 'application/octet-stream' if path.endswith('.prof') else (
+            'application/json' if path.endswith('.json') else 'text/plain; charset=utf-8')
+        self.send_body(200, body, content_type)
+    
+    def send_metrics(self):
+        """GET /metrics: request, IO and cache metrics in Prometheus text format"""
+        cohorts = pension_calc.COHORT_CACHE.stats()
+        columns = mortality.COLUMNS_CACHE.stats()
+        body = METRICS.render(
+            caches=(('roster', ROSTER_CACHE.hits, ROSTER_CACHE.misses),
+                    ('cohort_factors', cohorts['hits'], cohorts['misses']),
+                    ('mortality_columns', columns['memoryHits'] + columns['diskHits'], columns['builds']),
+                    ('valuation_results', RESULTS.hits, RESULTS.misses)),
+            gauges=(('event_streams', "Open GET /api/events streams.", JSONEditorHandler.event_streams),
+                    ('threads', "Threads in the server process.", threading.active_count())))
+        self.send_body(200, body, 'text/plain; version=0.0.4; charset=utf-8', cors=False)
+    
+    def send_body(self, status, body, content_type='application/json', cors=True):
+        """Send a complete response with Content-Length so keep-alive works.
+        
+        JSON and text bodies of COMPRESS_MIN_SIZE bytes or more are
+        compressed with the encoding the client prefers.
+        """
+        if isinstance(body, str):
+            body = body.encode()
+        compressible = len(body) >= COMPRESS_MIN_SIZE and content_type.startswith(('application/json', 'text/'))
+        encoding = self.content_encoding() if compressible else 'identity'
+        if encoding != 'identity':
+            body = compress(body, encoding)
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if compressible:
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        if cors:
+            self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+    
+    def send_not_found(self):
+        self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def iter_body(self, max_size):
+        """Yield the request body in chunks, honoring Content-Length or chunked encoding.
+        
+        Raises RequestBodyTooLarge as soon as more than max_size bytes are announced or read.
+        """
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            total = 0
+            while True:
+                size_line = self.rfile.readline(1024)
+                try:
+                    remaining = int(size_line.split(b';', 1)[0].strip(), 16)
+                except ValueError:
+                    raise RequestBodyError("Malformed chunked encoding")
+                if remaining == 0:
+                    # Discard optional trailers
+                    while self.rfile.readline(1024) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                total += remaining
+                if total > max_size:
+                    raise RequestBodyTooLarge(f"Request body exceeds {max_size} bytes")
+                while remaining:
+                    chunk = self.rfile.read(min(remaining, BODY_CHUNK_SIZE))
+                    if not chunk:
+                        raise RequestBodyError("Request body ended early")
+                    remaining -= len(chunk)
+                    yield chunk
+                self.rfile.readline(1024)  # CRLF after each chunk
+        else:
+            try:
+                remaining = int(self.headers.get('Content-Length', 0))
+            except ValueError:
+                raise RequestBodyError("Invalid Content-Length")
+            if remaining > max_size:
+                raise RequestBodyTooLarge(f"Request body exceeds {max_size} bytes")
+            while remaining > 0:
+                chunk = self.rfile.read(min(remaining, BODY_CHUNK_SIZE))
+                if not chunk:
+                    raise RequestBodyError("Request body ended early")
+                remaining -= len(chunk)
+                yield chunk
+    
+    def read_small_body(self):
+        return b''.join(self.iter_body(MAX_SMALL_BODY_SIZE))
+    
+    def send_body_error(self, error):
+        # The rest of the body was never read, so the connection cannot be reused
+        self.close_connection = True
+        self.send_body(error.status, json.dumps({"success": False, "error": str(error)}))
     
     def do_GET(self):
         if self.path == '/':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            html = self.get_html_page()
-            # Replace the file path placeholder
-            html = html.replace('{FILE_PATH}', self.json_file_path)
-            self.wfile.write(html.encode())
+            self.send_page()
         elif self.path == '/api/employees':
+            self.send_employees()
+        elif urlparse(self.path).path == '/api/employees':
+            self.send_employee_page(parse_qs(urlparse(self.path).query))
+        elif EMPLOYEE_PATH.match(self.path):
+            self.handle_employee_request(self.store().get)
+        elif urlparse(self.path).path == '/api/events':
+            self.stream_events()
+        elif self.path in ('/api/export.csv', '/api/export.jsonl'):
+            self.export_roster(self.path.rsplit('.', 1)[1])
+        elif self.path == '/metrics':
+            self.send_metrics()
+        elif self.path == '/api/profiles' or PROFILE_PATH.match(self.path):
+            self.send_profiles()
+        elif self.path == '/api/calculate/cache':
+            self.send_body(200, json.dumps(pension_calc.COHORT_CACHE.stats()))
+        elif self.path == '/api/mortality/cache':
+            self.send_body(200, json.dumps(mortality.COLUMNS_CACHE.stats()))
+        elif self.path == '/api/results':
+            self.send_body(200, json.dumps(RESULTS.stats()))
+        elif RESULT_PATH.match(urlparse(self.path).path):
+            self.send_result(RESULT_PATH.match(urlparse(self.path).path).group(1))
+        elif self.path == '/api/baselines':
+            self.send_body(200, json.dumps({"baselines": RESULTS.list_baselines()}))
+        elif BASELINE_PATH.match(urlparse(self.path).path):
+            self.send_baseline()
+        elif urlparse(self.path).path in ('/api/valuation/session', '/api/valuation/session/verify'):
+            self.send_valuation_session_state(verify=urlparse(self.path).path.endswith('/verify'))
+        elif self.path == '/api/apppath':
+            # GET saved app paths, and how the last export went
+            app_paths = load_app_paths(self.json_file_path)
+            self.send_body(200, json.dumps({"appPath": '\n'.join(app_paths), "appPaths": app_paths,
+                                            "autoExport": EXPORTS.auto,
+                                            "lastExport": EXPORTS.last.get(self.json_file_path)}))
+        else:
+            self.send_not_found()
+    
+    def do_POST(self):
+        try:
+            self.route_POST()
+        except RequestBodyError as e:
+            self.send_body_error(e)
+    
+    def route_POST(self):
+        if self.path == '/api/employees':
+            chunks = self.iter_body(self.max_body_size)
+            first = next(chunks, b'')
+            if first.lstrip()[:1] == b'{':
+                # A single object appends one employee; an array replaces the roster
+                body = first + b''.join(chunks)
+                if len(body) > MAX_SMALL_BODY_SIZE:
+                    raise RequestBodyTooLarge(f"Employee record exceeds {MAX_SMALL_BODY_SIZE} bytes")
+                record = self.parse_json_body(body)
+                self.send_employee_result(201, self.store().add(record))
+                return
+            if self.save_json_stream(itertools.chain([first], chunks)):
+                self.send_body(200, b'{"success": true}')
+            else:
+                self.send_body(500, b'{"success": false, "error": "Failed to save"}', cors=False)
+        elif self.path == '/api/export':
+            data = self.parse_json_body(self.read_small_body())
+            if not isinstance(data, dict):
+                raise RequestBodyError("Request must be a JSON object")
+            try:
+                app_paths = split_app_paths(data.get('appPaths', data.get('appPath', '')))
+            except ValueError as e:
+                raise RequestBodyError(str(e))
+            # No paths in the body exports to the saved ones
+            app_paths = app_paths or load_app_paths(self.json_file_path)
+            
+            result = self.export_to_app(app_paths)
+            self.send_body(200 if result['success'] else 500, json.dumps(result))
+        elif urlparse(self.path).path == '/api/import':
+            self.import_roster()
+        elif self.path == '/api/calculate/system':
+            self.calculate_system()
+        elif self.path == '/api/valuation/session':
+            self.start_valuation_session()
+        elif self.path == '/api/sweep':
+            self.run_sweep()
+        elif self.path == '/api/simulate':
+            self.simulate()
+        elif self.path == '/api/mortality':
+            self.value_with_mortality_table()
+        elif BASELINE_PATH.match(self.path):
+            self.save_baseline(BASELINE_PATH.match(self.path).group(1))
+        elif self.path == '/api/apppath':
+            data = self.parse_json_body(self.read_small_body())
+            if not isinstance(data, dict):
+                raise RequestBodyError("Request must be a JSON object")
+            try:
+                app_paths = split_app_paths(data.get('appPaths', data.get('appPath', '')))
+            except ValueError as e:
+                raise RequestBodyError(str(e))
+            
+            # Save to a config file
+            try:
+                config_path = save_app_paths(self.json_file_path, app_paths)
+                print(f"Saved {len(app_paths)} app path(s) to: {config_path}")  # Debug output
+                self.send_body(200, b'{"success": true}')
+            except Exception as e:
+                print(f"Error saving app path: {e}")  # Debug output
+                self.send_body(500, json.dumps({"success": False, "error": str(e)}), cors=False)
+        else:
+            self.send_not_found()
+    
+    def not_modified(self, entry):
+        """Check If-None-Match / If-Modified-Since against a cached roster or page"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = {t.strip().removeprefix('W/') for t in if_none_match.split(',')}
+            return '*' in tags or any(variant_etag(entry.etag, encoding) in tags
+                                      for encoding in ('identity',) + CONTENT_ENCODINGS)
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since and hasattr(entry, 'mtime'):
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(entry.mtime) <= since
+        return False
+    
+    def send_employees(self):
+        """GET /api/employees, served from ROSTER_CACHE with conditional GET support"""
+        try:
+            # Edits not yet compacted into the file are served from memory
+            entry = self.store().pending_entry() or ROSTER_CACHE.get(self.json_file_path)
+        except json.JSONDecodeError as e:
+            self.send_body(200, json.dumps({"error": f"Invalid JSON: {str(e)}"}))
+            return
+        except Exception as e:
+            self.send_body(200, json.dumps({"error": str(e)}))
+            return
+        
+        if entry is None:
+            # Return empty array if file doesn't exist
+            self.send_body(200, b'[]')
+            return
+        
+        encoding, body = entry.encoded(self.content_encoding())
+        not_modified = self.not_modified(entry)
+        if not_modified:
+            # 304 carries the validators but no body
+            self.send_response(304)
+        else:
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            json_data = self.load_json()
-            self.wfile.write(json_data.encode())
-        elif self.path == '/api/apppath':
-            # GET saved app path
-            config_path = os.path.join(os.path.dirname(self.json_file_path), '.json_editor_config')
-            app_path = ''
-            if os.path.exists(config_path):
-                try:
-                    with open(config_path, 'r') as f:
-                        app_path = f.read().strip()
-                except:
-                    pass
+            self.send_header('Content-Length', str(len(body)))
+            if encoding != 'identity':
+                self.send_header('Content-Encoding', encoding)
+        self.send_header('ETag', variant_etag(entry.etag, encoding))
+        self.send_header('Last-Modified', entry.last_modified)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        if not not_modified and self.command != 'HEAD':
+            self.wfile.write(body)
+    
+    def send_page(self):
+        """GET /: the editor page, precompressed, revalidated by ETag on every load"""
+        page = self.editor_page()
+        encoding, body = page.body.encoded(self.content_encoding())
+        not_modified = self.not_modified(page)
+        self.send_response(304 if not_modified else 200)
+        if not not_modified:
+            self.send_header('Content-type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            if encoding != 'identity':
+                self.send_header('Content-Encoding', encoding)
+        self.send_header('ETag', variant_etag(page.etag, encoding))
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        if not not_modified and self.command != 'HEAD':
+            self.wfile.write(body)
+    
+    def send_employee_page(self, params):
+        """GET /api/employees?limit=&sort=&q=&hiredYearMin=&after=&offset=: one page of the roster.
+        
+        Without any of those parameters the whole roster is sent as before.
+        """
+        if not set(params) & {'limit', 'sort', 'q', 'hiredYearMin', 'after', 'offset'}:
+            self.send_employees()
+            return
+        try:
+            body = self.store().query(roster_db.EmployeeQuery.from_params(params))
+        except ValueError as e:
+            self.send_body(400, json.dumps({"success": False, "error": str(e)}))
+            return
+        except Exception as e:
+            print(f"Error querying employees: {e}")
+            self.send_body(500, json.dumps({"success": False, "error": str(e)}))
+            return
+        self.send_body(200, body)
+    
+    def calculate_system(self):
+        """POST /api/calculate/system: run the system-wide valuation on the server.
+        
+        Body: {"config": {...PensionConfiguration...}, "employees": [...],
+        "currentYear": 2025, "includeEmployees": true, "exact": false}.
+        Without "employees" the roster being edited is valued. Cohorts are
+        scaled from pension_calc.COHORT_CACHE unless "exact" asks for the
+        app's year-by-year arithmetic. Results are kept in RESULTS; the
+        response's "resultHash" fetches this one again from
+        GET /api/results/{hash}, and "cached" says whether it came from there.
+        """
+        request, config, employees, current_year = self.parse_valuation_request()
+        start = time.perf_counter()
+        exact = request.get('exact') is True
+        include_employees = request.get('includeEmployees', True) is not False
+        key = None
+        if RESULTS.enabled:
+            if current_year is None:
+                current_year = time.localtime().tm_year
+            if self.roster_version is None:
+                roster = roster_digest(employees)
+            else:
+                roster = self.store().roster_digest(employees, self.roster_version)
+            key = RESULTS.key(config, roster, current_year, exact)
+            body = RESULTS.get(key, include_employees)
+            if body is not None:
+                self.send_body(200, json_with_fields(body, resultHash=key, cached=True,
+                                                     elapsedMs=round((time.perf_counter() - start) * 1000, 3)))
+                return
+        cohort_cache = None if exact else pension_calc.COHORT_CACHE
+        result = pension_calc.calculate_system_costs(config, employees, current_year, cohort_cache)
+        data = result.to_dict(include_employees=include_employees)
+        if key is None:
+            data['elapsedMs'] = round((time.perf_counter() - start) * 1000, 3)
+            self.send_body(200, json.dumps(data))
+            return
+        body = RESULTS.put(key, data, {"config": config.to_dict(), "currentYear": current_year, "exact": exact,
+                                       "employees": len(employees)})
+        self.send_body(200, json_with_fields(body, resultHash=key, cached=False,
+                                             elapsedMs=round((time.perf_counter() - start) * 1000, 3)))
+    
+    def send_result(self, key, **fields):
+        """GET /api/results/{hash} or /api/baselines/{name}: a cached result (?employees=false: summary only)"""
+        query = parse_qs(urlparse(self.path).query)
+        include_employees = query.get('employees', ['true'])[0].lower() not in ('0', 'false', 'no')
+        # Valued without employee results: the summary is all there is
+        body = RESULTS.read(key, include_employees) or (include_employees and RESULTS.read(key, False))
+        if not body:
+            self.send_body(404, json.dumps({"success": False, "error": f"No cached result {key}"}))
+            return
+        self.send_body(200, json_with_fields(body, resultHash=key, **fields))
+    
+    def send_baseline(self):
+        name = BASELINE_PATH.match(urlparse(self.path).path).group(1)
+        baseline = RESULTS.baseline(name)
+        if baseline is None:
+            self.send_body(404, json.dumps({"success": False, "error": f"No baseline named {name}"}))
+            return
+        self.send_result(baseline['hash'], baseline=name)
+    
+    def save_baseline(self, name):
+        """POST /api/baselines/{name} {"hash": ...}: name a cached result"""
+        request = self.parse_json_body(self.read_small_body())
+        key = request.get('hash') if isinstance(request, dict) else None
+        if not isinstance(key, str) or not re.fullmatch('[0-9a-f]{64}', key):
+            raise RequestBodyError("hash must be a result hash from POST /api/calculate/system")
+        if not RESULTS.set_baseline(name, key):
+            self.send_body(404, json.dumps({"success": False, "error": f"No cached result {key}"}))
+            return
+        self.send_body(200, json.dumps({"success": True, "baseline": dict(RESULTS.baseline(name), name=name)}))
+    
+    def start_valuation_session(self):
+        """POST /api/valuation/session: value the roster and keep the valuation current as it is edited.
+        
+        Body: the /api/calculate/system body without "employees" (a session
+        always values the roster being edited). From then on every add,
+        update or delete re-values only that employee, and
+        GET /api/valuation/session returns the totals without re-valuing
+        the roster. Posting other settings rebuilds the session from scratch.
+        """
+        request = self.parse_json_body(self.read_small_body())
+        if not isinstance(request, dict):
+            raise RequestBodyError("Request must be a JSON object")
+        if 'employees' in request:
+            raise RequestBodyError("A valuation session values the roster being edited; omit \"employees\"")
+        try:
+            config = pension_calc.PensionConfig.from_dict(request.get('config', {}))
+            current_year = requested_current_year(request)
+        except ValueError as e:
+            raise RequestBodyError(str(e))
+        if current_year is None:
+            current_year = time.localtime().tm_year
+        session = VALUATIONS.start(self.store(), config, current_year, request.get('exact') is True)
+        self.send_valuation_session(session, request.get('includeEmployees', True) is not False)
+    
+    def send_valuation_session(self, session, include_employees):
+        """The session's current result, shaped like a POST /api/calculate/system response plus "session" """
+        start = time.perf_counter()
+        try:
+            result, vested, info = session.snapshot(include_employees)
+        except ValueError as e:
+            self.send_body(400, json.dumps({"success": False, "error": f"The roster cannot be valued: {e}"}))
+            return
+        # Serialized outside the store's lock; the result shares nothing the session changes
+        data = result.to_dict(include_employees=include_employees)
+        data['vestedEmployeeCount'] = vested
+        data['session'] = info
+        data['elapsedMs'] = round((time.perf_counter() - start) * 1000, 3)
+        self.send_body(200, json.dumps(data))
+    
+    def send_valuation_session_state(self, verify=False):
+        """GET /api/valuation/session (?employees=false: totals only) or .../verify"""
+        session = VALUATIONS.get(self.store())
+        if session is None:
+            self.send_body(404, b'{"success": false, "error": "No valuation session; POST /api/valuation/session"}')
+            return
+        if not verify:
+            query = parse_qs(urlparse(self.path).query)
+            include_employees = query.get('employees', ['true'])[0].lower() not in ('0', 'false', 'no')
+            self.send_valuation_session(session, include_employees)
+            return
+        try:
+            self.send_body(200, json.dumps(session.verify()))
+        except ValueError as e:
+            self.send_body(400, json.dumps({"success": False, "error": f"The roster cannot be valued: {e}"}))
+    
+    def parse_valuation_request(self):
+        """Body of a calculation request: (request dict, PensionConfig, employees, current year)"""
+        request = self.parse_json_body(b''.join(self.iter_body(self.max_body_size)))
+        if not isinstance(request, dict):
+            raise RequestBodyError("Request must be a JSON object")
+        # Which version of the store's roster is valued (None: employees from the request)
+        self.roster_version = None
+        try:
+            config = pension_calc.PensionConfig.from_dict(request.get('config', {}))
+            records = request.get('employees')
+            employees = None
+            if records is None:
+                employees = self.store().columnar_roster()
+                if employees is not None:
+                    self.roster_version = ('columns', tuple(employees.source_key))
+                else:
+                    records, self.roster_version = self.store().versioned_roster()
+            if employees is None:
+                employees = pension_calc.parse_employees(records)
+            current_year = requested_current_year(request)
+        except ValueError as e:
+            raise RequestBodyError(str(e))
+        return request, config, employees, current_year
+    
+    def run_sweep(self):
+        """POST /api/sweep: value every combination of the given parameter ranges.
+        
+        Body: the /api/calculate/system body plus "parameters", e.g.
+        {"multiplier": {"start": 2.0, "stop": 3.0, "step": 0.25},
+         "colaPercent": [0, 3, 6]}, and an optional "chunkSize". Scenarios
+        are fanned out in chunks over SWEEPS' process pool and streamed back
+        as NDJSON lines in completion order, so each line carries its
+        scenario index. The first line names the sweep id for
+        DELETE /api/sweep/{id}; closing the connection also cancels.
+        """
+        request, config, employees, current_year = self.parse_valuation_request()
+        if current_year is None:
+            current_year = time.localtime().tm_year
+        try:
+            scenarios = pension_calc.expand_sweep(config, request.get('parameters'), MAX_SWEEP_SCENARIOS)
+        except ValueError as e:
+            raise RequestBodyError(str(e))
+        chunk_size = request.get('chunkSize')
+        if chunk_size is None:
+            # A few chunks per worker keeps every core busy to the end without per-scenario overhead
+            chunk_size = max(1, min(MAX_SWEEP_CHUNK, -(-len(scenarios) // (SWEEPS.workers * 4))))
+        elif not isinstance(chunk_size, int) or isinstance(chunk_size, bool) or chunk_size < 1:
+            raise RequestBodyError("chunkSize must be a positive integer")
+        
+        sweep_id = os.urandom(8).hex()
+        rows = pension_calc.roster_rows(employees)
+        pool = SWEEPS.executor()
+        cancelled = SWEEPS.start(sweep_id)
+        pending = set()
+        start = time.perf_counter()
+        try:
+            for offset in range(0, len(scenarios), chunk_size):
+                chunk = [(index, scenarios[index][1])
+                         for index in range(offset, min(offset + chunk_size, len(scenarios)))]
+                pending.add(pool.submit(pension_calc.run_scenarios, sweep_id, rows, current_year, chunk))
             
             self.send_response(200)
-            self.send_header('Content-type', 'application/json')
+            self.send_header('Content-type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.send_header('Cache-Control', 'no-cache')
             self.send_header('Access-Control-Allow-Origin', '*')
             self.end_headers()
-            self.wfile.write(json.dumps({"appPath": app_path}).encode())
-        else:
-            self.send_response(404)
-            self.end_headers()
+            self.write_chunk({"sweep": sweep_id, "scenarios": len(scenarios), "chunks": len(pending),
+                              "parameters": list(request['parameters'])})
+            completed = 0
+            error = None
+            while pending and not cancelled.is_set() and error is None:
+                done, pending = wait(pending, timeout=0.25, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        error = str(e)
+                        break
+                    for index, summary in results:
+                        self.write_chunk({"scenario": index, "parameters": scenarios[index][0], "result": summary})
+                        completed += 1
+            trailer = {"done": True, "completed": completed, "cancelled": cancelled.is_set(),
+                       "elapsedMs": round((time.perf_counter() - start) * 1000, 3)}
+            if error is not None:
+                trailer["error"] = error
+            self.write_chunk(trailer)
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away: treat as a cancel
+            self.close_connection = True
+        finally:
+            for future in pending:
+                future.cancel()
+            SWEEPS.finish(sweep_id)
     
-    def do_POST(self):
-        if self.path == '/api/employees':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            json_string = post_data.decode('utf-8')
-            
-            if self.save_json(json_string):
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(b'{"success": true}')
+    def simulate(self):
+        """POST /api/simulate: Monte Carlo funding risk of the system-wide valuation.
+        
+        Body: the /api/calculate/system body plus optional "paths" (default
+        10000), "seed", "returnVolatility" and "inflationVolatility" (annual
+        %, around the config's expected rates), "correlation" and
+        "chunkPaths". Chunks of paths run on SWEEPS' process pool, each with
+        its own SeedSequence child, so a seed gives the same answer for any
+        number of workers.
+        """
+        if pension_calc.np is None:
+            self.send_body(501, b'{"success": false, "error": "POST /api/simulate requires NumPy"}')
+            return
+        request, config, employees, current_year = self.parse_valuation_request()
+        np = pension_calc.np
+        
+        def number(name, default, low, high, kind=float):
+            value = request.get(name, default)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+                raise RequestBodyError(f"{name} must be a number between {low} and {high}")
+            if kind is int and value != int(value):
+                raise RequestBodyError(f"{name} must be an integer")
+            return kind(value)
+        
+        paths = number('paths', 10000, 1, MAX_SIMULATION_PATHS, int)
+        chunk_paths = number('chunkPaths', pension_calc.DEFAULT_SIMULATION_CHUNK, 1, MAX_SIMULATION_PATHS, int)
+        return_volatility = number('returnVolatility', pension_calc.DEFAULT_RETURN_VOLATILITY, 0, 100)
+        inflation_volatility = number('inflationVolatility', pension_calc.DEFAULT_INFLATION_VOLATILITY, 0, 100)
+        correlation = number('correlation', pension_calc.DEFAULT_RETURN_INFLATION_CORRELATION, -1, 1)
+        seed = request.get('seed')
+        if seed is None:
+            seed = int.from_bytes(os.urandom(8), 'big')
+        elif isinstance(seed, bool) or not isinstance(seed, int) or seed < 0:
+            raise RequestBodyError("seed must be a non-negative integer")
+        
+        start = time.perf_counter()
+        result = pension_calc.calculate_system_costs(config, employees, current_year, pension_calc.COHORT_CACHE)
+        table = pension_calc.funding_cohorts(config, result)
+        data = {
+            "paths": paths,
+            "seed": seed,
+            "assumptions": {
+                "expectedReturn": config.expectedSystemFutureRateReturn,
+                "returnVolatility": return_volatility,
+                "expectedInflation": config.expectedFutureInflationRate,
+                "inflationVolatility": inflation_volatility,
+                "correlation": correlation,
+            },
+            "deterministic": {
+                "surplus": pension_calc.finite_or_none(result.surplus),
+                "isSufficient": result.isSufficient,
+            },
+            "vestedEmployeeCount": len(result.vestedEmployees),
+        }
+        if table:
+            sizes = [min(chunk_paths, paths - offset) for offset in range(0, paths, chunk_paths)]
+            seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+            arguments = (config.expectedSystemFutureRateReturn, config.expectedFutureInflationRate,
+                         return_volatility, inflation_volatility, correlation)
+            if len(sizes) == 1:
+                # Not worth a round trip to the process pool
+                chunks = [pension_calc.simulate_paths(table, sizes[0], seeds[0], *arguments)]
             else:
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(b'{"success": false, "error": "Failed to save"}')
-        elif self.path == '/api/export':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            app_path = data.get('appPath', '').strip()
-            
-            result = self.export_to_app(app_path)
-            self.send_response(200 if result['success'] else 500)
-            self.send_header('Content-type', 'application/json')
+                pool = SWEEPS.executor()
+                futures = [pool.submit(pension_calc.simulate_paths, table, size, chunk_seed, *arguments)
+                           for size, chunk_seed in zip(sizes, seeds)]
+                chunks = [future.result() for future in futures]
+            assets = np.concatenate([chunk[0] for chunk in chunks])
+            liabilities = np.concatenate([chunk[1] for chunk in chunks])
+            data.update(pension_calc.summarize_simulation(assets, liabilities))
+        data["elapsedMs"] = round((time.perf_counter() - start) * 1000, 3)
+        self.send_body(200, json.dumps(data))
+    
+    def value_with_mortality_table(self):
+        """POST /api/mortality: Options 1-4 for the fictional hire under a qx table.
+        
+        Body: {"table": "age,male,female\\n...", "config": {...}, "rate": 7.25}
+        ("rate" defaults to expectedSystemFutureRateReturn). The table is only
+        taken as text: the server listens on every interface, so it never
+        opens a path a client names. Commutation columns come
+        from mortality.COLUMNS_CACHE, so every lookup after the first build
+        is O(1).
+        """
+        request = self.parse_json_body(b''.join(self.iter_body(self.max_body_size)))
+        if not isinstance(request, dict):
+            raise RequestBodyError("Request must be a JSON object")
+        try:
+            config = pension_calc.PensionConfig.from_dict(request.get('config', {}))
+            if not isinstance(request.get('table'), str):
+                raise ValueError("table (the CSV text of a qx table) is required")
+            table = mortality.MortalityTable.from_csv(request['table'])
+            rate = request.get('rate', config.expectedSystemFutureRateReturn)
+            if isinstance(rate, bool) or not isinstance(rate, (int, float)) or not -50 < rate <= 100:
+                raise ValueError("rate must be a percentage between -50 and 100")
+        except ValueError as e:
+            raise RequestBodyError(str(e))
+        
+        start = time.perf_counter()
+        columns, cache = mortality.COLUMNS_CACHE.lookup(table, rate)
+        
+        hire_age = config.fictionalHiredYear - config.fictionalBirthYear
+        retirement_age = hire_age + config.fictionalYearsOfWork
+        sex = config.fictionalEmployeeSex
+        spouse_sex = config.fictionalSpouseSex if config.fictionalSpouseBirthYear > 0 else None
+        spouse_age = retirement_age + config.fictionalSpouseAgeDiff if spouse_sex else None
+        option1 = pension_calc.calculate_disbursements(
+            config.baseWage, config.facWage, config.multiplier, config.multiplierBasedOnFAC, config.isColaCompounding,
+            config.colaNumber, config.colaSpacing, config.colaPercent, config.expectedFutureInflationRate,
+            retirement_age, config.fictionalYearsOfWork, sex, None, config.lifeExpectancyMale,
+            config.lifeExpectancyFemale, config.deltaExtraLife, 0, hire_age,
+            pension_calc.OPTION_1).initialAnnualPension
+        try:
+            factors = columns.option_factors(sex, retirement_age, spouse_sex, spouse_age)
+            pensions = columns.option_pensions(option1, sex, retirement_age, spouse_sex, spouse_age)
+            life_expectancy = {"employee": columns.life_expectancy(sex, retirement_age)}
+            if spouse_sex:
+                life_expectancy["spouse"] = columns.life_expectancy(spouse_sex, spouse_age)
+        except ValueError as e:
+            raise RequestBodyError(str(e))
+        self.send_body(200, json.dumps({
+            "table": table.digest,
+            "rate": float(rate),
+            "cache": cache,
+            "retirementAge": retirement_age,
+            "spouseAgeAtRetirement": spouse_age,
+            "lifeExpectancyAtRetirement": life_expectancy,
+            "annuityFactors": {f"option{option}": value for option, value in factors.items()},
+            "initialAnnualPension": {f"option{option}": value for option, value in pensions.items()},
+            "elapsedMs": round((time.perf_counter() - start) * 1000, 3),
+        }))
+    
+    def write_chunk(self, data):
+        """Write one NDJSON line as an HTTP/1.1 chunk"""
+        self.write_bytes_chunk(json.dumps(data).encode() + b'\n')
+    
+    def write_bytes_chunk(self, data):
+        if data:  # an empty chunk would end the response
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+    
+    def stream_events(self):
+        """GET /api/events: roster changes as Server-Sent Events (see ChangeFeed).
+        
+        The stream opens with a "hello" event naming the current version;
+        each change follows as a "change" event whose id is its version.
+        ?since=<version>, or the Last-Event-ID header EventSource sends when
+        it reconnects, first replays the events after that version, or a
+        reset if they are no longer kept.
+        """
+        try:
+            version = requested_event_version(self.path, self.headers)
+        except ValueError as e:
+            self.send_body(400, json.dumps({"success": False, "error": str(e)}))
+            return
+        cls = JSONEditorHandler
+        with cls.event_streams_lock:
+            if cls.event_streams >= self.max_event_streams:
+                self.send_body(503, json.dumps({"success": False, "error": "Too many event streams"}))
+                return
+            cls.event_streams += 1
+        feed = self.store().feed
+        # The stream only ends when the client goes away
+        self.close_connection = True
+        try:
+            self.send_response(200)
+            self.send_header('Content-type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Transfer-Encoding', 'chunked')
             self.send_header('Access-Control-Allow-Origin', '*')
             self.end_headers()
-            self.wfile.write(json.dumps(result).encode())
-        elif self.path == '/api/apppath':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            app_path = data.get('appPath', '').strip()
-            
-            # Save to a config file
-            config_path = os.path.join(os.path.dirname(self.json_file_path), '.json_editor_config')
-            try:
-                # Ensure directory exists
-                config_dir = os.path.dirname(config_path)
-                if config_dir and not os.path.exists(config_dir):
-                    os.makedirs(config_dir, exist_ok=True)
-                
-                with open(config_path, 'w') as f:
-                    f.write(app_path)
-                
-                print(f"Saved app path to: {config_path}")  # Debug output
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(b'{"success": true}')
-            except Exception as e:
-                print(f"Error saving app path: {e}")  # Debug output
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"success": False, "error": str(e)}).encode())
+            payload, current = feed.hello()
+            self.write_bytes_chunk(payload.encode())
+            if version is None:
+                version = current
+            while True:
+                payload, version = feed.next_payload(version, EVENT_PING_INTERVAL)
+                self.write_bytes_chunk(payload.encode())
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with cls.event_streams_lock:
+                cls.event_streams -= 1
+    
+    def import_roster(self):
+        """POST /api/import: replace the roster with an uploaded CSV or JSONL file.
+        
+        The format comes from ?format=csv|jsonl or the Content-Type. The body
+        is converted batch by batch (RosterImporter) into a temp file that
+        replaces employees.json like a full POST /api/employees. If any row
+        is invalid nothing is imported and every error is listed, unless
+        ?skipInvalid=1 asks to import the valid rows anyway.
+        """
+        query = parse_qs(urlparse(self.path).query)
+        format = query.get('format', [None])[0]
+        if format is None:
+            content_type = self.headers.get('Content-Type', '').split(';', 1)[0].strip().lower()
+            format = IMPORT_FORMATS.get(content_type, 'csv')
+        if format not in ('csv', 'jsonl'):
+            raise RequestBodyError("format must be csv or jsonl")
+        skip_invalid = query.get('skipInvalid', ['0'])[0].lower() in ('1', 'true', 'yes')
+        
+        start = time.perf_counter()
+        importer = RosterImporter(format)
+        temp_path = self.new_temp_path()
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write('[\n')
+                separator = ''
+                try:
+                    for text in importer.batches(text_stream(self.iter_body(self.max_body_size))):
+                        f.write(separator)
+                        f.write(text)
+                        separator = ',\n'
+                except UnicodeDecodeError as e:
+                    raise RequestBodyError(f"Request body is not valid UTF-8: {e.reason}")
+                except csv.Error as e:
+                    raise RequestBodyError(f"Invalid CSV: {e}")
+                f.write('\n]\n')
+                f.flush()
+                sync_file(f.fileno())
+            result = importer.summary()
+            result["elapsedMs"] = round((time.perf_counter() - start) * 1000, 3)
+            if importer.error_count and not skip_invalid:
+                result.update(success=False, imported=0,
+                              error=f"{importer.error_count} invalid rows; nothing was imported")
+                self.send_body(400, json.dumps(result))
+                return
+            self.replace_json_file(temp_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        result["success"] = True
+        self.send_body(200, json.dumps(result))
+    
+    def export_roster(self, format):
+        """GET /api/export.csv and /api/export.jsonl: stream the roster in chunked batches"""
+        self.send_response(200)
+        self.send_header('Content-type', 'text/csv; charset=utf-8' if format == 'csv' else 'application/x-ndjson')
+        self.send_header('Content-Disposition', f'attachment; filename="employees.{format}"')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        try:
+            for text in export_batches(self.store().records(), format):
+                self.write_bytes_chunk(text.encode())
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        except (OSError, ValueError, RequestBodyError) as e:
+            # Headers are already out; cutting the stream short tells the client it is incomplete
+            print(f"Error exporting roster: {e}")
+            self.close_connection = True
+    
+    def parse_json_body(self, body):
+        start = time.perf_counter()
+        try:
+            return json.loads(body.decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise RequestBodyError(f"Invalid JSON: {e}")
+        finally:
+            METRICS.observe('json_parse', time.perf_counter() - start)
+    
+    def send_employee_result(self, status, employee=None):
+        result = {"success": True, "version": self.store().version}
+        if employee is not None:
+            result["employee"] = employee
+        self.send_body(status, json.dumps(result))
+    
+    def handle_employee_request(self, action, *args):
+        """Run a single-employee store action for /api/employees/{id}"""
+        employee_id = int(EMPLOYEE_PATH.match(self.path).group(1))
+        try:
+            employee = action(employee_id, *args)
+        except RequestBodyError as e:
+            self.send_body(e.status, json.dumps({"success": False, "error": str(e)}))
+            return
+        except Exception as e:
+            print(f"Error updating employee {employee_id}: {e}")
+            self.send_body(500, json.dumps({"success": False, "error": str(e)}))
+            return
+        if self.command == 'GET':
+            self.send_body(200, json.dumps(employee))
         else:
-            self.send_response(404)
-            self.end_headers()
+            self.send_employee_result(200, employee)
+    
+    def do_PATCH(self):
+        if not EMPLOYEE_PATH.match(self.path):
+            self.send_not_found()
+            return
+        try:
+            fields = self.parse_json_body(self.read_small_body())
+        except RequestBodyError as e:
+            self.send_body_error(e)
+            return
+        self.handle_employee_request(self.store().update, fields)
+    
+    def do_DELETE(self):
+        if self.path == '/api/valuation/session':
+            if VALUATIONS.stop(self.store()):
+                self.send_body(200, b'{"success": true}')
+            else:
+                self.send_body(404, b'{"success": false, "error": "No valuation session"}')
+            return
+        baseline = BASELINE_PATH.match(self.path)
+        if baseline:
+            if RESULTS.delete_baseline(baseline.group(1)):
+                self.send_body(200, b'{"success": true}')
+            else:
+                self.send_body(404, b'{"success": false, "error": "No baseline with that name"}')
+            return
+        sweep = SWEEP_PATH.match(self.path)
+        if sweep:
+            if SWEEPS.cancel(sweep.group(1)):
+                self.send_body(200, b'{"success": true}')
+            else:
+                self.send_body(404, b'{"success": false, "error": "No running sweep with that id"}')
+            return
+        if not EMPLOYEE_PATH.match(self.path):
+            self.send_not_found()
+            return
+        self.handle_employee_request(self.store().delete)
+    
+    def do_OPTIONS(self):
+        # CORS preflight for PATCH/DELETE from other origins
+        self.send_response(204)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PATCH, DELETE, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, If-None-Match')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
     
     def load_json(self):
         try:
@@ -133,56 +3569,90 @@ class JSONEditorHandler(http.server.SimpleHTTPRequestHandler):
     def save_json(self, json_string):
         try:
             # Validate JSON
+            start = time.perf_counter()
             json.loads(json_string)
+            METRICS.observe('json_parse', time.perf_counter() - start)
             
-            # Create backup
-            backup_path = self.json_file_path + '.backup'
-            if os.path.exists(self.json_file_path):
-                try:
-                    import shutil
-                    shutil.copy2(self.json_file_path, backup_path)
-                except:
-                    pass
-            
-            # Save JSON
-            os.makedirs(os.path.dirname(self.json_file_path) if os.path.dirname(self.json_file_path) else '.', exist_ok=True)
-            with open(self.json_file_path, 'w', encoding='utf-8') as f:
-                f.write(json_string)
+            temp_path = self.new_temp_path()
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    start = time.perf_counter()
+                    f.write(json_string)
+                    f.flush()
+                    METRICS.observe('file_write', time.perf_counter() - start)
+                    sync_file(f.fileno())
+                self.replace_json_file(temp_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
             
             return True
         except Exception as e:
             print(f"Error saving JSON: {e}")
             return False
     
-    def export_to_app(self, app_path):
-        """Export the JSON file to the iOS app's Documents directory"""
+    def save_json_stream(self, chunks):
+        """Validate an uploaded roster chunk by chunk while spooling it to a temp file.
+        
+        Memory use is bounded by the chunk size. Raises RequestBodyError for
+        malformed or oversized bodies; returns False if the file could not be written.
+        """
+        validator = StreamingRosterValidator()
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        temp_path = self.new_temp_path()
         try:
-            if not app_path:
-                return {"success": False, "error": "App path not specified"}
-            
-            # Expand user path
-            app_path = os.path.expanduser(app_path)
-            
-            # Ensure it's a directory path, add employees.json if needed
-            if os.path.isdir(app_path):
-                target_path = os.path.join(app_path, 'employees.json')
-            else:
-                target_path = app_path
-            
-            # Read source file
-            if not os.path.exists(self.json_file_path):
-                return {"success": False, "error": "Source file does not exist"}
-            
-            # Copy file
-            import shutil
-            os.makedirs(os.path.dirname(target_path) if os.path.dirname(target_path) else '.', exist_ok=True)
-            shutil.copy2(self.json_file_path, target_path)
-            
-            return {"success": True, "message": f"Exported to {target_path}"}
+            parse_time = write_time = 0.0
+            with open(temp_path, 'wb') as f:
+                try:
+                    for chunk in chunks:
+                        start = time.perf_counter()
+                        validator.feed(decoder.decode(chunk))
+                        written = time.perf_counter()
+                        f.write(chunk)
+                        parse_time += written - start
+                        write_time += time.perf_counter() - written
+                    validator.feed(decoder.decode(b'', final=True))
+                except UnicodeDecodeError as e:
+                    raise RequestBodyError(f"Request body is not valid UTF-8: {e.reason}")
+                validator.close()
+                start = time.perf_counter()
+                f.flush()
+                METRICS.observe('json_parse', parse_time)
+                METRICS.observe('file_write', write_time + time.perf_counter() - start)
+                sync_file(f.fileno())
+            self.replace_json_file(temp_path)
+            return True
+        except RequestBodyError:
+            raise
+        except Exception as e:
+            print(f"Error saving JSON: {e}")
+            return False
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def new_temp_path(self):
+        return new_temp_path(self.json_file_path)
+    
+    def replace_json_file(self, temp_path):
+        """Install a whole new roster; any journaled single-employee edits are superseded"""
+        store = self.store()
+        with store.lock:
+            install_roster_file(self.json_file_path, temp_path)
+            store.discard_journal()
+    
+    def store(self):
+        return EmployeeStore.for_path(self.json_file_path)
+    
+    def export_to_app(self, app_paths):
+        """Export the JSON file to the iOS apps' Documents directories (a path, one per line, or a list)"""
+        try:
+            return EXPORTS.export(self.json_file_path, app_paths)
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def get_html_page(self):
+    @classmethod
+    def get_html_page(cls):
         html_template = """<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -393,6 +3863,27 @@ class JSONEditorHandler(http.server.SimpleHTTPRequestHandler):
             padding: 40px;
             color: #666;
         }
+        .filters {
+            display: flex;
+            gap: 10px;
+            align-items: center;
+            flex-wrap: wrap;
+        }
+        .filters input,
+        .filters select {
+            padding: 8px;
+            border: 1px solid #ddd;
+            border-radius: 4px;
+            font-size: 14px;
+        }
+        .pager {
+            display: flex;
+            gap: 10px;
+            align-items: center;
+            justify-content: flex-end;
+            margin-top: 15px;
+            color: #666;
+        }
     </style>
 </head>
 <body>
@@ -409,12 +3900,32 @@ class JSONEditorHandler(http.server.SimpleHTTPRequestHandler):
         
         <div class="file-info" style="margin-top: 10px;">
             <strong>Export Settings:</strong><br>
-            <input type="text" id="appPath" placeholder="iOS App Documents Path (e.g., ~/Library/Developer/CoreSimulator/...)" style="width: 70%; padding: 8px; margin-top: 5px;">
-            <button class="btn-secondary" onclick="saveAppPath()" style="margin-left: 10px;">Save Path</button>
+            <textarea id="appPath" rows="2" placeholder="iOS App Documents Paths, one per line (e.g., ~/Library/Developer/CoreSimulator/...)" style="width: 70%; padding: 8px; margin-top: 5px; vertical-align: top; font-family: inherit;"></textarea>
+            <button class="btn-secondary" onclick="saveAppPath()" style="margin-left: 10px;">Save Paths</button>
+            <span id="autoExport" style="margin-left: 10px; color: #666;"></span>
+        </div>
+        
+        <div class="filters">
+            <input type="search" id="searchName" placeholder="Search names" oninput="searchChanged()">
+            <select id="sortBy" onchange="refreshList()">
+                <option value="id">Sort by ID</option>
+                <option value="name">Sort by name</option>
+                <option value="-hiredYear">Newest hires first</option>
+                <option value="hiredYear">Oldest hires first</option>
+                <option value="dateOfBirth">Oldest first</option>
+                <option value="-dateOfBirth">Youngest first</option>
+            </select>
+            <input type="number" id="hiredYearMin" placeholder="Hired in or after" onchange="refreshList()">
         </div>
         
         <div id="employeeTable"></div>
         
+        <div class="pager">
+            <span id="pageInfo"></span>
+            <button class="btn-secondary btn-small" id="prevPage" onclick="previousPage()" disabled>&larr; Previous</button>
+            <button class="btn-secondary btn-small" id="nextPage" onclick="nextPage()" disabled>Next &rarr;</button>
+        </div>
+        
         <div id="status" class="status"></div>
         
         <!-- Edit Modal -->
@@ -466,23 +3977,125 @@ class JSONEditorHandler(http.server.SimpleHTTPRequestHandler):
     </div>
     
     <script>
-        let employees = [];
+        const PAGE_SIZE = 100;
+        let employees = [];  // the page being shown
+        let cursors = [null];  // "after" cursor of each page visited; the last is the current page
+        let nextCursor = null;
+        let total = 0;
+        let searchTimer = null;
+        
+        function pageQuery() {
+            const params = new URLSearchParams({limit: PAGE_SIZE, sort: document.getElementById('sortBy').value});
+            const q = document.getElementById('searchName').value.trim();
+            const hiredYearMin = document.getElementById('hiredYearMin').value;
+            if (q) params.set('q', q);
+            if (hiredYearMin) params.set('hiredYearMin', hiredYearMin);
+            const after = cursors[cursors.length - 1];
+            if (after) params.set('after', after);
+            return params;
+        }
+        
+        async function loadPage() {
+            const response = await fetch('/api/employees?' + pageQuery());
+            const page = await response.json();
+            if (!response.ok) throw new Error(page.error || 'Failed to load employees');
+            employees = page.employees;
+            nextCursor = page.next;
+            total = page.total;
+            if (employees.length === 0 && cursors.length > 1) {
+                // The last rows of this page were deleted
+                cursors.pop();
+                return loadPage();
+            }
+            renderTable();
+        }
         
         async function refreshList() {
             try {
                 showStatus('Loading employees...', 'info');
-                const response = await fetch('/api/employees');
-                if (!response.ok) throw new Error('Failed to load employees');
-                employees = await response.json();
-                renderTable();
+                cursors = [null];
+                await loadPage();
                 showStatus('Employees loaded successfully!', 'success');
             } catch (error) {
                 showStatus('Error loading employees: ' + error.message, 'error');
             }
         }
         
+        async function reloadPage() {
+            try {
+                await loadPage();
+            } catch (error) {
+                showStatus('Error loading employees: ' + error.message, 'error');
+            }
+        }
+        
+        function nextPage() {
+            if (!nextCursor) return;
+            cursors.push(nextCursor);
+            reloadPage();
+        }
+        
+        function previousPage() {
+            if (cursors.length < 2) return;
+            cursors.pop();
+            reloadPage();
+        }
+        
+        function searchChanged() {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(refreshList, 250);
+        }
+        
+        // Changes by anyone (this tab included) arrive on /api/events and are patched into the page
+        let feedConnected = false;
+        
+        function watchChanges() {
+            if (!window.EventSource) return;
+            const feed = new EventSource('/api/events');
+            feed.addEventListener('hello', () => { feedConnected = true; });
+            feed.addEventListener('change', event => applyChange(JSON.parse(event.data)));
+            // EventSource reconnects by itself and resumes from the last event id
+            feed.onerror = () => { feedConnected = false; };
+        }
+        
+        function applyChange(change) {
+            if (change.reset) {
+                reloadPage();
+                return;
+            }
+            const filtered = document.getElementById('searchName').value.trim() !== '' ||
+                document.getElementById('hiredYearMin').value !== '';
+            (change.updated || []).forEach(updated => {
+                const index = employees.findIndex(e => e.id === updated.id);
+                if (index >= 0) employees[index] = updated;
+            });
+            (change.deleted || []).forEach(id => {
+                const index = employees.findIndex(e => e.id === id);
+                if (index >= 0) {
+                    employees.splice(index, 1);
+                    total -= 1;
+                }
+            });
+            (change.added || []).forEach(added => {
+                // Whether a new row matches a filter is the server's call; the next reload shows it
+                if (filtered || employees.some(e => e.id === added.id)) return;
+                total += 1;
+                if (!nextCursor) employees.push(added);
+            });
+            renderTable();
+        }
+        
+        function renderPager() {
+            const first = (cursors.length - 1) * PAGE_SIZE;
+            document.getElementById('pageInfo').textContent = total === 0 ? '' :
+                `${first + 1}–${first + employees.length} of ${total}`;
+            document.getElementById('prevPage').disabled = cursors.length < 2;
+            document.getElementById('nextPage').disabled = !nextCursor;
+        }
+        
         function renderTable() {
             const tableDiv = document.getElementById('employeeTable');
+            renderPager();
             
             if (employees.length === 0) {
                 tableDiv.innerHTML = '<div class="empty-state"><p>No employees found. Click "Add Employee" to get started.</p></div>';
@@ -582,38 +4195,39 @@ class JSONEditorHandler(http.server.SimpleHTTPRequestHandler):
                 employee.spouseSex = spouseSex;
             }
             
-            if (id) {
-                // Update existing
-                employee.id = parseInt(id);
-                const index = employees.findIndex(e => e.id === employee.id);
-                if (index >= 0) {
-                    employees[index] = employee;
-                }
-            } else {
-                // Add new
-                const maxId = employees.length > 0 ? Math.max(...employees.map(e => e.id || 0)) : 0;
-                employee.id = maxId + 1;
-                employees.push(employee);
-            }
-            
-            // Save to server
+            // Save to server: only the edited employee is sent
             try {
                 showStatus('Saving...', 'info');
-                const response = await fetch('/api/employees', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify(employees)
-                });
+                let response;
+                if (id) {
+                    response = await fetch('/api/employees/' + parseInt(id), {
+                        method: 'PATCH',
+                        headers: {
+                            'Content-Type': 'application/json'
+                        },
+                        body: JSON.stringify(employee)
+                    });
+                } else {
+                    response = await fetch('/api/employees', {
+                        method: 'POST',
+                        headers: {
+                            'Content-Type': 'application/json'
+                        },
+                        body: JSON.stringify(employee)
+                    });
+                }
                 
-                if (!response.ok) {
-                    throw new Error('Failed to save');
+                const result = await response.json();
+                if (!response.ok || !result.success) {
+                    throw new Error(result.error || 'Failed to save');
                 }
                 
                 showStatus('Employee saved successfully!', 'success');
                 closeModal();
-                renderTable();
+                if (!feedConnected) {
+                    // No change feed to patch the table: the edit may also move the row to another page
+                    await reloadPage();
+                }
             } catch (error) {
                 showStatus('Error saving employee: ' + error.message, 'error');
             }
@@ -624,24 +4238,21 @@ class JSONEditorHandler(http.server.SimpleHTTPRequestHandler):
                 return;
             }
             
-            employees = employees.filter(e => e.id !== id);
-            
             try {
                 showStatus('Deleting...', 'info');
-                const response = await fetch('/api/employees', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify(employees)
+                const response = await fetch('/api/employees/' + id, {
+                    method: 'DELETE'
                 });
                 
-                if (!response.ok) {
-                    throw new Error('Failed to delete');
+                const result = await response.json();
+                if (!response.ok || !result.success) {
+                    throw new Error(result.error || 'Failed to delete');
                 }
                 
                 showStatus('Employee deleted successfully!', 'success');
-                renderTable();
+                if (!feedConnected) {
+                    await reloadPage();
+                }
             } catch (error) {
                 showStatus('Error deleting employee: ' + error.message, 'error');
             }
@@ -684,9 +4295,10 @@ class JSONEditorHandler(http.server.SimpleHTTPRequestHandler):
                 });
                 
                 const result = await response.json();
+                const timing = result.seconds !== undefined ? ' (' + (result.seconds * 1000).toFixed(0) + ' ms)' : '';
                 
                 if (result.success) {
-                    showStatus(result.message || 'Exported successfully!', 'success');
+                    showStatus((result.message || 'Exported successfully!') + timing, 'success');
                 } else {
                     showStatus('Export failed: ' + result.error, 'error');
                 }
@@ -738,6 +4350,9 @@ class JSONEditorHandler(http.server.SimpleHTTPRequestHandler):
                 if (result.appPath) {
                     document.getElementById('appPath').value = result.appPath;
                 }
+                if (result.autoExport) {
+                    document.getElementById('autoExport').textContent = 'Changes are exported automatically';
+                }
             } catch (error) {
                 console.error('Error loading app path:', error);
             }
@@ -747,38 +4362,632 @@ class JSONEditorHandler(http.server.SimpleHTTPRequestHandler):
         window.addEventListener('load', () => {
             refreshList();
             loadAppPath();
+            watchChanges();
         });
     </script>
 </body>
 </html>"""
-        return html_template.replace('{FILE_PATH}', self.json_file_path)
+        return html_template.replace('{FILE_PATH}', cls.json_file_path)
+
+class ThreadedJSONEditorServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """One thread per connection; the listen backlog is configurable"""
+    daemon_threads = True
+    allow_reuse_address = True
+    
+    def __init__(self, server_address, handler_class, backlog=DEFAULT_BACKLOG):
+        # request_queue_size is read by server_activate() inside __init__
+        self.request_queue_size = backlog
+        super().__init__(server_address, handler_class)
+
+
+class PooledJSONEditorServer(http.server.HTTPServer):
+    """Connections are handed to a bounded pool of worker threads.
+    
+    Once every worker is busy, new connections wait in the pool queue and
+    then in the listen backlog instead of spawning more threads.
+    """
+    allow_reuse_address = True
+    
+    def __init__(self, server_address, handler_class, workers=DEFAULT_WORKERS, backlog=DEFAULT_BACKLOG):
+        self.request_queue_size = backlog
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='json-editor-worker')
+        super().__init__(server_address, handler_class)
+    
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_worker, request, client_address)
+    
+    def process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+    
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+class AsyncRequest:
+    """A request parsed on the event loop, with file-like ends for the handler thread.
+    
+    rfile.read()/readline() and wfile.write() run on a worker thread and
+    hand the actual socket IO to the loop: reads wait for the loop to
+    return the bytes, writes are queued and only wait once WRITE_DRAIN_SIZE
+    bytes are outstanding, so a streamed response cannot outrun the client.
+    """
+    
+    def __init__(self, loop, reader, writer, command, path, version, requestline, headers, close):
+        self.loop = loop
+        self.reader = reader
+        self.writer = writer
+        self.command = command
+        self.path = path
+        self.request_version = version
+        self.requestline = requestline
+        self.headers = headers
+        self.close_connection = close
+        self.body_read = 0
+        self.written = 0
+        self.unflushed = 0
+        self.head = b''  # status line and headers, sent with the first body write
+        self.rfile = self
+        self.wfile = self
+    
+    def call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+    
+    def read(self, size=-1):
+        data = self.call(self.reader.read(size))
+        self.body_read += len(data)
+        return data
+    
+    def readline(self, limit=-1):
+        data = self.call(self.reader.readline())
+        self.body_read += len(data)
+        return data
+    
+    def write(self, data):
+        self.written += len(data)
+        data = self.head + data
+        self.head = b''
+        self.loop.call_soon_threadsafe(self.writer.write, data)
+        self.unflushed += len(data)
+        if self.unflushed >= WRITE_DRAIN_SIZE:
+            self.unflushed = 0
+            self.call(self.writer.drain())
+        return len(data)
+    
+    def flush(self):
+        pass
+
+
+class AsyncJSONEditorHandler(JSONEditorHandler):
+    """JSONEditorHandler for one AsyncRequest, run on a worker thread"""
+    
+    def setup(self):
+        request = self.request
+        self.rfile = request.rfile
+        self.wfile = request.wfile
+        self.command = request.command
+        self.path = request.path
+        self.request_version = request.request_version
+        self.requestline = request.requestline
+        self.headers = request.headers
+        self.close_connection = request.close_connection
+    
+    def handle(self):
+        self.begin_request()
+        try:
+            method = getattr(self, 'do_' + self.command, None)
+            if method is None:
+                self.send_error(501, f"Unsupported method ({self.command!r})")
+            else:
+                method()
+        finally:
+            self.end_request()
+    
+    def flush_headers(self):
+        # Held back so that headers and body go to the loop (and the socket) together
+        if hasattr(self, '_headers_buffer'):
+            head = b''.join(self._headers_buffer)
+            self.request.head += head
+            self.request.written += len(head)
+            self._headers_buffer = []
+    
+    def finish(self):
+        self.request.close_connection = self.close_connection
+
+
+class AsyncJSONEditorServer:
+    """HTTP/1.1 on one asyncio event loop; request handlers run on a thread pool.
+    
+    An idle keep-alive connection, or an open GET /api/events stream, costs
+    a few KB on the loop instead of a thread. The loop reads and parses each
+    request head, then runs the usual JSONEditorHandler method on one of
+    `workers` threads, which is where file IO, JSON validation and
+    valuations happen. Event streams are served on the loop itself.
+    """
+    
+    def __init__(self, server_address, handler_class, workers=DEFAULT_WORKERS, backlog=DEFAULT_BACKLOG):
+        self.server_address = server_address
+        self.handler_class = handler_class
+        self.backlog = backlog
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='json-editor-worker')
+        self.feed_waiters = {}  # ChangeFeed -> future resolved by its next publish
+        self.loop = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.server_close()
+    
+    def serve_forever(self):
+        asyncio.run(self.serve())
+    
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        host, port = self.server_address
+        server = await asyncio.start_server(self.serve_connection, host or None, port,
+                                            backlog=self.backlog, limit=MAX_REQUEST_HEAD)
+        async with server:
+            await server.serve_forever()
+    
+    def server_close(self):
+        self.pool.shutdown(wait=False)
+    
+    async def serve_connection(self, reader, writer):
+        try:
+            while await self.serve_request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    
+    async def serve_request(self, reader, writer):
+        """Read and answer one request; whether the connection stays open"""
+        # Closing the transport ends the read with IncompleteReadError (cheaper than wait_for's task)
+        idle_timer = self.loop.call_later(self.handler_class.timeout, writer.transport.abort)
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError:
+            return False
+        except asyncio.LimitOverrunError:
+            await self.send_simple(writer, 431, "Request header fields too large")
+            return False
+        finally:
+            idle_timer.cancel()
+        requestline, _, header_lines = head.partition(b'\r\n')
+        requestline = requestline.decode('iso-8859-1')
+        parts = requestline.split()
+        try:
+            if len(parts) != 3 or not parts[2].startswith('HTTP/1.'):
+                raise ValueError(f"Bad request line {requestline!r}")
+            command, path, version = parts
+            headers = http.client.parse_headers(io.BytesIO(header_lines))
+        except (ValueError, http.client.HTTPException) as e:
+            await self.send_simple(writer, 400, str(e))
+            return False
+        
+        connection = headers.get('Connection', '').lower()
+        close = connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive')
+        if command == 'GET' and urlparse(path).path == '/api/events':
+            return await self.stream_events(reader, writer, path, headers) and not close
+        if headers.get('Expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        
+        request = AsyncRequest(self.loop, reader, writer, command, path, version, requestline, headers, close)
+        try:
+            await self.loop.run_in_executor(self.pool, self.handle_request, request, writer.get_extra_info('peername'))
+        except Exception:
+            print(f"Exception occurred during processing of request {requestline!r}", file=sys.stderr)
+            traceback.print_exc()
+            return False
+        if request.head:  # a response without a body
+            writer.write(request.head)
+        await writer.drain()
+        if request.close_connection or 'chunked' in headers.get('Transfer-Encoding', '').lower():
+            return False
+        # A handler that answered without reading the body (e.g. a 404) leaves it in the stream
+        try:
+            unread = int(headers.get('Content-Length', 0)) - request.body_read
+        except ValueError:
+            return False
+        if unread > MAX_SMALL_BODY_SIZE:
+            return False
+        if unread > 0:
+            await reader.readexactly(unread)
+        return True
+    
+    def handle_request(self, request, client_address):
+        self.handler_class(request, client_address or ('', 0), self)
+    
+    async def send_simple(self, writer, status, error, close=True):
+        """A JSON error response written straight from the loop; returns its size"""
+        body = json.dumps({"success": False, "error": error}).encode()
+        head = [f'HTTP/1.1 {status} {http.HTTPStatus(status).phrase}', 'Content-type: application/json',
+                f'Content-Length: {len(body)}', 'Access-Control-Allow-Origin: *']
+        if close:
+            head.append('Connection: close')
+        response = '\r\n'.join(head).encode('latin-1') + b'\r\n\r\n' + body
+        writer.write(response)
+        await writer.drain()
+        return len(response)
+    
+    def feed_waiter(self, feed):
+        """A future resolved the next time feed publishes a change"""
+        waiter = self.feed_waiters.get(feed)
+        if waiter is None:
+            if feed not in self.feed_waiters:
+                feed.listeners.append(lambda: self.loop.call_soon_threadsafe(self.wake_feed, feed))
+            waiter = self.feed_waiters[feed] = self.loop.create_future()
+        return waiter
+    
+    def wake_feed(self, feed):
+        waiter = self.feed_waiters.get(feed)
+        if waiter is not None:
+            self.feed_waiters[feed] = None
+            waiter.set_result(None)
+    
+    async def stream_events(self, reader, writer, path, headers):
+        """GET /api/events on the loop (see JSONEditorHandler.stream_events); whether the connection stays open"""
+        started = time.perf_counter()
+        METRICS.request_started()
+        status, written = 200, 0
+        try:
+            try:
+                version = requested_event_version(path, headers)
+            except ValueError as e:
+                status = 400
+                written = await self.send_simple(writer, status, str(e), close=False)
+                return True
+            cls = JSONEditorHandler
+            with cls.event_streams_lock:
+                if cls.event_streams >= cls.max_event_streams:
+                    status = 503
+                    written = await self.send_simple(writer, status, "Too many event streams", close=False)
+                    return True
+                cls.event_streams += 1
+            feed = EmployeeStore.for_path(self.handler_class.json_file_path).feed
+            
+            def send(text, chunked=True):
+                nonlocal written
+                data = text.encode()
+                if chunked:
+                    data = b'%x\r\n%s\r\n' % (len(data), data)
+                written += len(data)
+                writer.write(data)
+            
+            # The client sends nothing more, so a finished read means it has gone
+            disconnected = self.loop.create_task(reader.read(1))
+            try:
+                send(f'HTTP/1.1 200 OK\r\nDate: {formatdate(usegmt=True)}\r\n'
+                     'Content-type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                     'Transfer-Encoding: chunked\r\nAccess-Control-Allow-Origin: *\r\n\r\n', chunked=False)
+                payload, current = feed.hello()
+                send(payload)
+                if version is None:
+                    version = current
+                while True:
+                    waiter = self.feed_waiter(feed)
+                    if feed.version == version:
+                        await asyncio.wait((waiter, disconnected), timeout=EVENT_PING_INTERVAL,
+                                           return_when=asyncio.FIRST_COMPLETED)
+                    if disconnected.done():
+                        break
+                    payload, version = feed.next_payload(version)
+                    send(payload)
+                    await writer.drain()
+            finally:
+                disconnected.cancel()
+                with cls.event_streams_lock:
+                    cls.event_streams -= 1
+            return False
+        finally:
+            METRICS.request_finished('GET', METRICS.ROUTES['/api/events'], status, written,
+                                     time.perf_counter() - started)
+
+
+def raise_open_file_limit():
+    """Raise the soft open-file limit to the hard one, for many concurrent connections"""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else max(soft, 65536), hard))
+        except (ValueError, OSError):
+            pass
+
+
+def make_server(port, mode=DEFAULT_SERVER_MODE, workers=DEFAULT_WORKERS, backlog=DEFAULT_BACKLOG, host=""):
+    """Build the HTTP server for the requested serving mode.
+    
+    Modes:
+      single   - the original one-request-at-a-time TCPServer
+      threaded - a new thread per connection
+      pool     - a bounded pool of `workers` threads
+      asyncio  - connections on an event loop, requests on a pool of `workers` threads
+    """
+    if mode == 'single':
+        socketserver.TCPServer.allow_reuse_address = True
+        return socketserver.TCPServer((host, port), JSONEditorHandler)
+    if mode == 'pool':
+        return PooledJSONEditorServer((host, port), JSONEditorHandler, workers=workers, backlog=backlog)
+    if mode == 'threaded':
+        return ThreadedJSONEditorServer((host, port), JSONEditorHandler, backlog=backlog)
+    if mode == 'asyncio':
+        raise_open_file_limit()
+        return AsyncJSONEditorServer((host, port), AsyncJSONEditorHandler, workers=workers, backlog=backlog)
+    raise ValueError(f"Unknown server mode: {mode}")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Simple HTTP server for editing employees.json")
+    parser.add_argument('json_path', nargs='?', default=DEFAULT_JSON_PATH,
+                        help="Path to employees.json (default: %(default)s)")
+    parser.add_argument('port', nargs='?', type=int, default=DEFAULT_PORT,
+                        help="Port to listen on (default: %(default)s)")
+    parser.add_argument('--mode', choices=['single', 'threaded', 'pool', 'asyncio'], default=DEFAULT_SERVER_MODE,
+                        help="Serving mode (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="Worker threads for --mode pool and --mode asyncio (default: %(default)s)")
+    parser.add_argument('--backlog', type=int, default=DEFAULT_BACKLOG,
+                        help="Listen backlog (default: %(default)s)")
+    parser.add_argument('--keepalive-timeout', type=float, default=DEFAULT_KEEPALIVE_TIMEOUT,
+                        help="Seconds to keep an idle connection open (default: %(default)s)")
+    parser.add_argument('--max-body-size', type=int, default=DEFAULT_MAX_BODY_SIZE,
+                        help="Largest accepted POST /api/employees body in bytes (default: %(default)s)")
+    parser.add_argument('--backups', type=int, default=DEFAULT_BACKUP_GENERATIONS,
+                        help="Backup generations to keep, 0 to disable (default: %(default)s)")
+    parser.add_argument('--backup-compress', action='store_true',
+                        help="gzip backup generations older than employees.json.backup")
+    parser.add_argument('--journal-compact-every', type=int, default=DEFAULT_JOURNAL_COMPACT_EVERY,
+                        help="Single-employee edits journaled before rewriting employees.json (default: %(default)s)")
+    parser.add_argument('--journal-compact-interval', type=float, default=DEFAULT_JOURNAL_COMPACT_INTERVAL,
+                        help="Seconds between background journal compactions (default: %(default)s)")
+    parser.add_argument('--watch-interval', type=float, default=DEFAULT_WATCH_INTERVAL,
+                        help="Seconds between checks for edits by other programs, 0 to disable (default: %(default)s)")
+    parser.add_argument('--max-event-streams', type=int,
+                        help=f"Concurrent GET /api/events streams (default: {DEFAULT_MAX_EVENT_STREAMS}, "
+                             f"{DEFAULT_ASYNC_MAX_EVENT_STREAMS} with --mode asyncio)")
+    parser.add_argument('--sweep-workers', type=int, default=DEFAULT_SWEEP_WORKERS,
+                        help="Processes used by POST /api/sweep (default: CPU count, %(default)s)")
+    parser.add_argument('--cohort-cache-size', type=int, default=pension_calc.DEFAULT_COHORT_CACHE_SIZE,
+                        help="Cohort factor entries kept between valuations (default: %(default)s)")
+    parser.add_argument('--mortality-cache-dir', default=mortality.DEFAULT_COLUMNS_CACHE_DIR,
+                        help="Directory for cached commutation columns (default: %(default)s)")
+    parser.add_argument('--results-cache-dir', default=DEFAULT_RESULTS_CACHE_DIR,
+                        help="Directory for cached valuation results (default: %(default)s)")
+    parser.add_argument('--results-cache-size', type=float, default=DEFAULT_RESULTS_CACHE_SIZE,
+                        help="Size cap of the result cache in MB, 0 to disable (default: %(default)s)")
+    parser.add_argument('--sqlite', action='store_true',
+                        help="Answer paged GET /api/employees queries from an indexed employees.json.sqlite")
+    parser.add_argument('--columnar', action='store_true',
+                        help="Serve valuations and lookups from a memory-mapped employees.json.columns")
+    parser.add_argument('--auto-export', action='store_true',
+                        help="Export every change to the saved app paths (POST /api/apppath)")
+    parser.add_argument('--auto-export-delay', type=float, default=DEFAULT_AUTO_EXPORT_DELAY,
+                        help="Seconds without changes before --auto-export runs (default: %(default)s)")
+    parser.add_argument('--export-hardlink', action='store_true',
+                        help="Export by hard-linking employees.json into app paths on the same filesystem")
+    parser.add_argument('--profile-dir',
+                        help="Enable request profiling (X-Profile header or ?profile=) and keep profiles here")
+    parser.add_argument('--profile-rate', type=float, default=0.0,
+                        help="Fraction of all requests to profile, with --profile-dir (default: %(default)s)")
+    parser.add_argument('--profile-keep', type=int, default=DEFAULT_PROFILE_KEEP,
+                        help="Profiles kept in --profile-dir (default: %(default)s)")
+    return parser.parse_args(argv)
+
+def batch_parser(command, description):
+    """Argument parser with the options calc and warm share"""
+    parser = argparse.ArgumentParser(prog=f'json_editor_server.py {command}', description=description)
+    parser.add_argument('--configs', nargs='+', required=True,
+                        help="Config JSON files, or directories of them (valued in name order)")
+    parser.add_argument('--roster', required=True, help="employees.json to value")
+    parser.add_argument('--current-year', type=int,
+                        help="Valuation year (default: this year)")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="Worker processes (default: %(default)s)")
+    parser.add_argument('--max-memory', type=float,
+                        help="Address space limit per process in MB; a config that needs more is reported "
+                             "as an error")
+    parser.add_argument('--exact', action='store_true',
+                        help="Use the app's year-by-year arithmetic instead of cached cohort factors")
+    parser.add_argument('--cohort-cache-size', type=int, default=pension_calc.DEFAULT_COHORT_CACHE_SIZE,
+                        help="Cohort factor entries kept per process (default: %(default)s)")
+    return parser
+
+
+def parse_calc_args(argv):
+    parser = batch_parser('calc', "Value PensionConfiguration files against a roster, one JSON line per config")
+    parser.add_argument('--output', help="Write the JSON lines here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def parse_warm_args(argv):
+    parser = batch_parser('warm', "Value PensionConfiguration files into the server's result cache, "
+                                  "so POST /api/calculate/system answers them from the cache")
+    parser.add_argument('--results-cache-dir', default=DEFAULT_RESULTS_CACHE_DIR,
+                        help="Result cache directory, as given to the server (default: %(default)s)")
+    parser.add_argument('--results-cache-size', type=float, default=DEFAULT_RESULTS_CACHE_SIZE,
+                        help="Result cache size cap in MB, as given to the server (default: %(default)s)")
+    parser.add_argument('--summaries', action='store_true',
+                        help="Keep results without employee results, for requests with \"includeEmployees\": false")
+    return parser.parse_args(argv)
+
+
+def read_batch_roster(path):
+    """Employees of a calc/warm --roster; prints the error and returns None if it can't be read"""
+    try:
+        with open(os.path.expanduser(path), 'r', encoding='utf-8') as f:
+            return pension_calc.parse_employees(json.load(f))
+    except (OSError, ValueError) as e:
+        print(f"Error reading roster {path}: {e}", file=sys.stderr)
+        return None
+
+
+def calc_main(argv):
+    """json_editor_server.py calc: batch valuations without the server, streamed as JSONL"""
+    args = parse_calc_args(argv)
+    employees = read_batch_roster(args.roster)
+    if employees is None:
+        return 2
+    max_memory = int(args.max_memory * 1024 * 1024) if args.max_memory else None
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    start = time.perf_counter()
+    count = errors = 0
+    try:
+        for record in run_batch_valuation(batch_config_paths(args.configs), employees, args.current_year,
+                                          max(1, args.jobs), args.exact, max_memory,
+                                          max(1, args.cohort_cache_size)):
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            count += 1
+            errors += 'error' in record
+    except BrokenProcessPool:
+        print(f"A worker process died after {count} configs", file=sys.stderr)
+        return 2
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Valued {count} configs against {len(employees)} employees in {time.perf_counter() - start:.2f}s"
+          f" ({errors} errors)", file=sys.stderr)
+    return 1 if errors else 0
+
+
+def warm_main(argv):
+    """json_editor_server.py warm: value configs into the result cache, skipping ones already there.
+    
+    Prints one JSON line per config with its result hash and whether it was
+    "cached" already or "stored" now.
+    """
+    args = parse_warm_args(argv)
+    RESULTS.configure(os.path.expanduser(args.results_cache_dir), int(args.results_cache_size * 1024 * 1024))
+    if not RESULTS.enabled:
+        print("The result cache is disabled (--results-cache-size 0)", file=sys.stderr)
+        return 2
+    employees = read_batch_roster(args.roster)
+    if employees is None:
+        return 2
+    current_year = args.current_year if args.current_year is not None else time.localtime().tm_year
+    roster = roster_digest(employees)
+    start = time.perf_counter()
+    keys = {}  # config path -> (key, config) of the configs to value
+    cached = stored = errors = 0
+    for path in batch_config_paths(args.configs):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config = pension_calc.PensionConfig.from_dict(json.load(f))
+        except (OSError, ValueError) as e:
+            print(json.dumps({"config": path, "error": str(e)}), flush=True)
+            errors += 1
+            continue
+        key = RESULTS.key(config, roster, current_year, args.exact)
+        if RESULTS.read(key, not args.summaries) is not None:
+            print(json.dumps({"config": path, "hash": key, "status": "cached"}), flush=True)
+            cached += 1
+        else:
+            keys[path] = (key, config)
+    max_memory = int(args.max_memory * 1024 * 1024) if args.max_memory else None
+    try:
+        for record in run_batch_valuation(list(keys), employees, current_year, max(1, args.jobs), args.exact,
+                                          max_memory, max(1, args.cohort_cache_size),
+                                          include_employees=not args.summaries):
+            if 'error' in record:
+                print(json.dumps(record), flush=True)
+                errors += 1
+                continue
+            key, config = keys[record['config']]
+            RESULTS.put(key, record['result'], {"config": config.to_dict(), "currentYear": current_year,
+                                                "exact": args.exact, "employees": len(employees)})
+            print(json.dumps({"config": record['config'], "hash": key, "status": "stored",
+                              "elapsedMs": record['elapsedMs']}), flush=True)
+            stored += 1
+    except BrokenProcessPool:
+        print(f"A worker process died after {stored} configs", file=sys.stderr)
+        return 2
+    stats = RESULTS.stats()
+    print(f"Stored {stored} results, {cached} already cached, {errors} errors in {time.perf_counter() - start:.2f}s;"
+          f" cache holds {stats['entries']} results ({stats['bytes'] / 1e6:.1f} MB)", file=sys.stderr)
+    return 1 if errors else 0
+
 
 def main():
+    if sys.argv[1:2] == ['calc']:
+        sys.exit(calc_main(sys.argv[2:]))
+    if sys.argv[1:2] == ['warm']:
+        sys.exit(warm_main(sys.argv[2:]))
     # Parse command line arguments
-    json_path = DEFAULT_JSON_PATH
-    port = DEFAULT_PORT
-    
-    if len(sys.argv) > 1:
-        json_path = os.path.expanduser(sys.argv[1])
-    if len(sys.argv) > 2:
-        port = int(sys.argv[2])
+    args = parse_args(sys.argv[1:])
+    json_path = os.path.expanduser(args.json_path)
+    port = args.port
     
     # Set the JSON file path for the handler
     JSONEditorHandler.json_file_path = json_path
+    JSONEditorHandler.timeout = args.keepalive_timeout
+    JSONEditorHandler.max_body_size = args.max_body_size
+    BACKUPS.configure(args.backups, args.backup_compress)
+    EmployeeStore.compact_every = max(1, args.journal_compact_every)
+    pension_calc.COHORT_CACHE.max_entries = max(1, args.cohort_cache_size)
+    SWEEPS.configure(args.sweep_workers)
+    mortality.COLUMNS_CACHE.configure(args.mortality_cache_dir)
+    RESULTS.configure(os.path.expanduser(args.results_cache_dir), int(args.results_cache_size * 1024 * 1024))
+    EmployeeStore.columnar = args.columnar
+    EmployeeStore.sqlite = args.sqlite
+    EXPORTS.configure(args.export_hardlink, args.auto_export, args.auto_export_delay)
+    if args.profile_dir:
+        PROFILER.configure(os.path.expanduser(args.profile_dir), args.profile_rate, args.profile_keep)
+    JSONEditorHandler.editor_page()
+    max_event_streams = args.max_event_streams
+    if max_event_streams is None:
+        max_event_streams = DEFAULT_ASYNC_MAX_EVENT_STREAMS if args.mode == 'asyncio' else DEFAULT_MAX_EVENT_STREAMS
+    if args.mode == 'single':
+        # One request at a time: an open event stream would block every other request
+        JSONEditorHandler.max_event_streams = 0
+    elif args.mode == 'pool':
+        JSONEditorHandler.max_event_streams = min(max_event_streams, args.workers // 2)
+    else:
+        JSONEditorHandler.max_event_streams = max_event_streams
+    
+    # Replay any edits left in the journal by a previous run
+    store = EmployeeStore.for_path(json_path)
+    try:
+        store.load()
+    except Exception as e:
+        print(f"Warning: could not load {json_path}: {e}")
+    if args.auto_export:
+        store.feed.listeners.append(lambda: EXPORTS.schedule(json_path))
+    threading.Thread(target=compact_journals_forever, args=(args.journal_compact_interval,),
+                     name='json-editor-compactor', daemon=True).start()
+    if args.watch_interval > 0:
+        threading.Thread(target=watch_files_forever, args=(args.watch_interval,),
+                         name='json-editor-watcher', daemon=True).start()
     
     print("Starting JSON Editor Server...")
     print(f"JSON File: {json_path}")
     print(f"Port: {port}")
+    if args.mode in ('pool', 'asyncio'):
+        print(f"Mode: {args.mode} ({args.workers} workers, backlog {args.backlog})")
+    else:
+        print(f"Mode: {args.mode}")
     print(f"Open http://localhost:{port} in your browser")
     print("Press Ctrl+C to stop")
     
     try:
-        with socketserver.TCPServer(("", port), JSONEditorHandler) as httpd:
+        with make_server(port, args.mode, args.workers, args.backlog) as httpd:
             httpd.serve_forever()
     except KeyboardInterrupt:
+        try:
+            store.compact()
+        except Exception as e:
+            print(f"Error compacting journal: {e}")
         print("\nServer stopped.")
+    finally:
+        SWEEPS.shutdown()
 
 if __name__ == "__main__":
     main()
-
-
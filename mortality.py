@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Table-based mortality for the Python pension engine.
+
+The app assumes every retiree dies at a fixed life expectancy. This module
+reads a qx mortality table (probability of dying within the year, by sex
+and age) and builds commutation columns for one interest rate:
+
+  lx   survivors of a 100,000 radix        Dx = v^x lx
+  Nx   sum of Dy for y >= x                 Mx = sum of v^(y+1) dy for y >= x
+
+plus the same D/N columns for every pair of sexes and age gap, so single
+life, joint life and last survivor annuities are O(1) lookups. Built
+columns are cached in memory and on disk, keyed by the table's hash and
+the rate.
+
+CSV layouts accepted (header row required):
+  age,male,female          one row per age (also M/F or qx_male/qx_female)
+  sex,age,qx               one row per sex and age
+
+Usage: python3 mortality.py table.csv [rate_percent]
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+
+RADIX = 100000.0
+MAX_AGE_GAP = 40  # joint-life columns are precomputed for spouse age gaps up to this
+DEFAULT_COLUMNS_CACHE_DIR = os.path.expanduser("~/.cache/pension_calc/commutation")
+COLUMNS_FORMAT = 1  # bump when the on-disk layout changes
+SEXES = ('M', 'F')
+SEX_COLUMNS = {
+    'M': ('male', 'm', 'qx_male', 'qxm'),
+    'F': ('female', 'f', 'qx_female', 'qxf'),
+}
+
+
+class MortalityTable:
+    """qx by sex for consecutive ages starting at min_age"""
+    __slots__ = ('min_age', 'qx', 'digest')
+
+    def __init__(self, min_age, qx):
+        self.min_age = min_age
+        self.qx = qx
+        canonical = json.dumps({'minAge': min_age, 'qx': qx}, sort_keys=True, separators=(',', ':'))
+        self.digest = hashlib.sha256(canonical.encode()).hexdigest()
+
+    @classmethod
+    def from_csv(cls, text):
+        rows = list(csv.reader(io.StringIO(text)))
+        if not rows:
+            raise ValueError("mortality table is empty")
+        header = [name.strip().lower() for name in rows[0]]
+        by_sex = {'M': {}, 'F': {}}
+        try:
+            if 'sex' in header and 'qx' in header:
+                sex_col, age_col, qx_col = header.index('sex'), header.index('age'), header.index('qx')
+                for row in rows[1:]:
+                    if not row:
+                        continue
+                    sex = row[sex_col].strip().upper()[:1]
+                    if sex not in by_sex:
+                        raise ValueError(f"unknown sex {row[sex_col]!r}")
+                    by_sex[sex][int(row[age_col])] = float(row[qx_col])
+            else:
+                age_col = header.index('age')
+                columns = {}
+                for sex, names in SEX_COLUMNS.items():
+                    for name in names:
+                        if name in header:
+                            columns[sex] = header.index(name)
+                            break
+                    else:
+                        raise ValueError(f"no qx column for sex {sex} (expected one of {', '.join(names)})")
+                for row in rows[1:]:
+                    if not row:
+                        continue
+                    age = int(row[age_col])
+                    for sex, col in columns.items():
+                        by_sex[sex][age] = float(row[col])
+        except (IndexError, ValueError) as e:
+            raise ValueError(f"invalid mortality table: {e}")
+
+        min_age = None
+        qx = {}
+        for sex in SEXES:
+            ages = sorted(by_sex[sex])
+            if not ages:
+                raise ValueError(f"mortality table has no rows for sex {sex}")
+            if ages != list(range(ages[0], ages[-1] + 1)):
+                raise ValueError(f"mortality table ages for sex {sex} are not consecutive")
+            if min_age is None:
+                min_age = ages[0]
+            elif ages[0] != min_age:
+                raise ValueError("mortality table must start at the same age for both sexes")
+            values = [by_sex[sex][age] for age in ages]
+            if any(not 0.0 <= q <= 1.0 for q in values):
+                raise ValueError(f"mortality table qx for sex {sex} must be between 0 and 1")
+            qx[sex] = values
+        return cls(min_age, qx)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_csv(f.read())
+
+
+class CommutationColumns:
+    """Commutation columns of one MortalityTable at one interest rate.
+
+    Columns are indexed by age - min_age and run one year past the oldest
+    age in the table, where everyone is dead (lx = 0).
+    """
+    __slots__ = ('digest', 'rate', 'min_age', 'size', 'l', 'D', 'N', 'M', 'L', 'joint_D', 'joint_N')
+
+    @classmethod
+    def build(cls, table, rate):
+        """rate is a percentage, like expectedSystemFutureRateReturn"""
+        self = cls.__new__(cls)
+        self.digest = table.digest
+        self.rate = rate
+        self.min_age = table.min_age
+        v = 1.0 / (1.0 + rate / 100.0)
+        self.l, self.D, self.N, self.M, self.L = {}, {}, {}, {}, {}
+        for sex in SEXES:
+            qx = table.qx[sex]
+            l = [RADIX]
+            for q in qx:
+                l.append(l[-1] * (1.0 - q))
+            l[-1] = 0.0  # nobody survives past the end of the table
+            D = [v ** (age + self.min_age) * lx for age, lx in enumerate(l)]
+            C = [v ** (age + self.min_age + 1) * (l[age] - l[age + 1]) for age in range(len(l) - 1)] + [0.0]
+            self.l[sex] = l
+            self.D[sex] = D
+            self.N[sex] = reverse_cumsum(D)
+            self.M[sex] = reverse_cumsum(C)
+            self.L[sex] = reverse_cumsum(l)
+        self.size = len(self.l['M'])
+
+        # Joint life of (sex1 at x, sex2 at x + gap): D = v^x lx l'(x+gap) / radix
+        self.joint_D, self.joint_N = {}, {}
+        for sex1 in SEXES:
+            for sex2 in SEXES:
+                for gap in range(-MAX_AGE_GAP, MAX_AGE_GAP + 1):
+                    D = [self.D[sex1][i] * self.survivors(sex2, i + gap) / RADIX for i in range(self.size)]
+                    self.joint_D[(sex1, sex2, gap)] = D
+                    self.joint_N[(sex1, sex2, gap)] = reverse_cumsum(D)
+        return self
+
+    def index(self, age):
+        i = age - self.min_age
+        if i < 0:
+            raise ValueError(f"age {age} is below the mortality table's first age {self.min_age}")
+        return i
+
+    def survivors(self, sex, i):
+        return self.l[sex][i] if 0 <= i < self.size else 0.0
+
+    def column(self, name, sex, i):
+        values = getattr(self, name)[sex]
+        return values[i] if i < self.size else 0.0
+
+    # MARK: - O(1) factors
+
+    def annuity(self, sex, age):
+        """a_x: $1 a year at the end of each year while alive"""
+        i = self.index(age)
+        D = self.column('D', sex, i)
+        return self.column('N', sex, i + 1) / D if D > 0 else 0.0
+
+    def life_expectancy(self, sex, age):
+        """Curtate expectation of life e_x (whole future years lived)"""
+        i = self.index(age)
+        l = self.column('l', sex, i)
+        return self.column('L', sex, i + 1) / l if l > 0 else 0.0
+
+    def insurance(self, sex, age):
+        """A_x: value of $1 at the end of the year of death"""
+        i = self.index(age)
+        D = self.column('D', sex, i)
+        return self.column('M', sex, i) / D if D > 0 else 0.0
+
+    def joint_annuity(self, sex, age, spouse_sex, spouse_age):
+        """a_xy: $1 a year while both are alive"""
+        i = self.index(age)
+        gap = spouse_age - age
+        if abs(gap) > MAX_AGE_GAP:
+            # Outside the precomputed gaps: walk the years instead
+            v = 1.0 / (1.0 + self.rate / 100.0)
+            l, l_spouse = self.survivors(sex, i), self.survivors(spouse_sex, i + gap)
+            if l <= 0 or l_spouse <= 0:
+                return 0.0
+            return sum(v ** t * self.survivors(sex, i + t) / l * self.survivors(spouse_sex, i + gap + t) / l_spouse
+                       for t in range(1, self.size - i + 1))
+        D = self.joint_D[(sex, spouse_sex, gap)]
+        N = self.joint_N[(sex, spouse_sex, gap)]
+        if i >= self.size or D[i] <= 0:
+            return 0.0
+        return (N[i + 1] if i + 1 < self.size else 0.0) / D[i]
+
+    def annuity_certain(self, years):
+        r = self.rate / 100.0
+        if r == 0:
+            return float(years)
+        return (1 - (1 + r) ** -years) / r
+
+    def option_factors(self, sex, age, spouse_sex=None, spouse_age=None):
+        """Present value at retirement of $1 a year of pension under Options 1-4.
+
+        Option 2 pays the survivor 10 years from the retiree's death; Options 3
+        and 4 pay a spouse 100% / 66.67% for life after the retiree's death.
+        Without a spouse, Options 3 and 4 are worth the same as Option 1.
+        """
+        single = self.annuity(sex, age)
+        factors = {
+            1: single,
+            2: single + self.insurance(sex, age) * self.annuity_certain(10),
+        }
+        if spouse_sex is None:
+            factors[3] = factors[4] = single
+        else:
+            # Survivor's annuity: paid while the spouse is alive and the retiree is not
+            reversionary = self.annuity(spouse_sex, spouse_age) - self.joint_annuity(sex, age, spouse_sex, spouse_age)
+            factors[3] = single + reversionary
+            factors[4] = single + (2.0 / 3.0) * reversionary
+        return factors
+
+    def option_pensions(self, option1_pension, sex, age, spouse_sex=None, spouse_age=None):
+        """Actuarially equivalent initial pension under each option"""
+        factors = self.option_factors(sex, age, spouse_sex, spouse_age)
+        return {option: option1_pension * factors[1] / factor if factor > 0 else 0.0
+                for option, factor in factors.items()}
+
+    # MARK: - Serialization
+
+    def to_dict(self):
+        return {
+            'format': COLUMNS_FORMAT,
+            'digest': self.digest,
+            'rate': self.rate,
+            'minAge': self.min_age,
+            'columns': {name: getattr(self, name) for name in ('l', 'D', 'N', 'M', 'L')},
+            'joint': [[sex1, sex2, gap, self.joint_D[(sex1, sex2, gap)], self.joint_N[(sex1, sex2, gap)]]
+                      for sex1, sex2, gap in self.joint_D],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('format') != COLUMNS_FORMAT:
+            raise ValueError("commutation cache file has an old format")
+        self = cls.__new__(cls)
+        self.digest = data['digest']
+        self.rate = data['rate']
+        self.min_age = data['minAge']
+        for name, values in data['columns'].items():
+            setattr(self, name, values)
+        self.size = len(self.l['M'])
+        self.joint_D, self.joint_N = {}, {}
+        for sex1, sex2, gap, D, N in data['joint']:
+            self.joint_D[(sex1, sex2, gap)] = D
+            self.joint_N[(sex1, sex2, gap)] = N
+        return self
+
+
+def reverse_cumsum(values):
+    total = 0.0
+    result = [0.0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        total += values[i]
+        result[i] = total
+    return result
+
+
+class ColumnsCache:
+    """CommutationColumns by (table digest, rate), in memory and as JSON files on disk"""
+
+    def __init__(self, directory=DEFAULT_COLUMNS_CACHE_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.builds = 0
+
+    def path(self, digest, rate):
+        return os.path.join(self.directory, f"{digest}-{rate!r}.json")
+
+    def configure(self, directory):
+        with self.lock:
+            self.directory = directory
+            self.entries.clear()
+
+    def get(self, table, rate):
+        return self.lookup(table, rate)[0]
+
+    def lookup(self, table, rate):
+        """(CommutationColumns, 'memory' | 'disk' | 'built')"""
+        rate = float(rate)
+        key = (table.digest, rate)
+        with self.lock:
+            columns = self.entries.get(key)
+            if columns is not None:
+                self.memory_hits += 1
+                return columns, 'memory'
+        columns = self.load(table.digest, rate)
+        if columns is not None:
+            source = 'disk'
+            self.disk_hits += 1
+        else:
+            source = 'built'
+            columns = CommutationColumns.build(table, rate)
+            self.builds += 1
+            self.store(columns)
+        with self.lock:
+            self.entries[key] = columns
+        return columns, source
+
+    def load(self, digest, rate):
+        try:
+            with open(self.path(digest, rate), 'r', encoding='utf-8') as f:
+                columns = CommutationColumns.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+        return columns if columns.digest == digest and columns.rate == rate else None
+
+    def store(self, columns):
+        """Write atomically; a cache that cannot be written is only a missed optimization"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(columns.to_dict(), f, separators=(',', ':'))
+            os.replace(temp_path, self.path(columns.digest, columns.rate))
+        except OSError as e:
+            print(f"Could not cache commutation columns: {e}")
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'memoryHits': self.memory_hits,
+                'diskHits': self.disk_hits,
+                'builds': self.builds,
+                'directory': self.directory,
+            }
+
+
+COLUMNS_CACHE = ColumnsCache()
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    table = MortalityTable.from_file(sys.argv[1])
+    rate = float(sys.argv[2]) if len(sys.argv) == 3 else 7.25
+    columns = COLUMNS_CACHE.get(table, rate)
+    print(f"table {table.digest[:16]}, ages {table.min_age}-{table.min_age + columns.size - 2}, rate {rate}%")
+    print(f"{'age':>5}{'e_x M':>8}{'e_x F':>8}{'a_x M':>9}{'a_x F':>9}")
+    for age in range(max(table.min_age, 50), min(table.min_age + columns.size - 1, 71), 5):
+        print(f"{age:>5}{columns.life_expectancy('M', age):>8.2f}{columns.life_expectancy('F', age):>8.2f}"
+              f"{columns.annuity('M', age):>9.3f}{columns.annuity('F', age):>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1596 @@
+#!/usr/bin/env python3
+"""
+Server-side port of the Swift pension calculation engine.
+
+Mirrors PensionMathFormulas, PensionMathCalculations,
+PensionCalculatorDisbursements, PensionCalculatorPaymentsInto and
+PensionCalculatorService so batch jobs can run valuations without the iOS
+app. Every formula performs the same floating point operations in the same
+order as the Swift code, so results match the app.
+
+Usage: python3 pension_calc.py config.json employees.json
+"""
+
+import datetime
+import itertools
+import json
+import operator
+import sys
+import threading
+from collections import OrderedDict
+from functools import reduce
+
+try:
+    import numpy as np
+except ImportError:  # the vectorized kernel is optional; the scalar port needs only the stdlib
+    np = None
+
+OPTION_1 = 1  # 100% retiree only, 0% survivor
+OPTION_2 = 2  # Ten year certain survivor (fixed 10 years)
+OPTION_3 = 3  # Joint and Survivor (100%)
+OPTION_4 = 4  # Joint and Survivor (66.67%)
+
+DEFAULT_COHORT_CACHE_SIZE = 4096  # cohort factor entries kept across valuations
+# Monte Carlo assumptions not in PensionConfiguration (annual, percentages)
+DEFAULT_RETURN_VOLATILITY = 12.0
+DEFAULT_INFLATION_VOLATILITY = 1.5
+DEFAULT_RETURN_INFLATION_CORRELATION = 0.2
+DEFAULT_SIMULATION_CHUNK = 10000  # paths generated per worker task
+
+
+# MARK: - Models
+
+class PensionConfig:
+    """PensionConfiguration.swift; missing keys take the Swift defaults"""
+    FIELDS = {
+        # Wage inputs
+        'baseWage': 85000.0,
+        'facWage': 98000.0,
+        # Multiplier settings
+        'multiplier': 2.5,
+        'multiplierBasedOnFAC': True,
+        # COLA settings
+        'isColaCompounding': False,
+        'colaNumber': 2,
+        'colaSpacing': 5,
+        'colaPercent': 6.0,
+        # Retirement eligibility
+        'retirementAge': 55,
+        'careerYearsService': 20,
+        'minAgeForYearsService': 50,
+        'yearsUntilVestment': 5,
+        # Economic assumptions
+        'expectedFutureInflationRate': 2.63,
+        'expectedSystemFutureRateReturn': 7.25,
+        'employeeContributionPercent': 5.0,
+        # Life expectancy
+        'lifeExpectancyMale': 73,
+        'lifeExpectancyFemale': 79,
+        'deltaExtraLife': 0,
+        # Fictional new hire (for individual calculations)
+        'fictionalNewHireAge': 25,
+        'fictionalSpouseAgeDiff': -2,
+        'spouseReductionPercent': 80.0,
+        'pensionOption': OPTION_3,
+        'fictionalHiredYear': 2025,
+        'fictionalBirthYear': 2000,
+        'fictionalEmployeeSex': 'M',
+        'fictionalSpouseBirthYear': 1998,
+        'fictionalSpouseSex': 'F',
+        'fictionalYearsOfWork': 25,
+        'earlyRetirementAuthorized': False,
+        # System-wide settings
+        'totalNumberEmployees': 61,
+        'eachEmployeeInsuranceAnnualCostToCity': 12000.0,
+        'cityAnnualWageAndBonusPayments': 4949000.0,
+        'cityAnnualInsurancePayments': 1033000.0,
+        # System-wide wage assumptions
+        'systemWideBaseWage': 85000.0,
+        'systemWideFacWage': 98000.0,
+        'systemWideAverageWage': 60000.0,
+        # FAC Calculator defaults
+        'facBaseWageYear1': 0.0,
+        'facOvertimeYear1': 5000.0,
+        'facRollInsYear1': 6000.0,
+        'facBaseWageYear2': 0.0,
+        'facOvertimeYear2': 0.0,
+        'facBaseWageYear3': 0.0,
+        'facOvertimeYear3': 0.0,
+    }
+    __slots__ = tuple(FIELDS)
+
+    def __init__(self, **values):
+        for name, default in self.FIELDS.items():
+            setattr(self, name, values.get(name, default))
+
+    @classmethod
+    def from_dict(cls, data):
+        """Decode a PensionConfiguration JSON object, checking each field's type"""
+        if not isinstance(data, dict):
+            raise ValueError("config must be a JSON object")
+        values = {}
+        for name, default in cls.FIELDS.items():
+            if name not in data:
+                continue
+            value = data[name]
+            if isinstance(default, bool):
+                if not isinstance(value, bool):
+                    raise ValueError(f"config '{name}' must be true or false")
+            elif isinstance(default, int):
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+                    raise ValueError(f"config '{name}' must be an integer")
+                value = int(value)
+            elif isinstance(default, float):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    raise ValueError(f"config '{name}' must be a number")
+                value = float(value)
+            elif value not in ('M', 'F'):
+                raise ValueError(f"config '{name}' must be 'M' or 'F'")
+            values[name] = value
+        config = cls(**values)
+        if config.pensionOption not in (OPTION_1, OPTION_2, OPTION_3, OPTION_4):
+            raise ValueError("config 'pensionOption' must be 1, 2, 3 or 4")
+        if config.colaNumber > 0 and config.colaSpacing <= 0:
+            raise ValueError("config 'colaSpacing' must be positive when colaNumber > 0")
+        return config
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+
+class Employee:
+    """Employee.swift"""
+    __slots__ = ('id', 'name', 'hiredYear', 'dateOfBirth', 'spouseDateOfBirth', 'sex', 'spouseSex')
+
+    def __init__(self, id, name, hiredYear, dateOfBirth, spouseDateOfBirth, sex='M', spouseSex=None):
+        self.id = id
+        self.name = name
+        self.hiredYear = hiredYear
+        self.dateOfBirth = dateOfBirth
+        self.spouseDateOfBirth = spouseDateOfBirth
+        self.sex = sex
+        # If spouseDateOfBirth is 0 (no spouse), spouseSex should be None
+        # Otherwise default to female if not specified
+        self.spouseSex = (spouseSex or 'F') if spouseDateOfBirth > 0 else None
+
+    @classmethod
+    def from_dict(cls, data):
+        """Decode like Employee.init(from:): missing sex -> M, missing spouseSex -> F when married"""
+        try:
+            employee_id = data['id']
+            name = data['name']
+            hired_year = data['hiredYear']
+            date_of_birth = data['dateOfBirth']
+            spouse_date_of_birth = data['spouseDateOfBirth']
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"employee is missing {e}")
+        for value in (employee_id, hired_year, date_of_birth, spouse_date_of_birth):
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise ValueError(f"employee {employee_id!r} has a non-integer id or year")
+        sex = data.get('sex')
+        spouse_sex = data.get('spouseSex')
+        return cls(employee_id, name, hired_year, date_of_birth, spouse_date_of_birth,
+                   sex if sex in ('M', 'F') else 'M',
+                   spouse_sex if spouse_sex in ('M', 'F') else None)
+
+    def current_age(self, current_year):
+        return current_year - self.dateOfBirth
+
+    def spouse_age_diff(self, current_year):
+        if self.spouseDateOfBirth <= 0:
+            return 6  # so that yearsReceivingSpousePension = 0 when no spouse
+        return (current_year - self.spouseDateOfBirth) - (current_year - self.dateOfBirth)
+
+    @property
+    def hired_age(self):
+        return self.hiredYear - self.dateOfBirth
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'name': self.name,
+            'hiredYear': self.hiredYear,
+            'dateOfBirth': self.dateOfBirth,
+            'spouseDateOfBirth': self.spouseDateOfBirth,
+            'sex': self.sex,
+        }
+        # Only encode spouseSex if there is a spouse
+        if self.spouseDateOfBirth > 0 and self.spouseSex is not None:
+            data['spouseSex'] = self.spouseSex
+        return data
+
+
+def parse_employees(records):
+    """Decode a roster JSON array into Employee records"""
+    if not isinstance(records, list):
+        raise ValueError("employees must be a JSON array")
+    employees = []
+    for index, record in enumerate(records):
+        try:
+            employees.append(Employee.from_dict(record))
+        except ValueError as e:
+            raise ValueError(f"employees[{index}]: {e}")
+    return employees
+
+
+class DisbursementResult:
+    """PensionCalculatorDisbursements.DisbursementResult"""
+    __slots__ = ('totalPayout', 'initialAnnualPension', 'finalAnnualPension', 'spouseInitialAnnualPension',
+                 'spouseInitialBuyingPower', 'spouseFinalAnnualPension', 'yearsReceivingPension',
+                 'yearsReceivingSpousePension', 'spouseReductionPercent')
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class EmployeeResult:
+    """EmployeeCalculationResult; per-cohort values are shared, not copied"""
+    __slots__ = ('employee', 'cohort')
+
+    def __init__(self, employee, cohort):
+        self.employee = employee
+        self.cohort = cohort
+
+    @property
+    def cityContributions(self):
+        return self.cohort.adjusted_city_contribution
+
+    def to_dict(self):
+        cohort = self.cohort
+        return {
+            'id': self.employee.id,
+            'employee': self.employee.to_dict(),
+            'totalDisbursements': cohort.total_payout,
+            'initialAnnualPension': cohort.initial_pension,
+            'cityContributions': self.cityContributions,
+            'employeeContributions': cohort.employee_contribution,
+            'yearsToRetire': cohort.years_to_retire,
+            'retirementAge': cohort.retirement_age,
+            'spouseInitialAnnualPension': cohort.spouse_initial_pension,
+            'yearsReceivingSpousePension': cohort.years_receiving_spouse_pension,
+        }
+
+
+class SystemResult:
+    """SystemCalculationResult plus its ContributionVerificationResult"""
+    __slots__ = ('totalDisbursements', 'totalCityContributions', 'totalEmployeeContributions',
+                 'annualCityPayments', 'cityAnnualPercentOfPayroll', 'vestedEmployees', 'employeeCohorts',
+                 'totalAvailableAtRetirement', 'totalNeededAtRetirement', 'surplus', 'isSufficient')
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @property
+    def employeeResults(self):
+        # Built on demand: one object per employee is most of a large valuation's cost
+        return list(map(EmployeeResult, self.vestedEmployees, self.employeeCohorts))
+
+    def to_dict(self, include_employees=True):
+        data = {
+            'totalDisbursements': finite_or_none(self.totalDisbursements),
+            'totalCityContributions': finite_or_none(self.totalCityContributions),
+            'totalEmployeeContributions': finite_or_none(self.totalEmployeeContributions),
+            'annualCityPayments': finite_or_none(self.annualCityPayments),
+            'cityAnnualPercentOfPayroll': finite_or_none(self.cityAnnualPercentOfPayroll),
+            'verificationResult': {
+                'totalAvailableAtRetirement': finite_or_none(self.totalAvailableAtRetirement),
+                'totalNeededAtRetirement': finite_or_none(self.totalNeededAtRetirement),
+                'surplus': finite_or_none(self.surplus),
+                'isSufficient': self.isSufficient,
+            },
+            'vestedEmployeeCount': len(self.vestedEmployees),
+        }
+        if include_employees:
+            data['employeeResults'] = [result.to_dict() for result in self.employeeResults]
+        return data
+
+
+def finite_or_none(value):
+    """JSON has no NaN/Infinity (e.g. a roster with no vested employees divides 0 by 0)"""
+    return value if value == value and value not in (float('inf'), float('-inf')) else None
+
+
+# MARK: - PensionMathFormulas
+
+def present_value(future_value, interest_rate, years):
+    """PV = FV / (1 + r)^n"""
+    r = interest_rate / 100.0
+    return future_value / (1 + r) ** years
+
+
+def future_value(present_value, interest_rate, years):
+    """FV = PV * (1 + r)^n"""
+    r = interest_rate / 100.0
+    return present_value * (1 + r) ** years
+
+
+def future_value_of_annuity(annual_payment, interest_rate, years):
+    """FV = PMT * (((1 + r)^n - 1) / r)"""
+    r = interest_rate / 100.0
+    if r == 0:
+        return annual_payment * years
+    return annual_payment * (((1 + r) ** years - 1) / r)
+
+
+def annual_payment_from_present_value(present_value, interest_rate, years):
+    """PMT = PV * (r / (1 - (1 + r)^-n))"""
+    r = interest_rate / 100.0
+    if years > 0 and r > 0:
+        discount_factor = (1 + r) ** -years
+        annuity_factor = r / (1 - discount_factor)
+        return present_value * annuity_factor
+    elif years > 0:
+        return present_value / years
+    return 0.0
+
+
+def amount_needed_at_retirement_with_cola(initial_annual_payment, years_retired, spouse_initial_annual_pension,
+                                          years_receiving_spouse_pension, cola_percent, is_cola_compounding,
+                                          number_colas, cola_spacing):
+    """Sum of nominal payments (with COLA, without inflation) for retiree and survivor"""
+    total_nominal = 0.0
+    current_pension = initial_annual_payment
+    cola_counter = 0
+    straight_cola = initial_annual_payment * cola_percent
+
+    for year in range(1, years_retired + 1):
+        if number_colas > 0 and year % cola_spacing == 0 and cola_counter < number_colas:
+            cola_counter += 1
+            if is_cola_compounding:
+                current_pension += current_pension * cola_percent
+            else:
+                current_pension += straight_cola
+        total_nominal += current_pension
+
+    if years_receiving_spouse_pension > 0 and spouse_initial_annual_pension > 0:
+        spouse_pension = spouse_initial_annual_pension
+        spouse_cola_counter = 0
+        spouse_straight_cola = spouse_initial_annual_pension * cola_percent
+        for year in range(1, years_receiving_spouse_pension + 1):
+            if number_colas > 0 and year % cola_spacing == 0 and spouse_cola_counter < number_colas:
+                spouse_cola_counter += 1
+                if is_cola_compounding:
+                    spouse_pension += spouse_pension * cola_percent
+                else:
+                    spouse_pension += spouse_straight_cola
+            total_nominal += spouse_pension
+
+    return total_nominal
+
+
+# MARK: - PensionMathCalculations
+
+def calculate_initial_annual_pension(earnings, multiplier, years_of_service):
+    """Annual Pension = Earnings × Multiplier × Years of Service"""
+    multiplier_decimal = multiplier / 100.0
+    return earnings * multiplier_decimal * years_of_service
+
+
+def calculate_years_receiving_pension(retirement_age, employee_sex, life_expectancy_male,
+                                      life_expectancy_female, life_exp_diff):
+    """Years from retirement to life expectancy, minimum 1"""
+    life_expectancy = life_expectancy_male if employee_sex == 'M' else life_expectancy_female
+    return max(1, life_expectancy + life_exp_diff - retirement_age)
+
+
+def calculate_years_receiving_spouse_pension(pension_option, employee_sex, spouse_sex, spouse_age_diff,
+                                             life_expectancy_male, life_expectancy_female, life_exp_diff):
+    if pension_option == OPTION_1:
+        return 0  # No survivor benefit
+    if pension_option == OPTION_2:
+        return 10  # Fixed 10-year survivor
+    if spouse_sex is None:
+        return 0  # No spouse
+    employee_life_expectancy = life_expectancy_male if employee_sex == 'M' else life_expectancy_female
+    spouse_life_expectancy = life_expectancy_male if spouse_sex == 'M' else life_expectancy_female
+    return max(0, spouse_life_expectancy - employee_life_expectancy - spouse_age_diff)
+
+
+def apply_cola(current_pension, cola_percent, is_compounding, straight_cola_amount):
+    if is_compounding:
+        return current_pension + (current_pension * cola_percent)
+    return current_pension + straight_cola_amount
+
+
+def apply_inflation(current_amount, inflation_rate):
+    return current_amount - (current_amount * inflation_rate)
+
+
+def calculate_total_employee_contribution(base_wage, contribution_percent, years_of_service):
+    annual_contribution = base_wage * (contribution_percent / 100.0)
+    return annual_contribution * years_of_service
+
+
+def calculate_annual_employee_contribution(base_wage, contribution_percent):
+    return base_wage * (contribution_percent / 100.0)
+
+
+def calculate_city_contribution_present_value(amount_needed_at_retirement, initial_balance,
+                                              total_employee_contribution, expected_interest_rate,
+                                              years_investing):
+    """Present value of what the city must provide beyond employee contributions"""
+    annual_employee_contribution = total_employee_contribution / years_investing
+    employee_contributions_fv = future_value_of_annuity(annual_employee_contribution, expected_interest_rate,
+                                                        years_investing)
+    future_value_needed = amount_needed_at_retirement - initial_balance - employee_contributions_fv
+    return present_value(future_value_needed, expected_interest_rate, years_investing)
+
+
+def calculate_annual_city_contribution(present_value, interest_rate, years_investing):
+    return annual_payment_from_present_value(present_value, interest_rate, years_investing)
+
+
+# MARK: - PensionCalculatorDisbursements
+
+def retiree_payout(initial_pension, years_receiving_pension, cola_perc, inflate, is_cola_compounding,
+                   number_colas, cola_spacing):
+    """(total buying power, final annual pension) of the retiree's own payments.
+
+    calculateOption1TotalBenefit and the main loop of calculateDisbursements
+    walk exactly this sequence; one pass yields both results.
+    """
+    total_benefit = 0.0
+    current_pension = initial_pension
+    cola_counter = 0
+    straight_cola = initial_pension * cola_perc
+    for year in range(1, years_receiving_pension + 1):
+        if number_colas > 0 and year % cola_spacing == 0 and cola_counter < number_colas:
+            cola_counter += 1
+            if is_cola_compounding:
+                current_pension += current_pension * cola_perc
+            else:
+                current_pension += straight_cola
+        current_pension -= current_pension * inflate
+        total_benefit += current_pension
+    return total_benefit, current_pension
+
+
+def dollar_amount_after_colas(initial_pension, years, cola_perc, is_cola_compounding, number_colas, cola_spacing):
+    """Nominal pension after the COLAs granted during `years` (no inflation)"""
+    amount = initial_pension
+    cola_counter = 0
+    straight_cola = initial_pension * cola_perc
+    for year in range(1, years + 1):
+        if number_colas > 0 and year % cola_spacing == 0 and cola_counter < number_colas:
+            cola_counter += 1
+            amount = apply_cola(amount, cola_perc, is_cola_compounding, straight_cola)
+    return amount
+
+
+def inflate_over(amount, years, inflate):
+    for _ in range(years):
+        amount = apply_inflation(amount, inflate)
+    return amount
+
+
+def calculate_total_benefit_with_survivor(initial_pension, years_receiving_pension, years_receiving_spouse_pension,
+                                          cola_perc, inflate, is_cola_compounding, number_colas, cola_spacing,
+                                          survivor_percent, is_fixed_years):
+    """Total lifetime benefit with survivor (Options 2, 3, 4) in today's buying power"""
+    total_benefit, current_pension = retiree_payout(initial_pension, years_receiving_pension, cola_perc, inflate,
+                                                    is_cola_compounding, number_colas, cola_spacing)
+
+    if years_receiving_spouse_pension > 0 and survivor_percent > 0:
+        actual_survivor_years = min(10, years_receiving_spouse_pension) if is_fixed_years else years_receiving_spouse_pension
+
+        if survivor_percent == 1.0 and not is_fixed_years:
+            # Option 3: dollar amount includes the retiree's COLAs, buying power is eroded by inflation
+            survivor_dollar_amount = dollar_amount_after_colas(initial_pension, years_receiving_pension, cola_perc,
+                                                               is_cola_compounding, number_colas, cola_spacing)
+            survivor_buying_power = inflate_over(survivor_dollar_amount, years_receiving_pension, inflate)
+            survivor_cola_counter = 0
+            survivor_straight_cola = survivor_dollar_amount * cola_perc
+            for year in range(1, actual_survivor_years + 1):
+                if number_colas > 0 and year % cola_spacing == 0 and survivor_cola_counter < number_colas:
+                    survivor_cola_counter += 1
+                    survivor_dollar_amount = apply_cola(survivor_dollar_amount, cola_perc, is_cola_compounding,
+                                                        survivor_straight_cola)
+                    survivor_buying_power = survivor_dollar_amount
+                survivor_buying_power = apply_inflation(survivor_buying_power, inflate)
+                total_benefit += survivor_buying_power
+        else:
+            if survivor_percent < 1.0 and not is_fixed_years:
+                # Option 4: percentage of initial pension at retirement
+                survivor_pension = initial_pension * survivor_percent
+            else:
+                # Option 2: percentage of current pension at death
+                survivor_pension = current_pension * survivor_percent
+            for _ in range(actual_survivor_years):
+                survivor_pension = apply_inflation(survivor_pension, inflate)
+                total_benefit += survivor_pension
+
+    return total_benefit
+
+
+def calculate_actuarial_equivalent_pension(target_total_benefit, option1_pension, years_receiving_pension,
+                                           years_receiving_spouse_pension, cola_perc, inflate, is_cola_compounding,
+                                           number_colas, cola_spacing, survivor_percent, is_fixed_years):
+    """Reduced pension whose total benefit with survivor equals Option 1's (50-step bisection)"""
+    low = option1_pension * 0.50
+    high = option1_pension * 0.99
+    best_pension = option1_pension * 0.85
+
+    for _ in range(50):
+        mid = (low + high) / 2.0
+        total_benefit = calculate_total_benefit_with_survivor(
+            mid, years_receiving_pension, years_receiving_spouse_pension, cola_perc, inflate,
+            is_cola_compounding, number_colas, cola_spacing, survivor_percent, is_fixed_years)
+        if abs(total_benefit - target_total_benefit) < 0.01:
+            best_pension = mid
+            break
+        elif total_benefit < target_total_benefit:
+            low = mid
+        else:
+            high = mid
+        best_pension = mid
+
+    return best_pension
+
+
+def bisection_edge(option1_pension, upward):
+    """Where calculate_actuarial_equivalent_pension ends when the answer lies outside its bracket.
+
+    Every comparison then goes the same way, so the 50 midpoints can be
+    replayed without evaluating any benefit. Works on NumPy arrays as well.
+    """
+    low = option1_pension * 0.50
+    high = option1_pension * 0.99
+    for _ in range(50):
+        mid = (low + high) / 2.0
+        if upward:
+            low = mid
+        else:
+            high = mid
+    return mid
+
+
+def solve_actuarial_equivalent_pension(target_total_benefit, option1_pension, years_receiving_pension,
+                                       years_receiving_spouse_pension, cola_perc, inflate, is_cola_compounding,
+                                       number_colas, cola_spacing, survivor_percent, is_fixed_years):
+    """Closed-form replacement for calculate_actuarial_equivalent_pension.
+
+    Every payment in calculate_total_benefit_with_survivor is the initial
+    pension times a factor that does not depend on it (straight COLAs are
+    initial * cola too), so total benefit = pension * total benefit per
+    dollar, and one pass at $1 gives the answer. Answers outside the
+    bisection's 50%-99% bracket (e.g. no survivor years) are pinned to the
+    edge exactly as the bisection pins them. Falls back to the bisection
+    when the per-dollar total is degenerate or the answer is so close to
+    the bracket that the bisection's 1-cent early exit could trigger.
+    """
+    per_dollar = calculate_total_benefit_with_survivor(
+        1.0, years_receiving_pension, years_receiving_spouse_pension, cola_perc, inflate, is_cola_compounding,
+        number_colas, cola_spacing, survivor_percent, is_fixed_years)
+    if per_dollar > 0 and per_dollar != float('inf'):
+        pension = target_total_benefit / per_dollar
+        low = option1_pension * 0.50
+        high = option1_pension * 0.99
+        margin = 0.01 / per_dollar
+        if low <= pension <= high:
+            return pension
+        if pension > high + margin:
+            return bisection_edge(option1_pension, upward=True)
+        if pension < low - margin:
+            return bisection_edge(option1_pension, upward=False)
+    return calculate_actuarial_equivalent_pension(
+        target_total_benefit, option1_pension, years_receiving_pension, years_receiving_spouse_pension, cola_perc,
+        inflate, is_cola_compounding, number_colas, cola_spacing, survivor_percent, is_fixed_years)
+
+
+SURVIVOR_TERMS = {
+    # option: (survivor percent, fixed years)
+    OPTION_2: (1.0, True),
+    OPTION_3: (1.0, False),
+    OPTION_4: (2.0 / 3.0, False),
+}
+
+
+def calculate_disbursements(base_wage, fac_wage, annual_multiplier, use_fac_wage, is_cola_compounding,
+                            number_colas, cola_spacing, cola_percent, inflate_rate, retirement_age,
+                            total_years_service, employee_sex, spouse_sex, life_expectancy_male,
+                            life_expectancy_female, life_exp_diff, spouse_age_diff, current_age,
+                            pension_option=OPTION_3, solver=calculate_actuarial_equivalent_pension):
+    """PensionCalculatorDisbursements.calculateDisbursements.
+    
+    The default solver is the app's bisection, for identical results;
+    pass solver=solve_actuarial_equivalent_pension for the closed form.
+    """
+    cola_perc = cola_percent / 100.0
+    inflate = inflate_rate / 100.0
+
+    years_receiving_pension = calculate_years_receiving_pension(
+        retirement_age, employee_sex, life_expectancy_male, life_expectancy_female, life_exp_diff)
+    years_receiving_spouse_pension = calculate_years_receiving_spouse_pension(
+        pension_option, employee_sex, spouse_sex, spouse_age_diff, life_expectancy_male, life_expectancy_female,
+        life_exp_diff)
+
+    earnings_based_on = fac_wage if use_fac_wage else base_wage
+    option1_pension = calculate_initial_annual_pension(earnings_based_on, annual_multiplier, total_years_service)
+    option1_total_benefit, option1_final_pension = retiree_payout(
+        option1_pension, years_receiving_pension, cola_perc, inflate, is_cola_compounding, number_colas, cola_spacing)
+
+    if pension_option == OPTION_1:
+        initial_annual_pension = option1_pension
+        current_pension = option1_final_pension
+    else:
+        survivor_percent, is_fixed_years = SURVIVOR_TERMS[pension_option]
+        initial_annual_pension = solver(
+            option1_total_benefit, option1_pension, years_receiving_pension,
+            10 if pension_option == OPTION_2 else years_receiving_spouse_pension,
+            cola_perc, inflate, is_cola_compounding, number_colas, cola_spacing, survivor_percent, is_fixed_years)
+        _, current_pension = retiree_payout(initial_annual_pension, years_receiving_pension, cola_perc, inflate,
+                                            is_cola_compounding, number_colas, cola_spacing)
+
+    # Spouse pension at the retiree's death
+    if pension_option == OPTION_1:
+        spouse_pension = 0.0
+        spouse_reduction_percent = 0.0
+    elif pension_option == OPTION_2:
+        spouse_pension = current_pension
+        spouse_reduction_percent = 100.0
+    elif pension_option == OPTION_3:
+        spouse_pension = dollar_amount_after_colas(initial_annual_pension, years_receiving_pension, cola_perc,
+                                                   is_cola_compounding, number_colas, cola_spacing)
+        spouse_reduction_percent = 100.0
+    else:
+        spouse_pension = initial_annual_pension * (2.0 / 3.0)
+        spouse_reduction_percent = 66.67
+    spouse_initial_pension = spouse_pension
+
+    if pension_option in (OPTION_3, OPTION_4):
+        spouse_initial_buying_power = inflate_over(spouse_initial_pension, years_receiving_pension, inflate)
+    else:
+        spouse_initial_buying_power = spouse_initial_pension
+
+    if years_receiving_spouse_pension > 0 and pension_option != OPTION_1:
+        if pension_option == OPTION_3:
+            spouse_pension = inflate_over(spouse_initial_buying_power, years_receiving_spouse_pension, inflate)
+        else:
+            for _ in range(years_receiving_spouse_pension):
+                spouse_pension -= spouse_pension * inflate
+
+    # Option 1's total is the authoritative value for actuarial equivalence
+    return DisbursementResult(
+        option1_total_benefit,
+        initial_annual_pension,
+        current_pension,
+        spouse_initial_pension,
+        spouse_initial_buying_power,
+        spouse_pension,
+        years_receiving_pension,
+        years_receiving_spouse_pension,
+        spouse_reduction_percent,
+    )
+
+
+# MARK: - PensionCalculatorPaymentsInto
+
+def calculate_discount_payment(sum_desired_at_retirement, initial_balance, total_employee_contribution,
+                               expected_interest_rate, years_investing):
+    """Present value of city contributions needed (PensionCalculatorPaymentsInto.calculateDiscountPayment)"""
+    return calculate_city_contribution_present_value(sum_desired_at_retirement, initial_balance,
+                                                     total_employee_contribution, expected_interest_rate,
+                                                     years_investing)
+
+
+# MARK: - PensionCalculatorService
+
+def calculate_years_to_retire(hired_age, config):
+    min_required_years = max(config.yearsUntilVestment, 1)
+    if config.retirementAge <= config.careerYearsService + hired_age:
+        calculated_years = config.retirementAge - hired_age
+    elif hired_age + config.careerYearsService < config.minAgeForYearsService:
+        calculated_years = config.minAgeForYearsService - hired_age
+    else:
+        calculated_years = config.careerYearsService
+    return max(calculated_years, min_required_years)
+
+
+class Cohort:
+    """Everything calculateSystemCosts derives for one (sex, hire age) pair.
+
+    The system-wide rules (Option 1, system-wide wages) make an employee's
+    numbers depend only on sex and hire age, so each distinct pair is
+    evaluated once and shared by every employee in it.
+    """
+    __slots__ = ('years_to_retire', 'retirement_age', 'total_payout', 'initial_pension', 'spouse_initial_pension',
+                 'years_receiving_spouse_pension', 'employee_contribution', 'city_contribution',
+                 'needed_at_retirement', 'employee_contributions_fv', 'city_contributions_fv',
+                 'available_at_retirement', 'adjusted_city_contribution', 'adjusted_available_at_retirement',
+                 'annual_city_payment', 'years_retired')
+
+
+def evaluate_cohort(config, sex, hired_age):
+    vestment_requirement = max(config.yearsUntilVestment, 1)
+    min_years_to_retire = max(calculate_years_to_retire(hired_age, config), vestment_requirement)
+    # (hiredYear + minYearsToRetire) - currentYear + currentAge reduces to this
+    earliest_eligible_retirement_age = hired_age + min_years_to_retire
+
+    # SYSTEM-WIDE RULE: Always use Option 1 (no survivor) with system-wide wages
+    disbursement = calculate_disbursements(
+        config.systemWideBaseWage, config.systemWideFacWage, config.multiplier, config.multiplierBasedOnFAC,
+        config.isColaCompounding, config.colaNumber, config.colaSpacing, config.colaPercent,
+        config.expectedFutureInflationRate, earliest_eligible_retirement_age, min_years_to_retire, sex, None,
+        config.lifeExpectancyMale, config.lifeExpectancyFemale, config.deltaExtraLife, 6, 0, OPTION_1)
+
+    employee_contribution = calculate_total_employee_contribution(
+        config.systemWideAverageWage, config.employeeContributionPercent, min_years_to_retire)
+
+    employee_life_expectancy = config.lifeExpectancyMale if sex == 'M' else config.lifeExpectancyFemale
+    years_retired = max(1, employee_life_expectancy + config.deltaExtraLife - earliest_eligible_retirement_age)
+
+    needed_at_retirement = amount_needed_at_retirement_with_cola(
+        disbursement.initialAnnualPension, years_retired, 0, 0, config.colaPercent / 100.0,
+        config.isColaCompounding, config.colaNumber, config.colaSpacing)
+    city_contribution = calculate_discount_payment(
+        needed_at_retirement, 0, employee_contribution, config.expectedSystemFutureRateReturn, min_years_to_retire)
+
+    annual_employee_contribution = calculate_annual_employee_contribution(
+        config.systemWideAverageWage, config.employeeContributionPercent)
+
+    cohort = Cohort()
+    cohort.years_to_retire = min_years_to_retire
+    cohort.retirement_age = earliest_eligible_retirement_age
+    cohort.years_retired = years_retired
+    cohort.total_payout = disbursement.totalPayout
+    cohort.initial_pension = disbursement.initialAnnualPension
+    cohort.spouse_initial_pension = disbursement.spouseInitialAnnualPension
+    cohort.years_receiving_spouse_pension = disbursement.yearsReceivingSpousePension
+    cohort.employee_contribution = employee_contribution
+    cohort.city_contribution = city_contribution
+    cohort.needed_at_retirement = needed_at_retirement
+    cohort.employee_contributions_fv = future_value_of_annuity(
+        annual_employee_contribution, config.expectedSystemFutureRateReturn, min_years_to_retire)
+    cohort.city_contributions_fv = city_contributions_fv(config, city_contribution, min_years_to_retire)
+    return cohort
+
+
+def city_contributions_fv(config, city_contribution, years_to_retire):
+    annual_city_contribution = calculate_annual_city_contribution(
+        city_contribution, config.expectedSystemFutureRateReturn, years_to_retire)
+    return future_value_of_annuity(annual_city_contribution, config.expectedSystemFutureRateReturn, years_to_retire)
+
+
+class CohortFactors:
+    """Per-dollar benefit and funding factors of one system-wide cohort.
+
+    payout/final/needed are per $1 of initial annual pension; growth,
+    annuity and payment are the (1+r)^n, FV-annuity and PMT factors of the
+    accumulation years. None of them depend on wages, the multiplier or the
+    contribution rate, so one entry serves every valuation that changes only
+    those.
+    """
+    __slots__ = ('years_retired', 'payout', 'final', 'needed', 'growth', 'annuity', 'payment')
+
+    def __init__(self, config, sex, retirement_age, years_of_service):
+        cola_perc = config.colaPercent / 100.0
+        employee_life_expectancy = config.lifeExpectancyMale if sex == 'M' else config.lifeExpectancyFemale
+        self.years_retired = max(1, employee_life_expectancy + config.deltaExtraLife - retirement_age)
+        self.payout, self.final = retiree_payout(
+            1.0, self.years_retired, cola_perc, config.expectedFutureInflationRate / 100.0,
+            config.isColaCompounding, config.colaNumber, config.colaSpacing)
+        self.needed = amount_needed_at_retirement_with_cola(
+            1.0, self.years_retired, 0, 0, cola_perc, config.isColaCompounding, config.colaNumber,
+            config.colaSpacing)
+        rate = config.expectedSystemFutureRateReturn
+        self.growth = (1 + rate / 100.0) ** years_of_service
+        self.annuity = future_value_of_annuity(1.0, rate, years_of_service)
+        self.payment = annual_payment_from_present_value(1.0, rate, years_of_service)
+
+
+class CohortCache:
+    """LRU of CohortFactors keyed on (config fingerprint, sex, retirement age, years of service).
+
+    System-wide valuations always use Option 1, so the option is implied by
+    the key. Thread-safe; hit/miss counters feed GET /api/calculate/cache.
+    """
+    # PensionConfig fields the factors depend on; everything else scales them
+    # or is already folded into the retirement age and years of service
+    FINGERPRINT_FIELDS = ('isColaCompounding', 'colaNumber', 'colaSpacing', 'colaPercent',
+                          'expectedFutureInflationRate', 'expectedSystemFutureRateReturn',
+                          'lifeExpectancyMale', 'lifeExpectancyFemale', 'deltaExtraLife')
+
+    def __init__(self, max_entries=DEFAULT_COHORT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def fingerprint(cls, config):
+        return tuple(getattr(config, name) for name in cls.FINGERPRINT_FIELDS)
+
+    def factors(self, config, sex, retirement_age, years_of_service, fingerprint=None):
+        if fingerprint is None:
+            fingerprint = self.fingerprint(config)
+        key = (fingerprint, sex, retirement_age, years_of_service)
+        with self.lock:
+            factors = self.entries.get(key)
+            if factors is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return factors
+            self.misses += 1
+        # Computed outside the lock; a concurrent miss on the same key just does it twice
+        factors = CohortFactors(config, sex, retirement_age, years_of_service)
+        with self.lock:
+            self.entries[key] = factors
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return factors
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'maxEntries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hitRatio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+COHORT_CACHE = CohortCache()
+
+
+def evaluate_cohort_from_factors(config, sex, hired_age, cache, fingerprint):
+    """evaluate_cohort() by scaling cached per-dollar factors.
+
+    Agrees with the year-by-year calculation to ~1e-15 relative rather than
+    bit for bit, since the COLA/inflation walk is done once at $1.
+    """
+    vestment_requirement = max(config.yearsUntilVestment, 1)
+    min_years_to_retire = max(calculate_years_to_retire(hired_age, config), vestment_requirement)
+    retirement_age = hired_age + min_years_to_retire
+    factors = cache.factors(config, sex, retirement_age, min_years_to_retire, fingerprint)
+
+    earnings = config.systemWideFacWage if config.multiplierBasedOnFAC else config.systemWideBaseWage
+    initial_pension = calculate_initial_annual_pension(earnings, config.multiplier, min_years_to_retire)
+    employee_contribution = calculate_total_employee_contribution(
+        config.systemWideAverageWage, config.employeeContributionPercent, min_years_to_retire)
+    needed_at_retirement = initial_pension * factors.needed
+    # calculate_city_contribution_present_value with the cached factors
+    employee_contributions_fv = (employee_contribution / min_years_to_retire) * factors.annuity
+    city_contribution = (needed_at_retirement - 0 - employee_contributions_fv) / factors.growth
+
+    cohort = Cohort()
+    cohort.years_to_retire = min_years_to_retire
+    cohort.retirement_age = retirement_age
+    cohort.years_retired = factors.years_retired
+    cohort.total_payout = initial_pension * factors.payout
+    cohort.initial_pension = initial_pension
+    cohort.spouse_initial_pension = 0.0
+    cohort.years_receiving_spouse_pension = 0
+    cohort.employee_contribution = employee_contribution
+    cohort.city_contribution = city_contribution
+    cohort.needed_at_retirement = needed_at_retirement
+    cohort.employee_contributions_fv = calculate_annual_employee_contribution(
+        config.systemWideAverageWage, config.employeeContributionPercent) * factors.annuity
+    cohort.city_contributions_fv = city_contribution * factors.payment * factors.annuity
+    return cohort
+
+
+def valuation_rows(employees):
+    """(hiredYear, dateOfBirth, sex) of each employee; a columnar roster reads them from its columns"""
+    if hasattr(employees, 'valuation_rows'):
+        return employees.valuation_rows()
+    return ((e.hiredYear, e.dateOfBirth, e.sex) for e in employees)
+
+
+def calculate_system_costs(config, employees, current_year=None, cohort_cache=None):
+    """PensionCalculatorService.calculateSystemCosts.
+
+    Totals are accumulated employee by employee in roster order, exactly
+    as the Swift loops do, so sums round the same way. With a CohortCache
+    each cohort is scaled from cached per-dollar factors instead of being
+    walked year by year (see evaluate_cohort_from_factors).
+    """
+    if current_year is None:
+        current_year = datetime.date.today().year
+    vestment_requirement = max(config.yearsUntilVestment, 1)
+    fingerprint = CohortCache.fingerprint(config) if cohort_cache is not None else None
+
+    cohorts = {}
+    vested = []
+    members = []  # cohort of each vested employee, in roster order
+    for index, (hired_year, date_of_birth, sex) in enumerate(valuation_rows(employees)):
+        # Not vested yet: no benefits
+        if current_year - hired_year < vestment_requirement:
+            continue
+        key = (sex, hired_year - date_of_birth)
+        cohort = cohorts.get(key)
+        if cohort is None:
+            if cohort_cache is None:
+                cohort = evaluate_cohort(config, key[0], key[1])
+            else:
+                cohort = evaluate_cohort_from_factors(config, key[0], key[1], cohort_cache, fingerprint)
+            cohort.available_at_retirement = cohort.employee_contributions_fv + cohort.city_contributions_fv
+            cohorts[key] = cohort
+        vested.append(index)
+        members.append(cohort)
+    vested = employees.take(vested) if hasattr(employees, 'take') else [employees[index] for index in vested]
+
+    total_disbursements = running_sum(members, 'total_payout')
+    total_city_contributions = running_sum(members, 'city_contribution')
+    total_employee_contributions = running_sum(members, 'employee_contribution')
+
+    # Verification: aggregate future values across all employees
+    total_available_at_retirement = running_sum(members, 'available_at_retirement')
+    total_needed_at_retirement = running_sum(members, 'needed_at_retirement')
+
+    # Adjust city contributions to target 100% funding (constrained to 80-120%)
+    min_funding_ratio = 0.80
+    max_funding_ratio = 1.20
+    target_funding_ratio = 1.0
+    funding_ratio = divide(total_available_at_retirement, total_needed_at_retirement)
+    constrained_target_ratio = min(max(target_funding_ratio, min_funding_ratio), max_funding_ratio)
+    adjustment_factor = divide(constrained_target_ratio, funding_ratio)
+    total_city_contributions = total_city_contributions * adjustment_factor
+
+    for cohort in cohorts.values():
+        city = cohort.city_contribution * adjustment_factor
+        cohort.adjusted_city_contribution = city
+        cohort.adjusted_available_at_retirement = (cohort.employee_contributions_fv
+                                                   + city_contributions_fv(config, city, cohort.years_to_retire))
+        cohort.annual_city_payment = calculate_annual_city_contribution(
+            city, config.expectedSystemFutureRateReturn, cohort.years_to_retire)
+
+    total_available_at_retirement = running_sum(members, 'adjusted_available_at_retirement')
+    annual_city_payments = running_sum(members, 'annual_city_payment')
+
+    surplus = total_available_at_retirement - total_needed_at_retirement
+    final_funding_ratio = divide(total_available_at_retirement, total_needed_at_retirement)
+    is_sufficient = min_funding_ratio <= final_funding_ratio <= max_funding_ratio
+
+    # Payroll is average wages + insurance for every employee on the roster
+    number_of_employees = len(employees)
+    total_payroll = (config.systemWideAverageWage + config.eachEmployeeInsuranceAnnualCostToCity) * number_of_employees
+    city_annual_percent_of_payroll = (annual_city_payments / total_payroll) * 100.0 if number_of_employees > 0 else 0.0
+
+    return SystemResult(
+        total_disbursements,
+        total_city_contributions,
+        total_employee_contributions,
+        annual_city_payments,
+        city_annual_percent_of_payroll,
+        vested,
+        members,
+        total_available_at_retirement,
+        total_needed_at_retirement,
+        surplus,
+        is_sufficient,
+    )
+
+
+def running_sum(cohorts, field):
+    """Left-to-right sum of one cohort field per employee, like Swift's `total += x` loops.
+
+    Not sum(): from Python 3.12 it compensates rounding error, which would
+    no longer match the app.
+    """
+    return reduce(operator.add, map(operator.attrgetter(field), cohorts), 0.0)
+
+
+def divide(numerator, denominator):
+    """Swift Double division: x/0 is ±inf and 0/0 is NaN instead of an exception"""
+    try:
+        return numerator / denominator
+    except ZeroDivisionError:
+        if numerator == 0 or numerator != numerator:
+            return float('nan')
+        return float('inf') if numerator > 0 else float('-inf')
+
+
+class IncrementalValuation:
+    """calculate_system_costs of a roster that changes one employee at a time.
+
+    A system-wide valuation depends on the roster only through the vested
+    members of each (sex, hire age) cohort and the number of employees, and
+    the funding adjustment scales every city contribution by one factor,
+    which PMT and FV-annuity carry through linearly. So this keeps each
+    member's cohort and running sums of the unadjusted cohort values (plus
+    the adjusted ones per $1 of adjustment); set() and remove() add or
+    subtract one member's values and result() applies the adjustment, both
+    at the same cost whatever the roster size.
+
+    Sums change in edit order instead of being added up in roster order, so
+    totals match calculate_system_costs to rounding (~1e-12 relative) rather
+    than bit for bit; compare_results() measures the difference.
+    """
+    # Running sums of these cohort values, in this order
+    FIELDS = ('total_payout', 'city_contribution', 'employee_contribution', 'available_at_retirement',
+              'needed_at_retirement', 'employee_contributions_fv', 'unit_city_contributions_fv',
+              'unit_annual_city_payment')
+
+    def __init__(self, config, employees, current_year=None, cohort_cache=None):
+        if current_year is None:
+            current_year = datetime.date.today().year
+        self.config = config
+        self.current_year = current_year
+        self.cohort_cache = cohort_cache
+        self.vestment_requirement = max(config.yearsUntilVestment, 1)
+        self.fingerprint = CohortCache.fingerprint(config) if cohort_cache is not None else None
+        self.cohorts = {}  # (sex, hire age) -> (Cohort, its FIELDS values)
+        self.members = {}  # employee id -> (Employee, cohort key or None if not vested), in roster order
+        self.vested = 0
+        self.totals = [0.0] * len(self.FIELDS)
+        for employee in employees:
+            self.set(employee)
+
+    def cohort(self, key):
+        entry = self.cohorts.get(key)
+        if entry is None:
+            config = self.config
+            if self.cohort_cache is None:
+                cohort = evaluate_cohort(config, key[0], key[1])
+            else:
+                cohort = evaluate_cohort_from_factors(config, key[0], key[1], self.cohort_cache, self.fingerprint)
+            cohort.available_at_retirement = cohort.employee_contributions_fv + cohort.city_contributions_fv
+            values = (cohort.total_payout, cohort.city_contribution, cohort.employee_contribution,
+                      cohort.available_at_retirement, cohort.needed_at_retirement, cohort.employee_contributions_fv,
+                      city_contributions_fv(config, cohort.city_contribution, cohort.years_to_retire),
+                      calculate_annual_city_contribution(cohort.city_contribution,
+                                                         config.expectedSystemFutureRateReturn,
+                                                         cohort.years_to_retire))
+            entry = self.cohorts[key] = (cohort, values)
+        return entry
+
+    def set(self, employee):
+        """Add an employee, or replace the one with the same id"""
+        if self.current_year - employee.hiredYear < self.vestment_requirement:
+            key = None
+        else:
+            key = (employee.sex, employee.hiredYear - employee.dateOfBirth)
+        old = self.members.get(employee.id)
+        self.members[employee.id] = (employee, key)
+        if old is not None and old[1] == key:
+            return  # same cohort (or still not vested): the totals do not move
+        if old is not None and old[1] is not None:
+            self.subtract(old[1])
+        if key is not None:
+            self.totals = list(map(operator.add, self.totals, self.cohort(key)[1]))
+            self.vested += 1
+
+    def remove(self, employee_id):
+        """Drop an employee; False if there is none with that id"""
+        old = self.members.pop(employee_id, None)
+        if old is None:
+            return False
+        if old[1] is not None:
+            self.subtract(old[1])
+        return True
+
+    def subtract(self, key):
+        self.vested -= 1
+        if self.vested == 0:
+            # Exactly zero again, rather than whatever rounding is left over
+            self.totals = [0.0] * len(self.FIELDS)
+        else:
+            self.totals = list(map(operator.sub, self.totals, self.cohorts[key][1]))
+
+    def result(self, include_members=True):
+        """The SystemResult; without include_members its vestedEmployees and employeeCohorts are empty"""
+        config = self.config
+        (total_disbursements, total_city_contributions, total_employee_contributions, total_available_at_retirement,
+         total_needed_at_retirement, employee_contributions_fv, unit_city_contributions_fv,
+         unit_annual_city_payments) = self.totals
+
+        # Same adjustment as calculate_system_costs
+        min_funding_ratio = 0.80
+        max_funding_ratio = 1.20
+        target_funding_ratio = 1.0
+        funding_ratio = divide(total_available_at_retirement, total_needed_at_retirement)
+        constrained_target_ratio = min(max(target_funding_ratio, min_funding_ratio), max_funding_ratio)
+        adjustment_factor = divide(constrained_target_ratio, funding_ratio)
+        total_city_contributions = total_city_contributions * adjustment_factor
+
+        if self.vested:
+            total_available_at_retirement = employee_contributions_fv + unit_city_contributions_fv * adjustment_factor
+            annual_city_payments = unit_annual_city_payments * adjustment_factor
+        else:
+            total_available_at_retirement = annual_city_payments = 0.0
+
+        surplus = total_available_at_retirement - total_needed_at_retirement
+        final_funding_ratio = divide(total_available_at_retirement, total_needed_at_retirement)
+        is_sufficient = min_funding_ratio <= final_funding_ratio <= max_funding_ratio
+
+        number_of_employees = len(self.members)
+        total_payroll = (config.systemWideAverageWage + config.eachEmployeeInsuranceAnnualCostToCity) * number_of_employees
+        city_annual_percent_of_payroll = (annual_city_payments / total_payroll) * 100.0 if number_of_employees > 0 else 0.0
+
+        vested, members = [], []
+        if include_members:
+            adjusted = {}
+            for employee, key in self.members.values():
+                if key is None:
+                    continue
+                cohort = adjusted.get(key)
+                if cohort is None:
+                    cohort = adjusted[key] = self.adjusted_cohort(self.cohorts[key][0], adjustment_factor)
+                vested.append(employee)
+                members.append(cohort)
+
+        return SystemResult(
+            total_disbursements,
+            total_city_contributions,
+            total_employee_contributions,
+            annual_city_payments,
+            city_annual_percent_of_payroll,
+            vested,
+            members,
+            total_available_at_retirement,
+            total_needed_at_retirement,
+            surplus,
+            is_sufficient,
+        )
+
+    def adjusted_cohort(self, cohort, adjustment_factor):
+        """A copy of cohort with the adjusted fields calculate_system_costs sets (the cached one stays unadjusted)"""
+        config = self.config
+        copy = Cohort()
+        for name in Cohort.__slots__:
+            if hasattr(cohort, name):
+                setattr(copy, name, getattr(cohort, name))
+        city = cohort.city_contribution * adjustment_factor
+        copy.adjusted_city_contribution = city
+        copy.adjusted_available_at_retirement = (cohort.employee_contributions_fv
+                                                 + city_contributions_fv(config, city, cohort.years_to_retire))
+        copy.annual_city_payment = calculate_annual_city_contribution(
+            city, config.expectedSystemFutureRateReturn, cohort.years_to_retire)
+        return copy
+
+    def to_dict(self, include_employees=True):
+        data = self.result(include_employees).to_dict(include_employees)
+        data['vestedEmployeeCount'] = self.vested
+        return data
+
+
+def compare_results(result, expected, tolerance=1e-9):
+    """Differences between two SystemResult.to_dict() bodies' totals: (largest relative difference, mismatches).
+
+    mismatches maps each total that differs by more than tolerance (or,
+    like isSufficient and vestedEmployeeCount, at all) to [result, expected].
+    The surplus is measured against the totals it is the difference of.
+    """
+    def totals(data):
+        values = {name: value for name, value in data.items() if name not in ('verificationResult', 'employeeResults')}
+        values.update(data['verificationResult'])
+        return values
+
+    result, expected = totals(result), totals(expected)
+    largest = 0.0
+    mismatches = {}
+    for name, value in expected.items():
+        other = result.get(name)
+        if isinstance(value, bool) or isinstance(value, int) or value is None or other is None:
+            if other != value:
+                mismatches[name] = [other, value]
+            continue
+        if name == 'surplus':
+            scale = max(abs(expected['totalAvailableAtRetirement'] or 0.0),
+                        abs(expected['totalNeededAtRetirement'] or 0.0))
+        else:
+            scale = max(abs(value), abs(other))
+        difference = abs(other - value) / scale if scale else 0.0
+        largest = max(largest, difference)
+        if difference > tolerance:
+            mismatches[name] = [other, value]
+    return largest, mismatches
+
+
+def calculate_individual_pension(config):
+    """PensionCalculatorService.calculateIndividualPension: (DisbursementResult, city contribution)"""
+    hire_age = config.fictionalHiredYear - config.fictionalBirthYear
+    years_to_retire = config.fictionalYearsOfWork
+    retirement_age = hire_age + years_to_retire
+    spouse_sex = config.fictionalSpouseSex if config.fictionalSpouseBirthYear > 0 else None
+
+    disbursement = calculate_disbursements(
+        config.baseWage, config.facWage, config.multiplier, config.multiplierBasedOnFAC, config.isColaCompounding,
+        config.colaNumber, config.colaSpacing, config.colaPercent, config.expectedFutureInflationRate,
+        retirement_age, years_to_retire, config.fictionalEmployeeSex, spouse_sex, config.lifeExpectancyMale,
+        config.lifeExpectancyFemale, config.deltaExtraLife, config.fictionalSpouseAgeDiff, hire_age,
+        config.pensionOption)
+
+    employee_contribution = calculate_total_employee_contribution(
+        config.baseWage, config.employeeContributionPercent, years_to_retire)
+    employee_life_expectancy = (config.lifeExpectancyMale if config.fictionalEmployeeSex == 'M'
+                                else config.lifeExpectancyFemale)
+    years_retired = max(1, employee_life_expectancy + config.deltaExtraLife - retirement_age)
+    amount_needed = amount_needed_at_retirement_with_cola(
+        disbursement.initialAnnualPension, years_retired, disbursement.spouseInitialAnnualPension,
+        disbursement.yearsReceivingSpousePension, config.colaPercent / 100.0, config.isColaCompounding,
+        config.colaNumber, config.colaSpacing)
+    city_contribution = calculate_discount_payment(
+        amount_needed, 0, employee_contribution, config.expectedSystemFutureRateReturn, years_to_retire)
+    return disbursement, city_contribution
+
+
+# MARK: - Parameter sweeps
+
+MAX_SWEEP_VALUES = 1000  # values along one sweep axis
+
+
+def sweep_values(name, spec):
+    """Values of one sweep axis: a list, or {"start", "stop", "step"} with stop included"""
+    if name not in PensionConfig.FIELDS:
+        raise ValueError(f"unknown sweep parameter '{name}'")
+    if isinstance(spec, list):
+        values = spec
+    elif isinstance(spec, dict):
+        try:
+            start, stop, step = (float(spec[key]) for key in ('start', 'stop', 'step'))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"sweep parameter '{name}' needs numeric start, stop and step")
+        if step <= 0 or stop < start:
+            raise ValueError(f"sweep parameter '{name}' needs step > 0 and stop >= start")
+        count = int((stop - start) / step + 1e-9) + 1
+        if count > MAX_SWEEP_VALUES:
+            raise ValueError(f"sweep parameter '{name}' has more than {MAX_SWEEP_VALUES} values")
+        # Computed from the index, not accumulated, so 2.0 + 4 * 0.25 is exactly 3.0
+        values = [round(start + i * step, 10) for i in range(count)]
+    else:
+        raise ValueError(f"sweep parameter '{name}' must be a list or a start/stop/step object")
+    if not values or len(values) > MAX_SWEEP_VALUES:
+        raise ValueError(f"sweep parameter '{name}' needs 1 to {MAX_SWEEP_VALUES} values")
+    return values
+
+
+def expand_sweep(base_config, parameters, max_scenarios):
+    """Cartesian product of the sweep axes applied to base_config.
+
+    Returns [(overrides, config dict)], every config already validated by
+    PensionConfig.from_dict so workers never see a bad scenario.
+    """
+    if not isinstance(parameters, dict) or not parameters:
+        raise ValueError("parameters must be a non-empty object of sweep axes")
+    names = list(parameters)
+    axes = [sweep_values(name, parameters[name]) for name in names]
+    total = 1
+    for values in axes:
+        total *= len(values)
+    if total > max_scenarios:
+        raise ValueError(f"sweep has {total} scenarios; the limit is {max_scenarios}")
+    base = base_config.to_dict()
+    scenarios = []
+    for combination in itertools.product(*axes):
+        overrides = dict(zip(names, combination))
+        config = dict(base, **overrides)
+        try:
+            PensionConfig.from_dict(config)
+        except ValueError as e:
+            raise ValueError(f"scenario {overrides}: {e}")
+        scenarios.append((overrides, config))
+    return scenarios
+
+
+def roster_rows(employees):
+    """The fields of each Employee a system valuation reads, compact for sending to workers"""
+    if hasattr(employees, 'roster_rows'):
+        return employees.roster_rows()
+    return [(e.id, e.hiredYear, e.dateOfBirth, e.sex) for e in employees]
+
+
+_worker_roster = (None, None)  # (token, employees) last used by this worker process
+
+
+def run_scenarios(token, rows, current_year, scenarios):
+    """Worker side of a sweep: value one chunk of [(index, config dict)] scenarios.
+
+    Runs in a process pool. The decoded roster is kept per token so later
+    chunks of the same sweep skip rebuilding it, and the worker's
+    COHORT_CACHE is shared by every scenario it runs.
+    """
+    global _worker_roster
+    if _worker_roster[0] != token:
+        _worker_roster = (token, [Employee(employee_id, '', hired_year, date_of_birth, 0, sex)
+                                  for employee_id, hired_year, date_of_birth, sex in rows])
+    employees = _worker_roster[1]
+    results = []
+    for index, config in scenarios:
+        result = calculate_system_costs(PensionConfig.from_dict(config), employees, current_year, COHORT_CACHE)
+        results.append((index, result.to_dict(include_employees=False)))
+    return results
+
+
+# MARK: - Vectorized roster kernel (requires NumPy)
+
+def payout_factors(max_years, cola_perc, inflate, is_cola_compounding, number_colas, cola_spacing):
+    """Per-dollar COLA/inflation schedule for retirement years 1..max_years.
+
+    Both COLA styles are linear in the initial pension (a straight COLA adds
+    initial * cola), so year k's payment is initial * factor[k] for every
+    member alike. Returns (real, cumulative real, cumulative nominal): the
+    buying power paid in year k, the buying power paid through year k, and
+    the nominal dollars paid through year k (amountNeededAtRetirementWithCOLA).
+    """
+    real = np.empty(max_years)
+    nominal = np.empty(max_years)
+    real_factor = 1.0
+    nominal_factor = 1.0
+    cola_counter = 0
+    for year in range(1, max_years + 1):
+        if number_colas > 0 and year % cola_spacing == 0 and cola_counter < number_colas:
+            cola_counter += 1
+            if is_cola_compounding:
+                real_factor += real_factor * cola_perc
+                nominal_factor += nominal_factor * cola_perc
+            else:
+                real_factor += cola_perc
+                nominal_factor += cola_perc
+        real_factor -= real_factor * inflate
+        real[year - 1] = real_factor
+        nominal[year - 1] = nominal_factor
+    return real, np.cumsum(real), np.cumsum(nominal)
+
+
+def batch_retiree_payouts(initial_pensions, years_receiving_pension, years_retired, cola_percent, inflate_rate,
+                          is_cola_compounding, number_colas, cola_spacing):
+    """Option 1 payouts for many members at once.
+
+    Returns arrays (totalPayout, finalAnnualPension, amountNeededAtRetirementWithCOLA)
+    matching retiree_payout() and amount_needed_at_retirement_with_cola() to well
+    under a cent. Members retire for different lengths of time; each one's
+    masked (members x years) row sum is read off the cumulative schedule at
+    its own last year instead of materializing the matrix.
+    """
+    initial_pensions = np.asarray(initial_pensions, dtype=np.float64)
+    years_receiving_pension = np.asarray(years_receiving_pension, dtype=np.int64)
+    years_retired = np.asarray(years_retired, dtype=np.int64)
+    if initial_pensions.size == 0:
+        empty = np.zeros(0)
+        return empty, empty.copy(), empty.copy()
+    if years_receiving_pension.min() < 1 or years_retired.min() < 1:
+        raise ValueError("years receiving pension must be at least 1")
+    max_years = int(max(years_receiving_pension.max(), years_retired.max()))
+    real, cumulative_real, cumulative_nominal = payout_factors(
+        max_years, cola_percent / 100.0, inflate_rate / 100.0, is_cola_compounding, number_colas, cola_spacing)
+    last_year = years_receiving_pension - 1
+    total_payout = initial_pensions * cumulative_real[last_year]
+    final_pension = initial_pensions * real[last_year]
+    amount_needed = initial_pensions * cumulative_nominal[years_retired - 1]
+    return total_payout, final_pension, amount_needed
+
+
+def batch_system_disbursements(config, employees, current_year=None):
+    """Vectorized per-member half of calculate_system_costs.
+
+    Returns a dict of NumPy arrays over the vested members in roster order:
+    index (position in `employees`), yearsToRetire, retirementAge,
+    initialAnnualPension, totalDisbursements, finalAnnualPension and
+    amountNeededAtRetirement.
+    """
+    if np is None:
+        raise RuntimeError("batch_system_disbursements requires NumPy")
+    if current_year is None:
+        current_year = datetime.date.today().year
+    count = len(employees)
+    if hasattr(employees, 'valuation_arrays'):
+        hired_year, date_of_birth, male = employees.valuation_arrays()
+        hired_year = hired_year.astype(np.int64)
+        date_of_birth = date_of_birth.astype(np.int64)
+    else:
+        hired_year = np.fromiter((e.hiredYear for e in employees), dtype=np.int64, count=count)
+        date_of_birth = np.fromiter((e.dateOfBirth for e in employees), dtype=np.int64, count=count)
+        male = np.fromiter((e.sex == 'M' for e in employees), dtype=bool, count=count)
+
+    vestment_requirement = max(config.yearsUntilVestment, 1)
+    index = np.flatnonzero(current_year - hired_year >= vestment_requirement)
+    hired_age = hired_year[index] - date_of_birth[index]
+    male = male[index]
+
+    # calculate_years_to_retire, branch by branch
+    years_to_retire = np.where(
+        config.retirementAge <= config.careerYearsService + hired_age,
+        config.retirementAge - hired_age,
+        np.where(hired_age + config.careerYearsService < config.minAgeForYearsService,
+                 config.minAgeForYearsService - hired_age,
+                 config.careerYearsService))
+    years_to_retire = np.maximum(years_to_retire, vestment_requirement)
+    retirement_age = hired_age + years_to_retire
+
+    life_expectancy = np.where(male, config.lifeExpectancyMale, config.lifeExpectancyFemale)
+    years_retired = np.maximum(1, life_expectancy + config.deltaExtraLife - retirement_age)
+
+    earnings = config.systemWideFacWage if config.multiplierBasedOnFAC else config.systemWideBaseWage
+    initial_pension = earnings * (config.multiplier / 100.0) * years_to_retire.astype(np.float64)
+
+    # Option 1 with no spouse: years receiving pension and years retired coincide
+    total_payout, final_pension, amount_needed = batch_retiree_payouts(
+        initial_pension, years_retired, years_retired, config.colaPercent, config.expectedFutureInflationRate,
+        config.isColaCompounding, config.colaNumber, config.colaSpacing)
+    return {
+        'index': index,
+        'yearsToRetire': years_to_retire,
+        'retirementAge': retirement_age,
+        'initialAnnualPension': initial_pension,
+        'totalDisbursements': total_payout,
+        'finalAnnualPension': final_pension,
+        'amountNeededAtRetirement': amount_needed,
+        'yearsReceivingPension': years_retired,
+    }
+
+
+def batch_option_pensions(config, employees, current_year=None):
+    """Initial annual pension under each of Options 1-4 for every vested member.
+
+    Uses the system-wide wages and years of service of
+    batch_system_disbursements and each member's own spouse. The per-dollar
+    survivor totals depend only on (option, years receiving pension, survivor
+    years), which take few distinct values, so each distinct combination is
+    solved once in closed form and broadcast back over the roster.
+    Returns a dict with 'index' and 'option1'..'option4' arrays.
+    """
+    members = batch_system_disbursements(config, employees, current_year)
+    if current_year is None:
+        current_year = datetime.date.today().year
+    index = members['index']
+    option1 = members['initialAnnualPension']
+    target = members['totalDisbursements']
+    years_receiving = members['yearsReceivingPension']
+
+    male = np.fromiter((employees[i].sex == 'M' for i in index), dtype=bool, count=index.size)
+    married = np.fromiter((employees[i].spouseSex is not None for i in index), dtype=bool, count=index.size)
+    spouse_male = np.fromiter((employees[i].spouseSex == 'M' for i in index), dtype=bool, count=index.size)
+    spouse_age_diff = np.fromiter((employees[i].spouse_age_diff(current_year) for i in index),
+                                  dtype=np.int64, count=index.size)
+    employee_life = np.where(male, config.lifeExpectancyMale, config.lifeExpectancyFemale)
+    spouse_life = np.where(spouse_male, config.lifeExpectancyMale, config.lifeExpectancyFemale)
+    spouse_years = np.where(married, np.maximum(0, spouse_life - employee_life - spouse_age_diff), 0)
+
+    cola_perc = config.colaPercent / 100.0
+    inflate = config.expectedFutureInflationRate / 100.0
+    result = {'index': index, 'option1': option1}
+    for option in (OPTION_2, OPTION_3, OPTION_4):
+        survivor_percent, is_fixed_years = SURVIVOR_TERMS[option]
+        survivor_years = np.full(index.size, 10) if option == OPTION_2 else spouse_years
+        pairs, inverse = np.unique(np.stack([years_receiving, survivor_years]), axis=1, return_inverse=True)
+        per_dollar = np.array([
+            calculate_total_benefit_with_survivor(1.0, int(years), int(spouse), cola_perc, inflate,
+                                                  config.isColaCompounding, config.colaNumber,
+                                                  config.colaSpacing, survivor_percent, is_fixed_years)
+            for years, spouse in pairs.T])[inverse.reshape(-1)]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pension = target / per_dollar
+            margin = 0.01 / per_dollar
+        low = option1 * 0.50
+        high = option1 * 0.99
+        usable = (per_dollar > 0) & np.isfinite(per_dollar)
+        above = usable & (pension > high + margin)
+        below = usable & (pension < low - margin)
+        pension = np.where(above, bisection_edge(option1, upward=True), pension)
+        pension = np.where(below, bisection_edge(option1, upward=False), pension)
+        # Degenerate members, and those within a cent of the bracket, take the scalar path
+        for i in np.flatnonzero(~(above | below | (usable & (pension >= low) & (pension <= high)))):
+            pension[i] = solve_actuarial_equivalent_pension(
+                target[i], option1[i], int(years_receiving[i]), int(survivor_years[i]), cola_perc, inflate,
+                config.isColaCompounding, config.colaNumber, config.colaSpacing, survivor_percent,
+                is_fixed_years)
+        result[f'option{option}'] = pension
+    return result
+
+
+# MARK: - Monte Carlo funding simulation (requires NumPy)
+
+def funding_cohorts(config, result):
+    """Per-cohort cash flows of a SystemResult for simulate_paths().
+
+    Returns [(members, years to retire, annual contribution, nominal payments)]:
+    the employee plus adjusted city contribution paid each accumulation year,
+    and the Option 1 pension paid each retirement year (COLAs, no inflation).
+    """
+    counts = {}
+    for cohort in result.employeeCohorts:
+        entry = counts.get(id(cohort))
+        if entry is None:
+            counts[id(cohort)] = [cohort, 1]
+        else:
+            entry[1] += 1
+    annual_employee_contribution = calculate_annual_employee_contribution(
+        config.systemWideAverageWage, config.employeeContributionPercent)
+    cola_perc = config.colaPercent / 100.0
+    table = []
+    for cohort, members in counts.values():
+        payments = []
+        current_pension = cohort.initial_pension
+        cola_counter = 0
+        straight_cola = cohort.initial_pension * cola_perc
+        for year in range(1, cohort.years_retired + 1):
+            if config.colaNumber > 0 and year % config.colaSpacing == 0 and cola_counter < config.colaNumber:
+                cola_counter += 1
+                current_pension = apply_cola(current_pension, cola_perc, config.isColaCompounding, straight_cola)
+            payments.append(current_pension)
+        table.append((members, cohort.years_to_retire,
+                      annual_employee_contribution + cohort.annual_city_payment, payments))
+    return table
+
+
+def simulate_paths(table, paths, seed, expected_return, expected_inflation, return_volatility,
+                   inflation_volatility, correlation):
+    """Assets and liabilities at retirement, summed over the roster, for `paths` random paths.
+
+    Year t of a path draws a correlated (return, inflation) pair; rates
+    are percentages as in PensionConfiguration. Contributions compound at
+    the path's returns until each cohort retires. Payments are then
+    discounted at the path's real return in excess of the expected real
+    return, so a path that hits every expectation reproduces the app's rule
+    that returns do not outpace inflation in retirement, and with zero
+    volatility the result equals the deterministic valuation.
+    Returns (assets, liabilities) arrays of length `paths`.
+    """
+    rng = np.random.default_rng(seed)
+    horizon = max(years + len(payments) for _, years, _, payments in table)
+    mean_return = expected_return / 100.0
+    mean_inflation = expected_inflation / 100.0
+    return_shocks = rng.standard_normal((paths, horizon))
+    inflation_shocks = (correlation * return_shocks
+                        + (1 - correlation * correlation) ** 0.5 * rng.standard_normal((paths, horizon)))
+    # A year cannot lose more than everything
+    returns = np.maximum(mean_return + return_volatility / 100.0 * return_shocks, -0.99)
+    inflation = np.maximum(mean_inflation + inflation_volatility / 100.0 * inflation_shocks, -0.99)
+
+    growth = np.cumprod(1 + returns, axis=1)
+    # FV of end-of-year payments: pmt * G[n] * sum(1 / G[t] for t <= n)
+    annuity = growth * np.cumsum(1 / growth, axis=1)
+    excess_real = (1 + returns) / (1 + inflation) * ((1 + mean_inflation) / (1 + mean_return))
+    discount = 1 / np.cumprod(excess_real, axis=1)
+
+    assets = np.zeros(paths)
+    liabilities = np.zeros(paths)
+    for members, years, contribution, payments in table:
+        assets += (members * contribution) * annuity[:, years - 1]
+        # Value at retirement of each payment, discounted from its own year back to retirement
+        liabilities += members * (discount[:, years:years + len(payments)] @ np.asarray(payments)
+                                  / discount[:, years - 1])
+    return assets, liabilities
+
+
+def summarize_simulation(assets, liabilities, percentiles=(5, 25, 50, 75, 95)):
+    surplus = assets - liabilities
+    with np.errstate(divide='ignore', invalid='ignore'):
+        funding_ratio = assets / liabilities
+
+    def distribution(values):
+        summary = {'mean': finite_or_none(float(np.mean(values)))}
+        for pct, value in zip(percentiles, np.percentile(values, percentiles)):
+            summary[f'p{pct}'] = finite_or_none(float(value))
+        return summary
+
+    return {
+        'surplus': distribution(surplus),
+        'fundingRatio': distribution(funding_ratio),
+        'probabilityUnderfunded': float(np.mean(surplus < 0)),
+        # Below the app's 80% sufficiency floor
+        'probabilityBelow80Percent': float(np.mean(funding_ratio < 0.8)),
+    }
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        config = PensionConfig.from_dict(json.load(f))
+    with open(sys.argv[2], 'r', encoding='utf-8') as f:
+        employees = parse_employees(json.load(f))
+    result = calculate_system_costs(config, employees)
+    json.dump(result.to_dict(include_employees=False), sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
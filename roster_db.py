@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Filtered, sorted, paginated queries over the employee roster.
+
+GET /api/employees?limit=&sort=&q=&hiredYearMin=&after=&offset= asks for one
+page of the roster instead of all of it:
+
+  sort          id (default), name, hiredYear or dateOfBirth; a leading '-'
+                sorts descending. Ties are broken by id, so every order is total.
+  q             case-insensitive (ASCII) substring of the name
+  hiredYearMin  only employees hired in or after that year
+  limit         page size, 1..MAX_LIMIT (default DEFAULT_LIMIT)
+  after         the "next" cursor of the previous page (keyset pagination)
+  offset        rows to skip after the cursor; cheap only for small values
+
+A page is {"employees": [...], "total": rows matching the filters,
+"next": cursor of the following page or null}. Records have the fields
+they have in employees.json, compact and in Employee.swift's key order.
+
+RosterDatabase answers queries from an SQLite copy of the roster with an
+index per sort key, so a page costs an index range scan no matter where it
+starts. query_records() gives the same answers from an in-memory list for
+servers running without --sqlite.
+
+Usage: python3 roster_db.py employees.json [employees.json.sqlite]
+"""
+
+import base64
+import bisect
+import json
+import os
+import sqlite3
+import sys
+import threading
+from json.encoder import encode_basestring_ascii
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+SORT_KEYS = ('id', 'name', 'hiredYear', 'dateOfBirth')
+INSERT_BATCH_ROWS = 4096
+DATABASE_SUFFIX = '.sqlite'
+SCHEMA_VERSION = 1
+INSERT = "INSERT OR REPLACE INTO employees VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+FIELDS = ('id', 'name', 'hiredYear', 'dateOfBirth', 'spouseDateOfBirth', 'sex', 'spouseSex')
+ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+
+def integer(value):
+    return value if isinstance(value, int) and not isinstance(value, bool) else 0
+
+
+def sort_fields(record):
+    """(id, name, hiredYear, dateOfBirth) of a stored record as queries compare them.
+
+    Fields that are missing or mistyped sort as '' / 0 rather than being
+    rejected; the record itself is returned untouched.
+    """
+    name = record.get('name')
+    return (record['id'], name if isinstance(name, str) else '', integer(record.get('hiredYear')),
+            integer(record.get('dateOfBirth')))
+
+
+def index_row(record):
+    """Database row of a record: its FIELDS, plus its JSON text unless record_json() rebuilds it exactly"""
+    row = tuple(map(record.get, FIELDS))
+    _, name, hired_year, date_of_birth, spouse_date_of_birth, sex, spouse_sex = row
+    if (type(name) is str and type(hired_year) is int and type(date_of_birth) is int
+            and type(spouse_date_of_birth) in (int, type(None)) and type(sex) in (str, type(None))
+            and type(spouse_sex) in (str, type(None)) and len(record) == 7 - row.count(None)):
+        return row + (None,)
+    return sort_fields(record) + (None, None, None, json.dumps(record, separators=(',', ':')))
+
+
+def record_json(row):
+    """JSON text of an index_row(); absent optional fields stay absent"""
+    employee_id, name, hired_year, date_of_birth, spouse_date_of_birth, sex, spouse_sex, text = row
+    if text is not None:
+        return text
+    parts = ['{"id":', str(employee_id), ',"name":', encode_basestring_ascii(name), ',"hiredYear":', str(hired_year),
+             ',"dateOfBirth":', str(date_of_birth)]
+    if spouse_date_of_birth is not None:
+        parts += (',"spouseDateOfBirth":', str(spouse_date_of_birth))
+    if sex is not None:
+        parts += (',"sex":', encode_basestring_ascii(sex))
+    if spouse_sex is not None:
+        parts += (',"spouseSex":', encode_basestring_ascii(spouse_sex))
+    parts.append('}')
+    return ''.join(parts)
+
+
+class EmployeeQuery:
+    """A parsed page request. Raises ValueError for a malformed parameter."""
+
+    __slots__ = ('sort', 'descending', 'q', 'hired_year_min', 'limit', 'offset', 'after')
+
+    def __init__(self, sort='id', q=None, hired_year_min=None, limit=DEFAULT_LIMIT, offset=0, after=None):
+        self.descending = sort.startswith('-')
+        self.sort = sort.lstrip('-')
+        if self.sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)}, optionally prefixed with '-'")
+        self.q = q.translate(ASCII_LOWER) if q else None
+        self.hired_year_min = hired_year_min
+        if not 1 <= limit <= MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+        if offset < 0:
+            raise ValueError("offset must not be negative")
+        self.limit = limit
+        self.offset = offset
+        self.after = None
+        if after:
+            try:
+                sort_name, value, employee_id = json.loads(base64.urlsafe_b64decode(after.encode()))
+            except (ValueError, TypeError):
+                raise ValueError("after is not a cursor returned by this server")
+            if sort_name != self.sort_name:
+                raise ValueError("after is a cursor for a different sort")
+            if not isinstance(value, str if self.sort == 'name' else int) or not isinstance(employee_id, int):
+                raise ValueError("after is not a cursor returned by this server")
+            self.after = (value, employee_id)
+
+    @classmethod
+    def from_params(cls, params):
+        """From parse_qs() output"""
+        def first(name, convert=str, default=None):
+            values = params.get(name)
+            if not values or values[0] == '':
+                return default
+            try:
+                return convert(values[0])
+            except ValueError:
+                raise ValueError(f"{name} must be an integer")
+
+        return cls(sort=first('sort', default='id'), q=first('q'), hired_year_min=first('hiredYearMin', int),
+                   limit=first('limit', int, DEFAULT_LIMIT), offset=first('offset', int, 0), after=first('after'))
+
+    @property
+    def sort_name(self):
+        return '-' + self.sort if self.descending else self.sort
+
+    def cursor(self, value, employee_id):
+        key = [self.sort_name, value, employee_id]
+        return base64.urlsafe_b64encode(json.dumps(key, separators=(',', ':')).encode()).decode()
+
+    def matches(self, fields):
+        _, name, hired_year, _ = fields
+        if self.hired_year_min is not None and hired_year < self.hired_year_min:
+            return False
+        return self.q is None or self.q in name.translate(ASCII_LOWER)
+
+
+def page_body(record_texts, total, next_cursor):
+    """Response body of a page from the JSON text of its records"""
+    return ('{"employees":[' + ','.join(record_texts) + '],"total":' + str(total)
+            + ',"next":' + json.dumps(next_cursor) + '}').encode()
+
+
+def query_records(records, query):
+    """Answer query from a list of employee records (no database); returns the page body"""
+    column = SORT_KEYS.index(query.sort)
+    rows = []
+    for record in records:
+        if isinstance(record, dict) and isinstance(record.get('id'), int):
+            fields = sort_fields(record)
+            if query.matches(fields):
+                rows.append(((fields[column], fields[0]), record))
+    rows.sort(key=lambda row: row[0], reverse=query.descending)
+    keys = [key for key, _ in rows]
+    start = 0
+    if query.after is not None:
+        after = tuple(query.after)
+        if query.descending:
+            # keys descend; find the first key below the cursor
+            low, high = 0, len(keys)
+            while low < high:
+                middle = (low + high) // 2
+                if keys[middle] < after:
+                    high = middle
+                else:
+                    low = middle + 1
+            start = low
+        else:
+            start = bisect.bisect_right(keys, after)
+    page = rows[start + query.offset:start + query.offset + query.limit]
+    end = start + query.offset + len(page)
+    next_cursor = query.cursor(*keys[end - 1]) if page and end < len(rows) else None
+    return page_body([record_json(index_row(record)) for _, record in page], len(rows), next_cursor)
+
+
+class RosterDatabase:
+    """An SQLite copy of the roster, indexed for query pages.
+
+    The database is derived data: it records the (inode, size, mtime) of
+    the employees.json it was built from, rebuild() replaces it wholesale,
+    and apply() keeps it current through single-employee edits. One
+    connection is shared by all server threads behind a lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = None
+        self.source_key = None
+        self.open()
+
+    def open(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        # Rebuildable from employees.json, so durability is traded for edit latency
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.execute("PRAGMA journal_mode=MEMORY")
+        source_key = None
+        try:
+            version, key = connection.execute(
+                "SELECT value, (SELECT value FROM meta WHERE key = 'source') FROM meta WHERE key = 'schema'").fetchone()
+            if int(version) == SCHEMA_VERSION and key is not None:
+                source_key = json.loads(key)
+        except (sqlite3.DatabaseError, TypeError, ValueError):
+            pass
+        self.connection = connection
+        self.source_key = source_key
+
+    @staticmethod
+    def create_schema(connection):
+        connection.executescript("""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE employees (id INTEGER PRIMARY KEY, name TEXT NOT NULL, hiredYear INTEGER NOT NULL,
+                                    dateOfBirth INTEGER NOT NULL, spouseDateOfBirth INTEGER, sex TEXT,
+                                    spouseSex TEXT, record TEXT);
+        """)
+
+    @staticmethod
+    def create_indexes(connection):
+        for column in SORT_KEYS[1:]:
+            connection.execute(f"CREATE INDEX IF NOT EXISTS employees_{column} ON employees ({column}, id)")
+
+    def rebuild(self, records, source_key):
+        """Replace the contents with records (an iterable of employee dicts, consumed once).
+
+        The new database is written next to the old one and renamed over it,
+        so queries keep being answered from the old copy until it is ready.
+        Later records win over earlier ones with the same id.
+        """
+        temp_path = self.path + '.rebuild'
+        for path in (temp_path, temp_path + '-journal'):
+            if os.path.exists(path):
+                os.remove(path)
+        connection = sqlite3.connect(temp_path, isolation_level=None)
+        try:
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute("PRAGMA journal_mode=OFF")
+            self.create_schema(connection)
+            connection.execute("BEGIN")
+            batch = []
+            for record in records:
+                if isinstance(record, dict) and isinstance(record.get('id'), int):
+                    batch.append(index_row(record))
+                    if len(batch) >= INSERT_BATCH_ROWS:
+                        connection.executemany(INSERT, batch)
+                        batch = []
+            connection.executemany(INSERT, batch)
+            self.create_indexes(connection)
+            connection.executemany("INSERT INTO meta VALUES (?, ?)",
+                                   [('schema', str(SCHEMA_VERSION)), ('source', json.dumps(source_key))])
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+        try:
+            with self.lock:
+                self.connection.close()
+                os.replace(temp_path, self.path)
+                self.open()
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def set_source(self, source_key):
+        """Record that the contents now match the employees.json with source_key"""
+        with self.lock:
+            self.connection.execute("UPDATE meta SET value = ? WHERE key = 'source'", (json.dumps(source_key),))
+            self.source_key = source_key
+
+    def apply(self, op):
+        """Apply one EmployeeStore journal op"""
+        with self.lock:
+            if op['op'] == 'delete':
+                self.connection.execute("DELETE FROM employees WHERE id = ?", (op['id'],))
+            else:
+                self.connection.execute(INSERT,
+                                        index_row(op['employee']))
+
+    def query(self, query):
+        """Answer an EmployeeQuery; returns the page body"""
+        where, params = [], []
+        if query.q is not None:
+            # lower() in SQLite folds ASCII only, matching EmployeeQuery.matches()
+            where.append("instr(lower(name), ?) > 0")
+            params.append(query.q)
+        if query.hired_year_min is not None:
+            where.append("hiredYear >= ?")
+            params.append(query.hired_year_min)
+        filters = ' AND '.join(where) or '1'
+        page_where, page_params = list(where), list(params)
+        comparison = '<' if query.descending else '>'
+        if query.after is not None:
+            if query.sort == 'id':
+                page_where.append(f"id {comparison} ?")
+                page_params.append(query.after[1])
+            else:
+                page_where.append(f"({query.sort}, id) {comparison} (?, ?)")
+                page_params.extend(query.after)
+        direction = 'DESC' if query.descending else 'ASC'
+        order = f"id {direction}" if query.sort == 'id' else f"{query.sort} {direction}, id {direction}"
+        sql = (f"SELECT {query.sort}, {', '.join(FIELDS)}, record FROM employees WHERE {' AND '.join(page_where) or '1'} "
+               f"ORDER BY {order} LIMIT ? OFFSET ?")
+        with self.lock:
+            # One row past the page tells whether there is a next page
+            rows = self.connection.execute(sql, page_params + [query.limit + 1, query.offset]).fetchall()
+            total = self.connection.execute(f"SELECT count(*) FROM employees WHERE {filters}", params).fetchone()[0]
+        page = rows[:query.limit]
+        next_cursor = query.cursor(*page[-1][:2]) if len(rows) > query.limit else None
+        return page_body([record_json(row[1:]) for row in page], total, next_cursor)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def database_path(json_path):
+    return json_path + DATABASE_SUFFIX
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    json_path = sys.argv[1]
+    path = sys.argv[2] if len(sys.argv) == 3 else database_path(json_path)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+    st = os.stat(json_path)
+    database = RosterDatabase(path)
+    database.rebuild(records, [st.st_ino, st.st_size, st.st_mtime_ns])
+    count = database.connection.execute("SELECT count(*) FROM employees").fetchone()[0]
+    print(f"Indexed {count} employees in {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Binary columnar roster file, memory-mapped for loading.
+
+employees.json is pretty-printed JSON; a state-wide roster of hundreds of
+thousands of members takes seconds to parse and hundreds of MB once it is
+Python objects. This module keeps a derived copy of the roster in one file
+of fixed-width columns:
+
+  header      magic, version, row count, and the (inode, size, mtime)
+              of the employees.json it was converted from
+  id          int64 per employee
+  hiredYear, dateOfBirth, spouseDateOfBirth
+              int32 per employee
+  sex, spouseSex
+              one bit per employee, 1 = F (spouseSex only means something
+              when spouseDateOfBirth > 0)
+  nameOffsets uint64 per employee + 1, into
+  names       the UTF-8 names back to back
+
+Every section starts on an 8-byte boundary. Opening a file maps it and
+casts each section to a memoryview; nothing is read or copied until it is
+used, and only the pages touched count against RSS.
+
+Usage: python3 roster_store.py employees.json [employees.json.columns]
+"""
+
+import array
+import bisect
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+import pension_calc
+
+MAGIC = b'PRCR'
+VERSION = 1
+HEADER = struct.Struct('<4sIQQQQqQ')  # magic, version, count, names size, source ino/size/mtime_ns, flags
+HEADER_SIZE = 64
+FLAG_IDS_SORTED = 1
+COLUMNS_SUFFIX = '.columns'
+INT32_MIN, INT32_MAX = -2 ** 31, 2 ** 31 - 1
+
+# byte -> the 8 sexes it encodes, lowest bit first
+SEX_BITS = [''.join('F' if byte >> bit & 1 else 'M' for bit in range(8)) for byte in range(256)]
+
+
+def align(offset):
+    return (offset + 7) & ~7
+
+
+def section_layout(count, names_size):
+    """Byte offset of each section for a file of count rows"""
+    offsets = {}
+    position = HEADER_SIZE
+    for name, size in (('id', 8 * count), ('hiredYear', 4 * count), ('dateOfBirth', 4 * count),
+                       ('spouseDateOfBirth', 4 * count), ('sex', (count + 7) // 8),
+                       ('spouseSex', (count + 7) // 8), ('nameOffsets', 8 * (count + 1)), ('names', names_size)):
+        offsets[name] = position
+        position = align(position + size)
+    offsets['end'] = position
+    return offsets
+
+
+def pack_bits(flags):
+    """bytes with bit i set where flags[i] is true"""
+    packed = bytearray((len(flags) + 7) // 8)
+    for index, flag in enumerate(flags):
+        if flag:
+            packed[index >> 3] |= 1 << (index & 7)
+    return bytes(packed)
+
+
+def write_columns(path, records, source_key=None):
+    """Convert employee dicts (an iterable, consumed once) into a columnar file at path.
+
+    Records are decoded like Employee.init(from:). Raises ValueError for a
+    record that cannot be stored. The file is written to a temp file and
+    renamed into place, so readers never see a partial file.
+    """
+    if sys.byteorder != 'little':
+        raise ValueError("columnar rosters are only supported on little-endian machines")
+    ids, hired, born, spouse_born = array.array('q'), array.array('i'), array.array('i'), array.array('i')
+    female, spouse_female = bytearray(), bytearray()
+    name_offsets = array.array('Q', [0])
+    names = bytearray()
+    for index, record in enumerate(records):
+        try:
+            employee = pension_calc.Employee.from_dict(record)
+            ids.append(employee.id)
+            hired.append(employee.hiredYear)
+            born.append(employee.dateOfBirth)
+            spouse_born.append(employee.spouseDateOfBirth)
+            names += str(employee.name).encode('utf-8')
+        except (ValueError, OverflowError, TypeError, AttributeError) as e:
+            raise ValueError(f"employees[{index}] cannot be stored in columns: {e}")
+        female.append(employee.sex == 'F')
+        spouse_female.append(employee.spouseSex == 'F')
+        name_offsets.append(len(names))
+    count = len(ids)
+    layout = section_layout(count, len(names))
+    flags = FLAG_IDS_SORTED if all(a < b for a, b in zip(ids, ids[1:])) else 0
+    ino, size, mtime_ns = source_key or (0, 0, 0)
+
+    directory = os.path.dirname(path) or '.'
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, count, len(names), ino, size, mtime_ns, flags))
+            for name, data in (('id', ids), ('hiredYear', hired), ('dateOfBirth', born),
+                               ('spouseDateOfBirth', spouse_born), ('sex', pack_bits(female)),
+                               ('spouseSex', pack_bits(spouse_female)), ('nameOffsets', name_offsets),
+                               ('names', names)):
+                f.write(b'\0' * (layout[name] - f.tell()))
+                f.write(data)
+            f.write(b'\0' * (layout['end'] - f.tell()))
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return count
+
+
+class ColumnarRoster:
+    """A memory-mapped columnar roster file.
+
+    Behaves as a read-only sequence of pension_calc.Employee (built on
+    access), and hands pension_calc its columns directly through
+    valuation_rows() / valuation_arrays() so a valuation never builds
+    per-employee objects.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER_SIZE:
+                raise ValueError(f"{path} is not a columnar roster")
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, names_size, ino, source_size, mtime_ns, flags = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} columnar roster")
+        layout = section_layout(count, names_size)
+        if layout['end'] > size:
+            raise ValueError(f"{path} is truncated")
+        self.path = path
+        self.count = count
+        self.source_key = [ino, source_size, mtime_ns]
+        self.ids_sorted = bool(flags & FLAG_IDS_SORTED)
+        view = memoryview(self.map)
+
+        def section(name, length, format):
+            return view[layout[name]:layout[name] + length].cast(format)
+
+        self.id = section('id', 8 * count, 'q')
+        self.hiredYear = section('hiredYear', 4 * count, 'i')
+        self.dateOfBirth = section('dateOfBirth', 4 * count, 'i')
+        self.spouseDateOfBirth = section('spouseDateOfBirth', 4 * count, 'i')
+        self.sex_bits = section('sex', (count + 7) // 8, 'B')
+        self.spouse_sex_bits = section('spouseSex', (count + 7) // 8, 'B')
+        self.name_offsets = section('nameOffsets', 8 * (count + 1), 'Q')
+        self.names = section('names', names_size, 'B')
+        self._sexes = None
+        self._spouse_sexes = None
+        self._index = None
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("roster index out of range")
+        return pension_calc.Employee(self.id[index], self.name(index), self.hiredYear[index],
+                                     self.dateOfBirth[index], self.spouseDateOfBirth[index],
+                                     self.sexes[index], self.spouse_sexes[index])
+
+    def __iter__(self):
+        Employee = pension_calc.Employee
+        names = self.iter_names()
+        for row in zip(self.id, names, self.hiredYear, self.dateOfBirth, self.spouseDateOfBirth,
+                       self.sexes, self.spouse_sexes):
+            yield Employee(*row)
+
+    def name(self, index):
+        return bytes(self.names[self.name_offsets[index]:self.name_offsets[index + 1]]).decode('utf-8')
+
+    def iter_names(self):
+        names = self.names
+        offsets = self.name_offsets
+        for start, end in zip(offsets, offsets[1:]):
+            yield bytes(names[start:end]).decode('utf-8')
+
+    @staticmethod
+    def unpack_sexes(bits, count):
+        return ''.join(map(SEX_BITS.__getitem__, bits))[:count]
+
+    @property
+    def sexes(self):
+        """'M'/'F' per employee as one str (decoded from the bit column on first use)"""
+        if self._sexes is None:
+            self._sexes = self.unpack_sexes(self.sex_bits, self.count)
+        return self._sexes
+
+    @property
+    def spouse_sexes(self):
+        if self._spouse_sexes is None:
+            self._spouse_sexes = self.unpack_sexes(self.spouse_sex_bits, self.count)
+        return self._spouse_sexes
+
+    def record(self, index):
+        """Employee dict as stored in employees.json"""
+        return self[index].to_dict()
+
+    def records(self):
+        return (employee.to_dict() for employee in self)
+
+    def find(self, employee_id):
+        """Row of an employee id, or None; binary search when ids are ascending"""
+        if self.ids_sorted:
+            index = bisect.bisect_left(self.id, employee_id)
+            return index if index < self.count and self.id[index] == employee_id else None
+        if self._index is None:
+            self._index = {value: index for index, value in enumerate(self.id)}
+        return self._index.get(employee_id)
+
+    # MARK: - pension_calc hooks
+
+    def valuation_rows(self):
+        """(hiredYear, dateOfBirth, sex) per employee for calculate_system_costs"""
+        return zip(self.hiredYear, self.dateOfBirth, self.sexes)
+
+    def roster_rows(self):
+        """(id, hiredYear, dateOfBirth, sex) per employee for sweeps and simulations"""
+        return list(zip(self.id, self.hiredYear, self.dateOfBirth, self.sexes))
+
+    def take(self, indices):
+        return RosterSubset(self, indices)
+
+    def valuation_arrays(self):
+        """(hiredYear, dateOfBirth, male) NumPy arrays over the mapped columns"""
+        np = pension_calc.np
+        male = np.unpackbits(np.frombuffer(self.sex_bits, dtype=np.uint8), count=self.count,
+                             bitorder='little') == 0
+        return (np.frombuffer(self.hiredYear, dtype=np.int32), np.frombuffer(self.dateOfBirth, dtype=np.int32), male)
+
+
+class RosterSubset:
+    """Employees at the given rows of a ColumnarRoster, built on access"""
+
+    def __init__(self, roster, indices):
+        self.roster = roster
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, position):
+        return self.roster[self.indices[position]]
+
+    def __iter__(self):
+        return map(self.roster.__getitem__, self.indices)
+
+
+def columns_path(json_path):
+    return json_path + COLUMNS_SUFFIX
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    import json
+    json_path = sys.argv[1]
+    path = sys.argv[2] if len(sys.argv) == 3 else columns_path(json_path)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+    st = os.stat(json_path)
+    count = write_columns(path, records, (st.st_ino, st.st_size, st.st_mtime_ns))
+    print(f"Wrote {count} employees to {path} ({os.path.getsize(path)} bytes)")
+
+if __name__ == "__main__":
+    main()